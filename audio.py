@@ -0,0 +1,895 @@
+###################################################################################
+# pyUC ("puck") audio pipeline
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# Speaker and mic handling for a USRPClient.  Voice frames from AB are 20ms of 8K
+# 16 bit mono PCM, the sound card runs at the cheapest of DEVICE_RATES it supports
+# and is resampled to match when that is not 8K.
+###################################################################################
+
+from ctypes import CFUNCTYPE, c_char_p, c_int, cdll
+from contextlib import contextmanager
+from pathlib import Path
+from time import monotonic
+import threading
+import json
+import logging
+import sys
+import os
+import numpy as np
+try:
+    import pyaudio
+except ImportError:                 # only the sound card needs PortAudio, the jitter buffer and mixer do not
+    pyaudio = None
+from usrp import seqDiff, USRP_SEQ_MASK
+from resample import makeResampler, RESAMPLE_QUALITY
+from recorder import openRecorder
+
+SAMPLE_RATE = 48000                 # Default audio sample rate for pyaudio (will be resampled to 8K)
+DEVICE_RATES = (8000, 16000, 48000) # Rates 8K divides evenly into, cheapest first
+RATE_CACHE = str(Path.home() / '.cache' / 'pyUC' / 'device_rates.json')
+FRAME_TIME = 0.020                  # Each USRP voice frame is 20ms
+FRAME_BYTES = 320                   # 160 samples of 16 bit 8K PCM
+
+STRING_FATAL_OUTPUT_STREAM = "fatal error, can not open output audio stream"
+STRING_OUTPUT_STREAM_ERROR = "Output stream  open error"
+STRING_FATAL_INPUT_STREAM = "fatal error, can not open input audio stream"
+STRING_INPUT_STREAM_ERROR = "Input stream  open error"
+
+###################################################################################
+# Relative power of a block of 16 bit PCM (what audioop.rms returned)
+###################################################################################
+def rms(pcm):
+    x = np.frombuffer(pcm, dtype='<i2')
+    if len(x) == 0:
+        return 0
+    return int(np.sqrt(np.dot(x, x.astype(np.float64)) / len(x)))
+
+###################################################################################
+# Largest sample magnitude in a block of 16 bit PCM
+###################################################################################
+def peak(pcm):
+    x = np.frombuffer(pcm, dtype='<i2')
+    if len(x) == 0:
+        return 0
+    return max(int(x.max()), -int(x.min()))
+
+###################################################################################
+# Scale a block of 16 bit PCM by factor (what audioop.mul did)
+###################################################################################
+def scale(pcm, factor):
+    x = np.frombuffer(pcm, dtype='<i2') * factor
+    return np.clip(x, -32768, 32767).astype('<i2').tobytes()
+
+###################################################################################
+# Keep ALSA from spamming the console while pyaudio enumerates devices
+###################################################################################
+ERROR_HANDLER_FUNC = CFUNCTYPE(None, c_char_p, c_int, c_char_p, c_int, c_char_p)
+
+def py_error_handler(filename, line, function, err, fmt):
+    pass
+
+c_error_handler = ERROR_HANDLER_FUNC(py_error_handler)
+
+@contextmanager
+def noalsaerr():
+    try:
+        asound = cdll.LoadLibrary('libasound.so')
+        asound.snd_lib_error_set_handler(c_error_handler)
+        yield
+        asound.snd_lib_error_set_handler(None)
+    except:
+        yield
+        pass
+
+###################################################################################
+# The one PyAudio instance of the process.  Creating it makes PortAudio probe every
+# ALSA device, which takes seconds on a Pi, so it is done on first use and shared.
+###################################################################################
+portAudio = None
+portAudioLock = threading.Lock()
+
+def getPyAudio():
+    global portAudio
+    if pyaudio == None:
+        raise ImportError("pyaudio is not installed")
+    with portAudioLock:
+        if portAudio == None:
+            with noalsaerr():
+                portAudio = pyaudio.PyAudio()
+        return portAudio
+
+###################################################################################
+# Sound card rate.  Asking PortAudio whether a rate works can open the device, which
+# is slow on some USB dongles, so the answer is kept per device name in RATE_CACHE
+# and only probed again for a device we have not seen.
+###################################################################################
+rateCache = None
+rateLock = threading.Lock()
+
+def deviceInfo(p, index, isInput):
+    if index == None:
+        return p.get_default_input_device_info() if isInput else p.get_default_output_device_info()
+    return p.get_device_info_by_host_api_device_index(0, index)
+
+def rateSupported(p, index, isInput, rate):
+    try:
+        if isInput:
+            return p.is_format_supported(rate, input_device=index, input_channels=1, input_format=pyaudio.paInt16)
+        return p.is_format_supported(rate, output_device=index, output_channels=1, output_format=pyaudio.paInt16)
+    except ValueError:          # PortAudio says no by raising
+        return False
+
+def rateKey(name, isInput):
+    return ("in:" if isInput else "out:") + str(name)
+
+def loadRateCache():
+    global rateCache
+    if rateCache == None:
+        try:
+            with open(RATE_CACHE, 'r') as f:
+                rateCache = json.load(f)
+        except (OSError, ValueError):
+            rateCache = {}
+    return rateCache
+
+def rememberDeviceRate(name, isInput, rate):
+    with rateLock:
+        loadRateCache()[rateKey(name, isInput)] = rate
+        try:
+            Path(RATE_CACHE).parent.mkdir(parents=True, exist_ok=True)
+            with open(RATE_CACHE + '.tmp', 'w') as f:
+                json.dump(rateCache, f, indent=1, sort_keys=True)
+            os.replace(RATE_CACHE + '.tmp', RATE_CACHE)
+        except OSError:
+            logging.warning("Can not save device rates {}: {}".format(RATE_CACHE, sys.exc_info()[1]))
+
+###################################################################################
+# (rate, name) for the device at index (None is the default device)
+###################################################################################
+def deviceRate(p, index, isInput):
+    info = deviceInfo(p, index, isInput)
+    name = info.get('name')
+    with rateLock:
+        rate = loadRateCache().get(rateKey(name, isInput))
+    if rate in DEVICE_RATES:
+        return rate, name
+    index = info.get('index', index)
+    rate = next((r for r in DEVICE_RATES if rateSupported(p, index, isInput, r)), SAMPLE_RATE)
+    logging.info("{} device {} supports {} Hz".format("Input" if isInput else "Output", name, rate))
+    rememberDeviceRate(name, isInput, rate)
+    return rate, name
+
+###################################################################################
+# Device enumeration (for the settings UI and debugging)
+###################################################################################
+def debugAudio():
+    p = getPyAudio()
+    info = p.get_host_api_info_by_index(0)
+    print("------------------------------------")
+    print("Info: ", info)
+    print("------------------------------------")
+    numdevices = info.get('deviceCount')
+    for i in range(0, numdevices):
+        if (p.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels')) > 0:
+            print("Input Device id ", i, " - ", p.get_device_info_by_host_api_device_index(0, i).get('name'))
+        print("Device: ", p.get_device_info_by_host_api_device_index(0, i))
+        print("===============================")
+    print("Output: ", p.get_default_output_device_info())
+    print("Input: ", p.get_default_input_device_info())
+
+def listAudioDevices(want_input):
+    devices = []
+    p = getPyAudio()
+    info = p.get_host_api_info_by_index(0)
+    numdevices = info.get('deviceCount')
+    for i in range(0, numdevices):
+        is_input = p.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels') > 0
+        if (is_input and want_input) or (want_input == False and is_input == False):
+            devices.append(p.get_device_info_by_host_api_device_index(0, i).get('name'))
+            logging.info("Device id {} - {}".format(i, p.get_device_info_by_host_api_device_index(0, i).get('name')))
+    return devices
+
+###################################################################################
+# Sits between the UDP receive loop and the speaker.  Frames are held by sequence
+# number so late or reordered packets still play in order, the playout depth grows
+# and shrinks with the measured network jitter, missing frames are concealed by
+# repeating the last good frame at decreasing volume.
+###################################################################################
+class JitterBuffer:
+
+    MAX_CONCEAL = 3                     # After this many missing frames in a row, go quiet
+
+    def __init__(self, minDepth=2, maxDepth=10):
+        self.minDepth = minDepth        # Frames held before playout starts (and never less)
+        self.maxDepth = maxDepth        # Upper limit on the adaptive depth
+        self.cond = threading.Condition()
+        self.frames = {}
+        self.skipped = set()            # sequence numbers the sender spent on pings, never voice
+        self.playing = False
+        self.draining = False           # AB unkeyed, play out what we have regardless of depth
+        self.nextSeq = 0
+        self.lastFrame = None
+        self.concealed = 0              # Consecutive concealed frames
+        self.firstArrival = 0
+        self.lastArrival = None
+        self.lastArrivalSeq = 0
+        self.jitter = 0.0               # RFC 3550 style interarrival jitter (seconds)
+        self.target = minDepth
+        # Counters
+        self.late = 0
+        self.duplicates = 0
+        self.lost = 0
+        self.concealments = 0
+        self.trimmed = 0
+
+    ###################################################################################
+    # Called on the RX thread.  The frame is copied, the caller may reuse its buffer.
+    ###################################################################################
+    def put(self, seq, frame):
+        seq &= USRP_SEQ_MASK
+        now = monotonic()
+        with self.cond:
+            if self.lastArrival != None:
+                d = (now - self.lastArrival) - seqDiff(seq, self.lastArrivalSeq) * FRAME_TIME
+                self.jitter += (abs(d) - self.jitter) / 16
+                depth = int((2 * self.jitter + FRAME_TIME) / FRAME_TIME + 0.999)
+                self.target = max(self.minDepth, min(self.maxDepth, depth))
+            self.lastArrival = now
+            self.lastArrivalSeq = seq
+
+            if self.playing and seqDiff(seq, self.nextSeq) < 0:
+                self.late += 1              # Too late, its slot has already been played
+                return
+            if seq in self.frames:
+                self.duplicates += 1
+                return
+            if len(self.frames) == 0:
+                self.firstArrival = now
+            self.frames[seq] = bytes(frame)
+            self.draining = False
+            self.cond.notify()
+
+    # A ping took this sequence number, step over it instead of concealing it
+    def skip(self, seq):
+        seq &= USRP_SEQ_MASK
+        with self.cond:
+            if self.playing == False or seqDiff(seq, self.nextSeq) >= 0:
+                self.skipped.add(seq)
+
+    ###################################################################################
+    # The transmission ended, let the remaining frames play out
+    ###################################################################################
+    def drain(self):
+        with self.cond:
+            self.draining = True
+            self.cond.notify()
+
+    ###################################################################################
+    # Called on the playout thread, returns the next 20ms frame to play or None if
+    # there is nothing to play (after waiting up to timeout seconds).
+    ###################################################################################
+    def get(self, timeout=FRAME_TIME, block=True):
+        with self.cond:
+            if self.playing == False:
+                if self.ready() == False:
+                    if block == False:
+                        return None
+                    self.cond.wait(timeout if len(self.frames) else None)  # Idle, sleep until a frame arrives
+                    if self.ready() == False:
+                        return None
+                self.playing = True
+                self.concealed = 0
+                first = next(iter(self.frames))
+                self.nextSeq = min(self.frames, key=lambda s: seqDiff(s, first))
+                self.skipped = set(s for s in self.skipped if seqDiff(s, self.nextSeq) > 0)
+
+            # Keep latency near the target, a burst after a stall does not need to stay queued
+            while len(self.frames) > self.target + 2 and self.nextSeq in self.frames:
+                del self.frames[self.nextSeq]
+                self.nextSeq = (self.nextSeq + 1) & USRP_SEQ_MASK
+                self.trimmed += 1
+
+            while self.nextSeq in self.skipped:
+                self.skipped.discard(self.nextSeq)
+                self.nextSeq = (self.nextSeq + 1) & USRP_SEQ_MASK
+
+            # The sequence jumped (AB restarted) or the head frame never came, carry on
+            # from the oldest frame held instead of concealing up to it
+            if len(self.frames) > 0 and self.nextSeq not in self.frames:
+                for seq in [s for s in self.frames if seqDiff(s, self.nextSeq) < 0]:
+                    del self.frames[seq]    # behind the play position, never playable
+                if len(self.frames) > 0:
+                    oldest = min(self.frames, key=lambda s: seqDiff(s, self.nextSeq))
+                    if seqDiff(oldest, self.nextSeq) > self.maxDepth or len(self.frames) > self.target + 2:
+                        self.nextSeq = oldest
+
+            frame = self.frames.pop(self.nextSeq, None)
+            if frame != None:
+                self.nextSeq = (self.nextSeq + 1) & USRP_SEQ_MASK
+                self.lastFrame = frame
+                self.concealed = 0
+                return frame
+
+            if len(self.frames) == 0 and (self.draining or self.concealed >= self.MAX_CONCEAL):
+                self.reset()                # End of the transmission (or the network went away)
+                return None
+
+            self.nextSeq = (self.nextSeq + 1) & USRP_SEQ_MASK     # This frame is missing, fill the hole
+            self.lost += 1
+            self.concealments += 1
+            self.concealed += 1
+            if self.lastFrame == None or self.concealed > self.MAX_CONCEAL:
+                return bytes(FRAME_BYTES)
+            return scale(self.lastFrame, 0.5 ** self.concealed)
+
+    def ready(self):
+        if len(self.frames) == 0:
+            return False
+        return self.draining or len(self.frames) >= self.target or (monotonic() - self.firstArrival) >= self.target * FRAME_TIME
+
+    def reset(self):
+        self.playing = False
+        self.draining = False
+        self.skipped.clear()
+        self.lastFrame = None
+        self.concealed = 0
+
+    # Drop everything held (the session is no longer monitored)
+    def clear(self):
+        with self.cond:
+            self.frames.clear()
+            self.reset()
+
+###################################################################################
+# Single producer, single consumer ring of 16 bit samples.  Each side only moves
+# its own position (a single assignment), so the PortAudio callback never takes a
+# lock; the other side waits on an Event that every read and write sets.
+###################################################################################
+class RingBuffer:
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buf = np.zeros(capacity, dtype='<i2')
+        self.readPos = 0
+        self.writePos = 0
+        self.event = threading.Event()
+
+    def available(self):
+        return self.writePos - self.readPos
+
+    def free(self):
+        return self.capacity - (self.writePos - self.readPos)
+
+    ###################################################################################
+    # Write all of pcm or nothing, returns the number of samples written
+    ###################################################################################
+    def write(self, pcm):
+        x = np.frombuffer(pcm, dtype='<i2')
+        n = len(x)
+        if n > self.free():
+            return 0
+        i = self.writePos % self.capacity
+        first = min(n, self.capacity - i)
+        self.buf[i:i+first] = x[:first]
+        self.buf[:n-first] = x[first:]
+        self.writePos += n
+        self.event.set()
+        return n
+
+    ###################################################################################
+    # Read up to n samples as bytes
+    ###################################################################################
+    def read(self, n):
+        n = min(n, self.available())
+        i = self.readPos % self.capacity
+        first = min(n, self.capacity - i)
+        if first == n:
+            pcm = self.buf[i:i+n].tobytes()
+        else:
+            pcm = self.buf[i:].tobytes() + self.buf[:n-first].tobytes()
+        self.readPos += n
+        self.event.set()
+        return pcm
+
+    ###################################################################################
+    # Block until test() is true, False if timeout expired first
+    ###################################################################################
+    def waitFor(self, test, timeout=1.0):
+        while True:
+            self.event.clear()
+            if test():
+                return True
+            if self.event.wait(timeout) == False:
+                return test()
+
+###################################################################################
+# Level meter for one audio direction.  update() is called from the audio thread for
+# every frame and measures every Nth of them; the loudest RMS and peak since the last
+# publish go out as one ("level", value, peak) event at most fps times a second, so
+# the UI sees a steady frame rate no matter how fast audio arrives.  The peak is held
+# for peakHold seconds (0 turns the hold off).
+###################################################################################
+class LevelMeter:
+
+    def __init__(self, emit, fps=15, peakHold=1.0, every=1):
+        self.emit = emit
+        self.interval = 1.0 / max(fps, 1)
+        self.peakHold = peakHold
+        self.every = max(every, 1)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.rms = 0            # loudest since the last publish
+        self.peak = 0
+        self.held = 0           # peak on display and when it was taken
+        self.heldAt = 0.0
+        self.lastPublish = 0.0
+
+    def update(self, pcm, power=None, now=None):
+        self.count += 1
+        if (self.count % self.every) != 0:
+            return
+        self.rms = max(self.rms, rms(pcm) if power == None else power)
+        self.peak = max(self.peak, peak(pcm))
+        now = monotonic() if now == None else now
+        if now - self.lastPublish >= self.interval:
+            self.publish(now)
+
+    def publish(self, now):
+        if self.peak >= self.held or now - self.heldAt >= self.peakHold:
+            self.held = self.peak
+            self.heldAt = now
+        self.emit(("level", int(self.rms/100), int(self.held/100)))
+        self.lastPublish = now
+        self.rms = 0
+        self.peak = 0
+
+    # Audio stopped, drop the meter to zero right away
+    def silence(self):
+        self.reset()
+        self.emit(("level", 0, 0))
+
+###################################################################################
+# One session's share of the sound card.  Its frames are only mixed while it is
+# monitored, gain is its volume in the mix (1.0 leaves it as is).
+###################################################################################
+class SessionAudio:
+
+    def __init__(self, client, monitor=True, gain=1.0):
+        self.client = client
+        self.monitor = monitor
+        self.gain = gain
+
+###################################################################################
+# One stream in the mix, an (address, port, talkgroup) that is sending us voice
+###################################################################################
+class MixerSource:
+
+    def __init__(self, key, session, jitterBuffer, gain=1.0, priority=False):
+        self.key = key
+        self.session = session
+        self.jitterBuffer = jitterBuffer
+        self.gain = gain
+        self.priority = priority
+        self.lastHeard = monotonic()
+
+###################################################################################
+# Mixes every stream that is talking into one 20ms block.  Each source has its own
+# jitter buffer so streams that arrive at the same time no longer interleave in one
+# buffer, and the blocks are summed as one matrix product with the gains, saturated
+# to 16 bits.  While a priority talkgroup is playing every other source is ducked
+# to duckGain.  Sources quiet for idleTimeout seconds are forgotten.
+###################################################################################
+class Mixer:
+
+    COUNTERS = ('late', 'duplicates', 'lost', 'concealments', 'trimmed')
+
+    def __init__(self, minDepth=2, maxDepth=10, priorityTGs=(), duckGain=0.25, idleTimeout=10.0):
+        self.jitterDepth = (minDepth, maxDepth)
+        self.priorityTGs = set(str(tg) for tg in priorityTGs)
+        self.duckGain = duckGain
+        self.idleTimeout = idleTimeout
+        self.sources = {}               # key -> MixerSource
+        self.gains = {}                 # key or talkgroup -> gain set by the user, kept across sources
+        self.lock = threading.Lock()    # sources are added on the network thread, removed on playout
+        self.retired = dict.fromkeys(self.COUNTERS, 0)  # counters of sources that were forgotten
+        self.lastExpire = monotonic()
+        self.ducking = False
+
+    ###################################################################################
+    # A frame from a source, None when the source unkeyed.  Network thread.
+    ###################################################################################
+    def put(self, key, seq, frame, session=None):
+        source = self.sources.get(key)
+        if source == None:
+            if frame == None:
+                return
+            with self.lock:
+                source = self.sources.get(key)
+                if source == None:
+                    tg = str(key[2])
+                    source = MixerSource(key, session, JitterBuffer(*self.jitterDepth),
+                                         self.gains.get(key, self.gains.get(tg, 1.0)), tg in self.priorityTGs)
+                    self.sources[key] = source
+        if frame == None:
+            source.jitterBuffer.drain()
+        else:
+            source.jitterBuffer.put(seq, frame)
+            source.lastHeard = monotonic()
+
+    # The sender at key's address spent seq on a ping, every stream it sends shares
+    # the one counter
+    def skip(self, key, seq):
+        for source in list(self.sources.values()):
+            if source.key[:2] == key[:2]:
+                source.jitterBuffer.skip(seq)
+
+    ###################################################################################
+    # Gain of a source, by its key or (for every source of it) by talkgroup
+    ###################################################################################
+    def setGain(self, keyOrTG, gain):
+        self.gains[keyOrTG if isinstance(keyOrTG, tuple) else str(keyOrTG)] = gain
+        for source in list(self.sources.values()):
+            if source.key == keyOrTG or str(source.key[2]) == str(keyOrTG):
+                source.gain = gain
+
+    def setPriority(self, tg, priority=True):
+        if priority:
+            self.priorityTGs.add(str(tg))
+        else:
+            self.priorityTGs.discard(str(tg))
+        for source in list(self.sources.values()):
+            if str(source.key[2]) == str(tg):
+                source.priority = priority
+
+    def sourcesOf(self, session):
+        return [source for source in list(self.sources.values()) if source.session is session]
+
+    # The session's transmission ended (or was lost), play out what is held
+    def drain(self, session):
+        for source in self.sourcesOf(session):
+            source.jitterBuffer.drain()
+
+    def clear(self, session):
+        for source in self.sourcesOf(session):
+            source.jitterBuffer.clear()
+
+    # True if a frame is held back waiting for its buffer to fill
+    def waiting(self):
+        return any(len(source.jitterBuffer.frames) for source in list(self.sources.values()))
+
+    ###################################################################################
+    # The next 20ms block of the mix, None if nobody is talking.  Playout thread.
+    ###################################################################################
+    def mix(self):
+        frames = []
+        gains = []
+        priority = []
+        ducking = False
+        for source in list(self.sources.values()):
+            frame = source.jitterBuffer.get(block=False)
+            if source.priority and source.jitterBuffer.playing:
+                ducking = True          # held through short gaps until the transmission ends
+            if frame != None:
+                frames.append(frame)
+                gains.append(source.gain * (source.session.gain if source.session != None else 1.0))
+                priority.append(source.priority)
+        self.ducking = ducking
+        if monotonic() - self.lastExpire >= 1.0:
+            self.expire()
+        if len(frames) == 0:
+            return None
+        if len(frames) == 1 and gains[0] == 1.0 and (ducking == False or priority[0]):
+            return frames[0]
+        g = np.array(gains, dtype=np.float32)
+        if ducking:
+            g[~np.array(priority)] *= self.duckGain
+        x = np.frombuffer(b''.join(frames), dtype='<i2').reshape(len(frames), -1)
+        return np.clip(g @ x, -32768, 32767).astype('<i2').tobytes()
+
+    def expire(self, now=None):
+        now = monotonic() if now == None else now
+        self.lastExpire = now
+        with self.lock:
+            for key, source in list(self.sources.items()):
+                jb = source.jitterBuffer
+                if jb.playing == False and len(jb.frames) == 0 and now - source.lastHeard >= self.idleTimeout:
+                    for name in self.COUNTERS:
+                        self.retired[name] += getattr(jb, name)
+                    del self.sources[key]
+
+    def counters(self):
+        totals = dict(self.retired)
+        for source in list(self.sources.values()):
+            for name in self.COUNTERS:
+                totals[name] += getattr(source.jitterBuffer, name)
+        totals['sources'] = len(self.sources)
+        return totals
+
+###################################################################################
+# Plays voice frames from the clients and feeds mic audio (with vox) back to one of
+# them.  Every stream from every session goes through the one Mixer onto the one
+# speaker.
+###################################################################################
+class AudioPipeline:
+
+    def __init__(self, client, config):
+        self.client = client                    # primary session, the threads run until it stops
+        self.inIndex = config.inIndex           # pyaudio index of the mic (-1 is RX only)
+        self.outIndex = config.outIndex         # pyaudio index of the speaker
+        self.rxMeter = LevelMeter(client.emit, config.levelFps, config.levelPeakHold, config.levelEverySample)
+        self.txMeter = LevelMeter(client.emit, config.levelFps, config.levelPeakHold, config.levelEverySample)
+        self.voxEnable = config.voxEnable
+        self.voxThreshold = config.voxThreshold
+        self.voxDelay = config.voxDelay
+        self.audioRate = config.audioRate       # sound card rate, 0 picks the cheapest the device has
+        if self.audioRate not in (0,) + DEVICE_RATES:
+            logging.warning("Unsupported audioRate {}, using {}".format(self.audioRate, SAMPLE_RATE))
+            self.audioRate = SAMPLE_RATE
+        self.quality = config.resampleQuality
+        if self.quality not in RESAMPLE_QUALITY:
+            logging.warning("Unknown resampleQuality {}, using medium".format(self.quality))
+            self.quality = "medium"
+        # Until the streams open (and find their device's rate) assume SAMPLE_RATE
+        self.outRate = self.inRate = self.audioRate or SAMPLE_RATE
+        self.outChunk = self.outRate // 50                      # samples in 20ms at the speaker
+        self.inChunk = self.inRate // 50                        # and at the mic
+        self.rxResampler = makeResampler(8000, self.outRate, self.quality)
+        self.txResampler = makeResampler(self.inRate, 8000, self.quality)
+        self.mixer = Mixer(config.jitterMinDepth, config.jitterMaxDepth, config.priorityTGs, config.duckGain)
+        self.sessions = []
+        self.recorder = openRecorder(config.recordDir, config.recordFormat)   # None unless recordDir is set
+        self.wake = threading.Event()           # set when any session has a new frame
+        self.started = False
+        self.txSession = self.addSession(client)   # the session the mic goes to
+        self.outRing = RingBuffer(SAMPLE_RATE // 50 * 8)       # 160ms at the highest rate
+        self.inRing = RingBuffer(SAMPLE_RATE // 50 * 8)
+        self.outBlocks = 2              # 20ms blocks queued ahead of the sound card
+        self.playing = False            # RX audio is flowing (an empty ring is an underrun)
+        self.outStream = None
+        self.inStream = None
+        self.p = None
+        # Counters
+        self.underruns = 0              # speaker wanted samples we did not have
+        self.overruns = 0               # mic samples dropped because the TX thread fell behind
+
+    ###################################################################################
+    # Open the speaker and start the mic thread.  Returns False if we can not play.
+    ###################################################################################
+    def start(self):
+        try:
+            self.p = getPyAudio()
+            self.outStream, rate = self.openStream(False, self.outIndex, self.outCallback)
+        except:
+            logging.critical(STRING_FATAL_OUTPUT_STREAM + str(sys.exc_info()[1]))
+            self.client.emit(("fatal", STRING_OUTPUT_STREAM_ERROR))
+            return False
+        self.outRate = rate
+        self.outChunk = rate // 50
+        self.rxResampler = makeResampler(8000, rate, self.quality)
+
+        self.started = True
+        for session in self.sessions:
+            self.attach(session)
+        threading.Thread(target=self.playout, daemon=True).start()
+        if self.inIndex != -1:  # Do not launch the TX thread if the user wants RX only access
+            threading.Thread(target=self.txAudioStream, daemon=True).start()
+        return True
+
+    ###################################################################################
+    # Open a 20ms mono stream on a device at its cheapest rate (audioRate if it is set),
+    # or SAMPLE_RATE if it turns that down after all.  Returns (stream, rate).
+    ###################################################################################
+    def openStream(self, isInput, index, callback):
+        if self.audioRate == 0:
+            rate, name = deviceRate(self.p, index, isInput)
+        else:
+            rate, name = self.audioRate, deviceInfo(self.p, index, isInput).get('name')
+        while True:
+            try:
+                stream = self.p.open(format=pyaudio.paInt16,
+                                channels = 1,
+                                rate = rate,
+                                input = isInput,
+                                output = not isInput,
+                                frames_per_buffer = rate // 50,
+                                input_device_index = index if isInput else None,
+                                output_device_index = None if isInput else index,
+                                stream_callback = callback
+                                )
+                break
+            except:
+                if rate == SAMPLE_RATE:
+                    raise
+                logging.warning("{} will not open at {} Hz, using {}: {}".format(name, rate, SAMPLE_RATE, sys.exc_info()[1]))
+                if self.audioRate == 0:
+                    rememberDeviceRate(name, isInput, SAMPLE_RATE)
+                rate = SAMPLE_RATE
+        if rate == 8000:
+            path = "no resampling"
+        else:
+            path = "{} resampling {} Hz".format(self.quality, "to 8000 from " + str(rate) if isInput else "from 8000 to " + str(rate))
+        logging.info("{} Device: {} Index: {} at {} Hz, {}".format("Input" if isInput else "Output", name, "default" if index == None else index, rate, path))
+        return stream, rate
+
+    ###################################################################################
+    # Another session to play (and maybe transmit to) on this sound card
+    ###################################################################################
+    def addSession(self, client, monitor=True, gain=1.0):
+        session = SessionAudio(client, monitor, gain)
+        self.sessions.append(session)
+        if self.started:
+            self.attach(session)
+        return session
+
+    def attach(self, session):
+        mixer = self.mixer
+        recorder = self.recorder
+        name = session.client.name
+        def voiceSink(source, seq, frame):
+            if frame != None and len(frame) == 0:      # a ping between voice frames
+                if session.monitor:
+                    mixer.skip(source, seq)
+                return
+            if recorder != None:
+                recorder.frame(name, source, frame)
+            if session.monitor:
+                mixer.put(source, seq, frame, session)
+                self.wake.set()
+        session.client.voiceSink = voiceSink
+        session.client.subscribe(lambda event: self.onEvent(event, session))
+
+    def sessionFor(self, client):
+        return next((session for session in self.sessions if session.client is client), None)
+
+    def setMonitor(self, session, monitor):
+        session.monitor = monitor
+        if monitor == False:
+            self.mixer.clear(session)
+
+    # Send the mic to another session, the TX thread unkeys the old one
+    def setTxSession(self, session):
+        self.txSession = session
+
+    def onEvent(self, event, session):
+        if self.recorder != None:
+            self.recorder.onEvent(session.client.name, event, session.client.rxDest)
+        if event[0] == "end_tx":
+            self.mixer.drain(session)
+            self.wake.set()
+            logging.debug("Audio {}: {}".format(session.client.name, self.counters()))
+
+    def counters(self):
+        counters = {'underruns': self.underruns, 'overruns': self.overruns}
+        counters.update(self.mixer.counters())
+        return counters
+
+    # Finish the recordings, the audio threads end with the primary session
+    def close(self):
+        if self.recorder != None:
+            self.recorder.close()
+
+    ###################################################################################
+    # PortAudio callbacks.  These run on the audio thread, they only touch the rings.
+    ###################################################################################
+    def outCallback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paOutputUnderflow:
+            self.underruns += 1
+        avail = self.outRing.available()
+        if avail >= frame_count:
+            return (self.outRing.read(frame_count), pyaudio.paContinue)
+        if self.playing:
+            self.underruns += 1
+        return (self.outRing.read(avail) + bytes(2 * (frame_count - avail)), pyaudio.paContinue)
+
+    def inCallback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paInputOverflow:
+            self.overruns += 1
+        if self.inRing.write(in_data) == 0:
+            self.overruns += 1
+        return (None, pyaudio.paContinue)
+
+    ###################################################################################
+    # Playout thread, move the mix of every stream that is talking into the speaker
+    # ring.  Waiting for room in the ring paces this loop at the sound card clock, not
+    # the network.
+    ###################################################################################
+    def playout(self):
+        ring = self.outRing
+        limit = self.outChunk * (self.outBlocks - 1)
+        while self.client.done == False:
+            self.wake.clear()
+            audio = self.mixer.mix()
+            if audio == None:
+                if self.playing == True:
+                    self.rxMeter.silence()
+                self.playing = False
+                # Sleep until a frame arrives, or a frame time when one is held back to fill a buffer
+                self.wake.wait(FRAME_TIME if self.mixer.waiting() else 1.0)
+                continue
+            try:
+                ring.waitFor(lambda: ring.available() <= limit)
+                ring.write(self.rxResampler.process(audio))
+                self.playing = True
+            except:
+                logging.warning("Playout thread:" + str(sys.exc_info()[1]))
+            self.rxMeter.update(audio)
+
+    ###################################################################################
+    # TX thread, send audio to AB
+    ###################################################################################
+    def txAudioStream(self):
+        client = self.txSession.client
+        ring = self.inRing
+        try:
+            self.inStream, rate = self.openStream(True, self.inIndex, self.inCallback)
+        except:
+            logging.critical(STRING_FATAL_INPUT_STREAM + str(sys.exc_info()[1]))
+            client.transmitEnable = False
+            client.emit(("dialog", "Text Message", STRING_INPUT_STREAM_ERROR))
+            return
+        self.inRate = rate
+        self.inChunk = chunk = rate // 50
+        self.txResampler = makeResampler(rate, 8000, self.quality)
+
+        lastPtt = client.ptt
+        decay = 0
+        while self.client.done == False:
+            try:
+                if ring.waitFor(lambda: ring.available() >= chunk) == False:
+                    continue
+                audio = self.txResampler.process(ring.read(chunk))
+                if self.txSession.client.txSource != None:     # a file is being played, keep the mic off the air
+                    continue
+
+                if self.txSession.client is not client:    # TX moved to another session
+                    if lastPtt:
+                        client.ptt = False
+                        client.sendVoice(audio, False)
+                        client.emit(("ptt", False))
+                        self.txMeter.silence()
+                    client = self.txSession.client
+                    lastPtt = client.ptt
+
+                power = rms(audio)              # Get a relative power value for the sample
+                ###### Vox processing #####
+                if self.voxEnable:
+                    if power > self.voxThreshold:   # is it loud enough?
+                        decay = self.voxDelay       # Yes, reset the decay value (wont unkey for N samples)
+                        if (client.ptt == False) and (client.transmitEnable == True):   # Are we changing ptt state to True?
+                            client.ptt = True       # Set it
+                            client.emit(("ptt", True))  # Update the UI (turn transmit button red, etc)
+                    elif client.ptt == True:        # Are we too soft and transmitting?
+                        decay -= 1                  # Decrement the decay counter
+                        if decay <= 0:              # Have we passed N samples, all of them less then the threshold?
+                            client.ptt = False      # Unkey
+                            client.emit(("ptt", False)) # Update the UI
+                ###########################
+
+                ptt = client.ptt
+                if ptt != lastPtt:
+                    client.sendVoice(audio, ptt)
+                    if ptt == False:
+                        self.txMeter.silence()
+                lastPtt = ptt
+                if ptt:
+                    client.sendVoice(audio, ptt)
+                    self.txMeter.update(audio, power)
+            except:
+                logging.warning("TX thread:" + str(sys.exc_info()[1]))
@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+###################################################################################
+# pyUC ("puck") compressed voice payloads
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# The USRP voice payloads other than 16 bit PCM: G.711 u-law (one byte a sample,
+# USRP_TYPE_VOICE_ULAW) and IMA ADPCM (four bits a sample, USRP_TYPE_VOICE_ADPCM).
+# Both produce the same bytes as audioop.lin2ulaw and audioop.lin2adpcm did (first
+# sample in the high nibble, predictor carried from frame to frame).  Every codec
+# takes and returns bytes and is created with makeVoiceCodec().
+#
+#   python3 codec.py --bench      prints the cost of one 20ms frame per codec
+###################################################################################
+
+import numpy as np
+
+VOICE_CODECS = ("pcm", "ulaw", "adpcm")
+
+###################################################################################
+# G.711 u-law, a table lookup for all 65536 samples in one direction and all 256
+# codes in the other
+###################################################################################
+ULAW_BIAS = 0x84
+ULAW_SEGMENTS = np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+
+def makeUlawTables():
+    # the 14 bit form of G.711 that audioop used, sample >> 2 clipped to 8159
+    x = np.arange(-32768, 32768, dtype=np.int32)
+    v = x >> 2
+    mask = np.where(v < 0, 0x7f, 0xff)
+    mag = np.minimum(np.abs(v), 8159) + (ULAW_BIAS >> 2)
+    segment = np.searchsorted(ULAW_SEGMENTS, mag)          # first segment whose end is >= mag
+    code = np.where(segment >= 8, 0x7f, (np.minimum(segment, 7) << 4) | ((mag >> (segment + 1)) & 0x0f))
+    encode = np.empty(65536, dtype=np.uint8)
+    encode[x.astype(np.uint16)] = code ^ mask                # indexed by the sample's bits
+
+    u = ~np.arange(256, dtype=np.int32) & 0xff
+    magnitude = (((u & 0x0f) << 3) + ULAW_BIAS) << ((u >> 4) & 0x07)
+    decode = np.where(u & 0x80, ULAW_BIAS - magnitude, magnitude - ULAW_BIAS).astype('<i2')
+    return encode, decode
+
+ULAW_ENCODE, ULAW_DECODE = makeUlawTables()
+
+class UlawCodec:
+
+    name = "ulaw"
+
+    def encode(self, pcm):
+        return ULAW_ENCODE[np.frombuffer(pcm, dtype='<u2')].tobytes()
+
+    def decode(self, data):
+        return ULAW_DECODE[np.frombuffer(data, dtype=np.uint8)].tobytes()
+
+    def reset(self):
+        pass
+
+###################################################################################
+# IMA ADPCM.  Each sample depends on the one before so this can not be done a block
+# at a time; instead every (step index, code) pair is looked up once in flat tables
+# of the signed difference and the next step index, which leaves two list indexes
+# and a clamp per sample.
+###################################################################################
+ADPCM_INDEX = (-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8)
+ADPCM_STEPS = (7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+               50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+               253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+               1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+               3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442, 11487,
+               12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794, 32767)
+
+def makeAdpcmTables():
+    diffs = []
+    nexts = []
+    for index, step in enumerate(ADPCM_STEPS):
+        for code in range(16):
+            vpdiff = step >> 3
+            if code & 4:
+                vpdiff += step
+            if code & 2:
+                vpdiff += step >> 1
+            if code & 1:
+                vpdiff += step >> 2
+            diffs.append(-vpdiff if code & 8 else vpdiff)
+            nexts.append(min(max(index + ADPCM_INDEX[code], 0), 88) * 16)     # premultiplied row offset
+    return diffs, nexts
+
+ADPCM_DIFF, ADPCM_NEXT = makeAdpcmTables()
+
+class AdpcmCodec:
+
+    name = "adpcm"
+
+    def __init__(self):
+        self.reset()
+
+    # Start of a transmission, both ends start from silence
+    def reset(self):
+        self.encodeState = (0, 0)       # (predicted sample, step table row offset)
+        self.decodeState = (0, 0)
+
+    # Two samples to a byte, so the sample count must be even (a USRP frame is 160)
+    def encode(self, pcm):
+        if len(pcm) % 4 != 0:
+            raise ValueError("ADPCM needs an even number of samples, got {} bytes".format(len(pcm)))
+        valpred, row = self.encodeState
+        diffs, nexts, steps = ADPCM_DIFF, ADPCM_NEXT, ADPCM_STEPS
+        out = bytearray(len(pcm) // 4)
+        high = True
+        i = 0
+        for val in np.frombuffer(pcm, dtype='<i2').tolist():
+            diff = val - valpred
+            code = 0
+            if diff < 0:
+                code = 8
+                diff = -diff
+            step = steps[row >> 4]
+            if diff >= step:
+                code |= 4
+                diff -= step
+            step >>= 1
+            if diff >= step:
+                code |= 2
+                diff -= step
+            step >>= 1
+            if diff >= step:
+                code |= 1
+            k = row + code
+            valpred += diffs[k]
+            if valpred > 32767:
+                valpred = 32767
+            elif valpred < -32768:
+                valpred = -32768
+            row = nexts[k]
+            if high:
+                out[i] = code << 4
+            else:
+                out[i] |= code
+                i += 1
+            high = not high
+        self.encodeState = (valpred, row)
+        return bytes(out)
+
+    def decode(self, data):
+        valpred, row = self.decodeState
+        diffs, nexts = ADPCM_DIFF, ADPCM_NEXT
+        out = []
+        append = out.append
+        for byte in data:
+            for code in (byte >> 4, byte & 0x0f):
+                k = row + code
+                valpred += diffs[k]
+                if valpred > 32767:
+                    valpred = 32767
+                elif valpred < -32768:
+                    valpred = -32768
+                row = nexts[k]
+                append(valpred)
+        self.decodeState = (valpred, row)
+        return np.array(out, dtype='<i2').tobytes()
+
+class PcmCodec:
+
+    name = "pcm"
+
+    def encode(self, pcm):
+        return pcm
+
+    def decode(self, data):
+        return data
+
+    def reset(self):
+        pass
+
+###################################################################################
+# A codec by name (see VOICE_CODECS).  ADPCM keeps state, use one per stream and
+# direction.
+###################################################################################
+def makeVoiceCodec(name):
+    if name == "ulaw":
+        return UlawCodec()
+    if name == "adpcm":
+        return AdpcmCodec()
+    if name == "pcm":
+        return PcmCodec()
+    raise ValueError("unknown voice codec: " + str(name))
+
+###################################################################################
+# Time one 20ms frame (160 samples) through each codec, and audioop if it is there
+###################################################################################
+def bench(frames=2000):
+    from timeit import timeit
+    rng = np.random.default_rng(1)
+    pcm = rng.integers(-8000, 8000, 160, dtype=np.int16).tobytes()
+    for name in VOICE_CODECS[1:]:
+        codec = makeVoiceCodec(name)
+        data = codec.encode(pcm)
+        enc = timeit(lambda: codec.encode(pcm), number=frames) / frames * 1e6
+        dec = timeit(lambda: codec.decode(data), number=frames) / frames * 1e6
+        print("{:<6} {:4} bytes/frame  encode {:7.1f} us  decode {:7.1f} us".format(name, len(data), enc, dec))
+    try:
+        import warnings
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            import audioop
+        enc = timeit(lambda: audioop.lin2adpcm(pcm, 2, None), number=frames) / frames * 1e6
+        print("{:<6} {:4} bytes/frame  encode {:7.1f} us".format("audioop adpcm", 80, enc))
+    except ImportError:
+        pass
+
+if __name__ == '__main__':
+    import sys
+    if '--bench' in sys.argv:
+        bench()
+    else:
+        print("usage: codec.py --bench")
@@ -0,0 +1,189 @@
+###################################################################################
+# pyUC ("puck") offline DMR ID database
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# DMR/CCS7 id -> (callsign, first name) from the user dumps the networks publish:
+# radioid.net user.csv, its users.json, or a DMRIds.dat (id call name per line).
+#
+# The dump is compiled once into <file>.idx, a sorted array of ids, an array of
+# offsets and one blob of "call\tname" records, and that file is memory mapped on
+# later starts so loading costs nothing and the data lives in the page cache.
+#
+#   python3 dmrid.py user.csv [id ...]     compile the index and look up ids
+###################################################################################
+
+from pathlib import Path
+import struct
+import mmap
+import json
+import csv
+import itertools
+import io
+import logging
+import sys
+import os
+import numpy as np
+
+INDEX_MAGIC = b'DMRID1\x00\x00'
+INDEX_HEADER = struct.Struct('<8sI')         # magic, record count
+
+ID_COLUMNS = ('radio_id', 'id', 'dmr_id', 'dmrid')
+CALL_COLUMNS = ('callsign', 'call')
+NAME_COLUMNS = ('first_name', 'fname', 'name')
+
+###################################################################################
+# Find the first of names among the (lower cased) keys
+###################################################################################
+def pickKey(keys, names):
+    for name in names:
+        if name in keys:
+            return name
+    return None
+
+###################################################################################
+# Yield (id, call, first name) from any of the dump formats, bad rows are skipped
+###################################################################################
+def readRecords(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    stripped = text.lstrip()
+    firstLine = stripped.split('\n', 1)[0]
+    if stripped[:1] in ('{', '['):
+        obj = json.loads(text)
+        if isinstance(obj, dict):
+            obj = obj.get('users', obj.get('results', []))
+        rows = ({k.lower(): v for k, v in row.items()} for row in obj)
+        yield from namedRows(rows)
+    elif stripped[:1].isdigit() and ('\t' in firstLine or ',' not in firstLine):
+        for line in io.StringIO(text):     # DMRIds.dat, id call name (tab or space separated, a name may hold a comma)
+            fields = line.split(None, 2)
+            if len(fields) >= 2 and fields[0].isdigit():
+                yield (int(fields[0]), fields[1], fields[2].split()[0] if len(fields) > 2 and fields[2].strip() else "")
+    else:
+        reader = csv.reader(io.StringIO(text))
+        first = next(reader, None)
+        if first == None:
+            return
+        if first[0].strip().isdigit():      # no header, id,call,name,...
+            rows = itertools.chain([first], reader)
+            yield from namedRows({'id': row[0], 'call': row[1] if len(row) > 1 else "", 'name': row[2] if len(row) > 2 else ""} for row in rows)
+        else:
+            header = [h.strip().lower() for h in first]
+            yield from namedRows(dict(zip(header, row)) for row in reader)
+
+def namedRows(rows):
+    keyId = keyCall = keyName = None
+    for row in rows:
+        if keyId == None:
+            keyId = pickKey(row, ID_COLUMNS)
+            keyCall = pickKey(row, CALL_COLUMNS)
+            keyName = pickKey(row, NAME_COLUMNS)
+            if keyId == None or keyCall == None:
+                raise ValueError("no id/callsign columns in " + str(list(row.keys())))
+        try:
+            name = str(row.get(keyName) or "").strip() if keyName != None else ""
+            yield (int(row[keyId]), str(row[keyCall]).strip(), name.split(' ')[0] if name else "")
+        except (ValueError, TypeError, KeyError):
+            pass
+
+###################################################################################
+# Compile a dump into the index file
+###################################################################################
+def compileIndex(path, indexPath):
+    records = {}
+    for rid, call, name in readRecords(path):
+        records[rid] = (call.replace('\t', ' ') + '\t' + name.replace('\t', ' ')).encode('utf-8')
+    ids = np.array(sorted(records), dtype='<u4')
+    offsets = np.zeros(len(ids) + 1, dtype='<u4')
+    blob = bytearray()
+    for i, rid in enumerate(ids.tolist()):
+        blob += records[rid]
+        offsets[i + 1] = len(blob)
+    tmp = indexPath + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(ids)))
+        f.write(ids.tobytes())
+        f.write(offsets.tobytes())
+        f.write(blob)
+    os.replace(tmp, indexPath)
+    return len(ids)
+
+###################################################################################
+# Memory mapped, read only view of a compiled index.  lookup() is a binary search
+# over the sorted ids (about 18 probes for the full worldwide dump) and a slice of
+# the blob, no per record Python objects are ever created.
+###################################################################################
+class DMRIdDatabase:
+
+    def __init__(self, indexPath):
+        with open(indexPath, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = INDEX_HEADER.unpack_from(self.map, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError(indexPath + " is not a DMR ID index")
+        start = INDEX_HEADER.size
+        self.ids = np.frombuffer(self.map, dtype='<u4', count=count, offset=start)
+        self.offsets = np.frombuffer(self.map, dtype='<u4', count=count + 1, offset=start + count * 4)
+        self.blobStart = start + count * 8 + 4
+
+    def __len__(self):
+        return len(self.ids)
+
+    ###################################################################################
+    # (call, first name) for a DMR id, None if it is not in the database
+    ###################################################################################
+    def lookup(self, rid):
+        if rid < 0 or rid > 0xffffffff:
+            return None
+        i = int(np.searchsorted(self.ids, np.uint32(rid)))     # a python int would make numpy copy the array to int64
+        if i == len(self.ids) or self.ids[i] != rid:
+            return None
+        record = self.map[self.blobStart + int(self.offsets[i]):self.blobStart + int(self.offsets[i + 1])]
+        call, name = record.decode('utf-8').split('\t')
+        return (call, name)
+
+###################################################################################
+# Open the database for a dump, compiling the index when it is missing or older than
+# the dump.  None (and a warning) if it can not be loaded.
+###################################################################################
+def loadIdDatabase(path):
+    indexPath = path + '.idx'
+    if os.access(os.path.dirname(os.path.abspath(path)), os.W_OK) == False:    # a system wide dump, keep the index with the user
+        indexPath = str(Path.home() / '.cache' / 'pyUC' / (Path(path).name + '.idx'))
+    try:
+        idx = Path(indexPath)
+        src = Path(path)
+        if idx.exists() == False or (src.exists() and idx.stat().st_mtime < src.stat().st_mtime):
+            idx.parent.mkdir(parents=True, exist_ok=True)
+            count = compileIndex(path, indexPath)
+            logging.info("Compiled {} DMR ids from {}".format(count, path))
+        return DMRIdDatabase(indexPath)
+    except:
+        logging.warning("Can not load DMR ID database {}: {}".format(path, sys.exc_info()[1]))
+        return None
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: dmrid.py dump [id ...]")
+        sys.exit(1)
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    db = loadIdDatabase(sys.argv[1])
+    if db == None:
+        sys.exit(1)
+    print("{} ids".format(len(db)))
+    for arg in sys.argv[2:]:
+        print(arg, db.lookup(int(arg)))
@@ -0,0 +1,186 @@
+###################################################################################
+# pyUC ("puck") file transfers from AB
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# AB sends a file as TLV_TAG_FILE_XFER packets: NAME (size and name), a PAYLOAD per
+# packet of up to 254 bytes, then WRITE with the MD5 of the whole file.  Each file
+# is written as it arrives to a temp file next to where it will end up, and only
+# renamed over the real name once the size and MD5 check out, so a half received
+# or corrupt file never replaces a good one.  Payloads do not carry a name, they
+# belong to the last file named by the same sender; several senders can each have
+# a transfer running.
+#
+# Events: ("file_progress", name, received, size, bytes/s) about once a second and
+# ("file_done", name, path, ok, message) at the end.
+###################################################################################
+
+from time import monotonic
+import tempfile
+import hashlib
+import logging
+import sys
+import os
+from usrp import FILE_SUBCOMMAND_NAME, FILE_SUBCOMMAND_PAYLOAD, FILE_SUBCOMMAND_WRITE, FILE_SUBCOMMAND_ERROR
+
+FILE_BUFFER = 65536                 # bytes buffered before a write to disk
+FILE_IDLE_TIMEOUT = 30.0            # a transfer that hears nothing for this long is dropped
+PROGRESS_INTERVAL = 1.0             # seconds between file_progress events
+
+###################################################################################
+# One file on its way in
+###################################################################################
+class FileTransfer:
+
+    def __init__(self, directory, name, size, sender, now):
+        self.name = name
+        self.size = size
+        self.sender = sender
+        self.path = os.path.join(directory, name)
+        fd, self.tempPath = tempfile.mkstemp(prefix='.' + name + '.', suffix='.part', dir=directory)
+        self.file = os.fdopen(fd, 'wb', buffering=FILE_BUFFER)
+        self.md5 = hashlib.md5()
+        self.received = 0
+        self.startTime = now
+        self.lastTime = now
+        self.progressTime = now
+
+    def write(self, payload, now):
+        self.file.write(payload)
+        self.md5.update(payload)
+        self.received += len(payload)
+        self.lastTime = now
+
+    def rate(self, now):
+        elapsed = now - self.startTime
+        return int(self.received / elapsed) if elapsed > 0 else 0
+
+    ###################################################################################
+    # Check the file against AB's MD5 and put it in place, (ok, message)
+    ###################################################################################
+    def finish(self, md5):
+        self.file.close()
+        digest = self.md5.hexdigest()
+        if self.received != self.size:
+            message = "{} of {} bytes received".format(self.received, self.size)
+        elif digest != md5.lower():
+            message = "digest does not match {} vs {}".format(digest, md5)
+        else:
+            os.replace(self.tempPath, self.path)
+            return True, "{} bytes".format(self.size)
+        os.remove(self.tempPath)
+        return False, message
+
+    def abort(self):
+        try:
+            self.file.close()
+            os.remove(self.tempPath)
+        except OSError:
+            pass
+
+###################################################################################
+# Every transfer of one client, fed the value of each TLV_TAG_FILE_XFER packet
+###################################################################################
+class FileReceiver:
+
+    def __init__(self, directory, emit):
+        self.directory = directory
+        self.emit = emit
+        self.transfers = {}             # name -> FileTransfer
+        self.current = {}               # sender -> name its payloads are for
+
+    def handle(self, sender, value, length, now=None):
+        now = monotonic() if now == None else now
+        command = value[0]
+        if command == FILE_SUBCOMMAND_NAME:
+            size = int.from_bytes(value[1:5], 'big')
+            name = bytes(value[5:]).split(b'\0')[0].decode('ASCII', errors='replace')
+            self.expire(now)
+            self.begin(sender, name, size, now)
+            return
+        transfer = self.transfers.get(self.current.get(sender))
+        if transfer == None:
+            logging.debug("File transfer packet {} with no file named".format(command))
+            return
+        if command == FILE_SUBCOMMAND_PAYLOAD:
+            transfer.write(value[1:length], now)
+            if now - transfer.progressTime >= PROGRESS_INTERVAL:
+                transfer.progressTime = now
+                self.emit(("file_progress", transfer.name, transfer.received, transfer.size, transfer.rate(now)))
+        elif command == FILE_SUBCOMMAND_WRITE:
+            self.end(transfer)
+            try:
+                ok, message = transfer.finish(bytes(value[1:33]).decode('ASCII', errors='replace'))
+            except:
+                transfer.abort()
+                ok, message = False, str(sys.exc_info()[1])
+            self.done(transfer, ok, message, now)
+        elif command == FILE_SUBCOMMAND_ERROR:
+            self.end(transfer)
+            transfer.abort()
+            self.done(transfer, False, "AB reported an error", now)
+
+    ###################################################################################
+    # A NAME starts a transfer.  AB can not say where to carry on from, so naming a
+    # file that is already on its way starts it over.
+    ###################################################################################
+    def begin(self, sender, name, size, now):
+        safeName = os.path.basename(name.replace('\\', '/'))
+        if safeName in ('', '.', '..') or safeName.startswith('.'):
+            logging.warning("File transfer name refused: " + repr(name))
+            self.emit(("file_done", name, None, False, "bad file name"))
+            return
+        old = self.transfers.get(safeName)
+        if old != None:
+            self.end(old)
+            old.abort()
+            logging.info("File transfer {} restarted".format(safeName))
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            transfer = FileTransfer(self.directory, safeName, size, sender, now)
+        except OSError:
+            logging.warning("File transfer {}: {}".format(safeName, sys.exc_info()[1]))
+            self.emit(("file_done", safeName, None, False, str(sys.exc_info()[1])))
+            return
+        self.transfers[safeName] = transfer
+        self.current[sender] = safeName
+        logging.info("File transfer name: {} ({} bytes)".format(safeName, size))
+
+    def end(self, transfer):
+        self.transfers.pop(transfer.name, None)
+        if self.current.get(transfer.sender) == transfer.name:
+            del self.current[transfer.sender]
+
+    def done(self, transfer, ok, message, now):
+        elapsed = now - transfer.startTime
+        logging.info("File transfer {} {}: {} in {:.1f}s ({} bytes/s)".format(transfer.name, "complete" if ok else "failed",
+                     message, elapsed, transfer.rate(now)))
+        self.emit(("file_done", transfer.name, transfer.path if ok else None, ok, message))
+
+    ###################################################################################
+    # Drop transfers whose sender went quiet, and everything on shutdown
+    ###################################################################################
+    def expire(self, now=None):
+        now = monotonic() if now == None else now
+        for transfer in [t for t in self.transfers.values() if now - t.lastTime > FILE_IDLE_TIMEOUT]:
+            self.end(transfer)
+            transfer.abort()
+            self.done(transfer, False, "timed out", now)
+
+    def abortAll(self):
+        for transfer in list(self.transfers.values()):
+            self.end(transfer)
+            transfer.abort()
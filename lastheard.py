@@ -0,0 +1,275 @@
+###################################################################################
+# pyUC ("puck") last heard history
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# The stations heard this session.  The UI shows a window of it, so memory and
+# the cost of adding a row stay the same no matter how long pyUC runs.  Every
+# transmission is also kept in an on disk journal for reports:
+#
+#   python3 lastheard.py [journal.db] --since 2026-10-01 --tg 310 --format json
+#   python3 lastheard.py --airtime tg           airtime per talkgroup as csv
+###################################################################################
+
+from collections import deque, OrderedDict, namedtuple
+from datetime import datetime
+from time import time
+from pathlib import Path
+import threading
+import argparse
+import sqlite3
+import logging
+import queue
+import json
+import csv
+import sys
+
+DEFAULT_JOURNAL_FILE = str(Path.home() / '.local' / 'share' / 'pyUC' / 'journal.db')
+
+HeardEntry = namedtuple('HeardEntry', 'start_time call slot tg loss duration')
+
+###################################################################################
+# Fixed capacity ring of HeardEntry plus running totals per callsign.  Rows are
+# numbered from 0 for the first one ever added, first is the number of the oldest
+# row still kept; the totals cover every row, not just the kept ones, for the
+# maxCalls most recently heard calls.
+###################################################################################
+class LastHeard:
+
+    def __init__(self, capacity=1000, maxCalls=5000):
+        self.rows = deque(maxlen=capacity)
+        self.maxCalls = maxCalls
+        self.calls = OrderedDict()     # call -> [count, airtime, last seen], least recently heard first
+        self.total = 0                  # rows ever added
+
+    def add(self, start_time, call, slot, tg, loss, duration):
+        entry = HeardEntry(start_time, call, slot, tg, loss, duration)
+        self.rows.append(entry)
+        self.total += 1
+        agg = self.calls.pop(call, None)
+        if agg == None:
+            agg = [0, 0.0, 0.0]
+            if len(self.calls) >= self.maxCalls:
+                self.calls.popitem(last=False)
+        agg[0] += 1
+        agg[1] += duration
+        agg[2] = start_time + duration
+        self.calls[call] = agg
+        return entry
+
+    @property
+    def first(self):
+        return self.total - len(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    ###################################################################################
+    # Up to count rows starting at row number start (clipped to what is kept)
+    ###################################################################################
+    def window(self, start, count):
+        i = max(start - self.first, 0)
+        return [self.rows[j] for j in range(i, min(i + count, len(self.rows)))]
+
+    ###################################################################################
+    # (count, airtime seconds, last seen) for a call, None if never heard
+    ###################################################################################
+    def stats(self, call):
+        agg = self.calls.get(call)
+        return None if agg == None else tuple(agg)
+
+###################################################################################
+# Append only on disk journal of every Begin TX / End TX.  record() only queues the
+# row, a writer thread inserts them in batches (one transaction per batch) so the
+# RX path never waits on the disk.  tg is the talkgroup number (what --tg matches),
+# tg_name its name from the talkgroup list.
+###################################################################################
+class HeardJournal:
+
+    def __init__(self, path=DEFAULT_JOURNAL_FILE, batchSize=50, flushInterval=2.0):
+        self.path = path
+        self.batchSize = batchSize
+        self.flushInterval = flushInterval
+        self.queue = queue.SimpleQueue()
+        self.written = 0
+        self.txStart = None             # when our own transmission keyed up
+        self.db = openJournal(path, check_same_thread=False)
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+    def record(self, event, call, slot, tg, name="", mode="", loss="", duration=0.0, source="rx", when=None, tgName=""):
+        self.queue.put((time() if when == None else when, event, str(call), str(name), str(slot), str(tg), mode, loss, duration, source, str(tgName)))
+
+    ###################################################################################
+    # USRPClient listener
+    ###################################################################################
+    def onEvent(self, event):
+        if event[0] == "begin_tx":
+            self.record("begin", event[1], event[3], event[6], name=event[2], mode=event[5], tgName=event[4])
+        elif event[0] == "end_tx":
+            self.record("end", event[1], event[2], event[8], loss=event[4], duration=round(event[6], 2), when=event[5], tgName=event[3])
+
+    ###################################################################################
+    # Our own transmission keyed up or down (the UI and headless vox both call this)
+    ###################################################################################
+    def transmit(self, keyed, call, slot, tg, tgName=""):
+        if keyed:
+            self.txStart = time()
+            self.record("begin", call, slot, tg, source="tx", when=self.txStart, tgName=tgName)
+        elif self.txStart != None:
+            self.record("end", call, slot, tg, duration=round(time() - self.txStart, 2), source="tx", when=self.txStart, tgName=tgName)
+            self.txStart = None
+
+    def writer(self):
+        running = True
+        while running:
+            try:
+                batch = [self.queue.get(timeout=self.flushInterval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batchSize:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:           # close() was called
+                running = False
+                batch = [row for row in batch if row != None]
+            try:
+                with self.db:
+                    self.db.executemany(JOURNAL_INSERT, batch)
+                self.written += len(batch)
+            except:
+                logging.warning("Journal thread:" + str(sys.exc_info()[1]))
+        self.db.close()
+
+    # Write what is queued and stop the writer
+    def close(self, timeout=5.0):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+JOURNAL_COLUMNS = ('time', 'event', 'call', 'name', 'slot', 'tg', 'mode', 'loss', 'duration', 'source', 'tg_name')
+JOURNAL_INSERT = 'INSERT INTO journal (' + ', '.join(JOURNAL_COLUMNS) + ') VALUES (' + ', '.join('?' * len(JOURNAL_COLUMNS)) + ')'
+
+def openJournal(path, **kw):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path, **kw)
+    db.execute('PRAGMA journal_mode=WAL')     # readers (the query CLI) never block the writer
+    db.execute('CREATE TABLE IF NOT EXISTS journal (id INTEGER PRIMARY KEY, time REAL, event TEXT, call TEXT, name TEXT,'
+               ' slot TEXT, tg TEXT, mode TEXT, loss TEXT, duration REAL, source TEXT, tg_name TEXT)')
+    if 'tg_name' not in journalColumns(db):     # journal from before tg held the number
+        db.execute('ALTER TABLE journal ADD COLUMN tg_name TEXT')
+    db.execute('CREATE INDEX IF NOT EXISTS journal_time ON journal (time)')
+    db.execute('CREATE INDEX IF NOT EXISTS journal_call ON journal (call, time)')
+    db.execute('CREATE INDEX IF NOT EXISTS journal_tg ON journal (tg, time)')
+    db.commit()
+    return db
+
+def journalColumns(db):
+    return [row[1] for row in db.execute('PRAGMA table_info(journal)')]
+
+###################################################################################
+# The journal for a journalFile setting, None if it is turned off or can not be opened
+###################################################################################
+def openHeardJournal(path):
+    if path == None or path.lower() == "none":
+        return None
+    try:
+        return HeardJournal(path)
+    except:
+        logging.warning("Can not open journal {}: {}".format(path, sys.exc_info()[1]))
+        return None
+
+###################################################################################
+# Rows of the journal as dicts, oldest first.  Every filter is optional.  The
+# journal is opened read only, a missing file is FileNotFoundError and not a new
+# empty journal.
+###################################################################################
+def queryJournal(path, since=None, until=None, call=None, tg=None, event="end"):
+    where, args = [], []
+    for clause, value in (('time >= ?', since), ('time < ?', until), ('call = ?', call), ('tg = ?', tg), ('event = ?', event)):
+        if value != None:
+            where.append(clause)
+            args.append(value)
+    if Path(path).is_file() == False:
+        raise FileNotFoundError("no journal at " + str(path))
+    db = sqlite3.connect(Path(path).resolve().as_uri() + '?mode=ro', uri=True)
+    try:
+        have = journalColumns(db)       # read only, an old journal is not given new columns
+        sql = 'SELECT ' + ', '.join(c if c in have else 'NULL' for c in JOURNAL_COLUMNS) + ' FROM journal'
+        if len(where) > 0:
+            sql += ' WHERE ' + ' AND '.join(where)
+        return [dict(zip(JOURNAL_COLUMNS, row)) for row in db.execute(sql + ' ORDER BY time', args)]
+    finally:
+        db.close()
+
+###################################################################################
+# Transmissions and airtime per talkgroup (or per call) from end rows.  Talkgroups
+# also get the last name they were heard under.
+###################################################################################
+def airtime(rows, key='tg'):
+    totals = {}
+    for row in rows:
+        t = totals.setdefault(row[key], {key: row[key], 'count': 0, 'airtime': 0.0})
+        if key == 'tg':
+            t['tg_name'] = row.get('tg_name') or t.get('tg_name', '')
+        t['count'] += 1
+        t['airtime'] = round(t['airtime'] + (row['duration'] or 0.0), 2)
+    return sorted(totals.values(), key=lambda t: -t['airtime'])
+
+# "2026-10-01", "2026-10-01 18:30" or seconds since the epoch
+def parseTime(text):
+    try:
+        return float(text)
+    except ValueError:
+        return datetime.fromisoformat(text).timestamp()
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='lastheard.py', description='Query and export the pyUC last heard journal')
+    parser.add_argument('journal', nargs='?', default=DEFAULT_JOURNAL_FILE)
+    parser.add_argument('--since', type=parseTime)
+    parser.add_argument('--until', type=parseTime)
+    parser.add_argument('--call')
+    parser.add_argument('--tg')
+    parser.add_argument('--event', default='end', choices=('begin', 'end', 'all'))
+    parser.add_argument('--airtime', choices=('tg', 'call'), help='totals per talkgroup or call instead of rows')
+    parser.add_argument('--format', default='csv', choices=('csv', 'json'))
+    args = parser.parse_args(argv[1:])
+
+    event = 'end' if args.airtime != None else (None if args.event == 'all' else args.event)
+    try:
+        rows = queryJournal(args.journal, args.since, args.until, args.call, args.tg, event)
+    except (OSError, sqlite3.Error):
+        print("lastheard.py: can not read {}: {}".format(args.journal, sys.exc_info()[1]), file=sys.stderr)
+        return 1
+    if args.airtime != None:
+        rows = airtime(rows, args.airtime)
+        columns = ('tg', 'tg_name', 'count', 'airtime') if args.airtime == 'tg' else ('call', 'count', 'airtime')
+    else:
+        for row in rows:
+            row['time'] = datetime.fromtimestamp(row['time']).isoformat(' ', 'seconds')
+        columns = JOURNAL_COLUMNS
+    if args.format == 'json':
+        json.dump(rows, sys.stdout, indent=1)
+        print()
+    else:
+        writer = csv.DictWriter(sys.stdout, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -18,92 +18,56 @@
 # PERFORMANCE OF THIS SOFTWARE.
 ###################################################################################
 
+import sys
+import usrp
+
+args = usrp.parseArgs(sys.argv)             # parsed once here, the UI setup below uses the same args
+if __name__ == '__main__':                  # The headless gateway never touches Tk
+    if args.headless:
+        sys.exit(usrp.runHeadless(args))
+    if args.profile:
+        usrp.startProfile()
+
 from tkinter import *
 from tkinter import ttk
-from time import time, sleep, localtime, strftime
-from random import randint
+from time import time, localtime, strftime
 from tkinter import messagebox
-import socket
-import struct
-import _thread
-import shlex
-import configparser, traceback
-import pyaudio
-import audioop
-import json
 import logging
-import webbrowser
 import os
 import io
-import base64
-import urllib.request
 import queue
-from pathlib import Path
-import hashlib
+import threading
 from tkinter import font
-import sys
+from usrp import SessionGroup, loadConfig, noQuote, startupMark, startupReport, STRING_SOCKET_FAILURE
+from audio import AudioPipeline, listAudioDevices
+from lastheard import LastHeard, openHeardJournal
+from txplay import TxPlayer, FileSource, PLAY_MACRO
 
 UC_VERSION = "1.2.3"
 
-###################################################################################
-# Declare input and output ports for communication with AB
-###################################################################################
-usrp_tx_port = 12345
-usrp_rx_port = 12345
-
-###################################################################################
-# USRP packet types
-###################################################################################
-USRP_TYPE_VOICE = 0
-USRP_TYPE_DTMF = 1
-USRP_TYPE_TEXT = 2
-USRP_TYPE_PING = 3
-USRP_TYPE_TLV = 4
-USRP_TYPE_VOICE_ADPCM = 5
-USRP_TYPE_VOICE_ULAW = 6
-
-###################################################################################
-# TLV tags
-###################################################################################
-TLV_TAG_BEGIN_TX    = 0
-TLV_TAG_AMBE        = 1
-TLV_TAG_END_TX      = 2
-TLV_TAG_TG_TUNE     = 3
-TLV_TAG_PLAY_AMBE   = 4
-TLV_TAG_REMOTE_CMD  = 5
-TLV_TAG_AMBE_49     = 6
-TLV_TAG_AMBE_72     = 7
-TLV_TAG_SET_INFO    = 8
-TLV_TAG_IMBE        = 9
-TLV_TAG_DSAMBE      = 10
-TLV_TAG_FILE_XFER   = 11
-
 ###################################################################################
 # Globals (gah)
 ###################################################################################
 noTrace = False                     # Boolean to control recursion when a new mode is selected
-usrpSeq = 0                         # Each USRP packet has a unique sequence number
-udp = None                          # UDP socket for USRP traffic
-out_index = None                    # Current output (speaker) index in the pyaudio device list
+client = None                       # USRPClient, the session with AB
+sessions = None                     # SessionGroup, client plus one more session per [SESSIONS] entry
+pipeline = None                     # AudioPipeline, speaker and mic
 in_index = None                     # Current input (mic) index in the pyaudio device list
-regState = False                    # Global registration state boolean
-noQuote = {ord('"'): ''}
 empty_photo = ("photo", "", "", "") # instance of a blank photo
-SAMPLE_RATE = 48000                 # Default audio sample rate for pyaudio (will be resampled to 8K)
 toast_frame = None                  # A toplevel window used to display toast messages
-ipc_queue = None                    # Queue used to pass info to main hread (UI)
-ptt = False                         # Current ptt state
+ipc_queue = None                    # UIEventBus used to pass info to main thread (UI)
 tx_start_time = 0                   # TX timer
-done = False                        # Thread stop flag
-transmit_enable = True              # Make sure that UC is half duplex
 useQRZ = True
-level_every_sample = 1
-NAT_ping_timer = 0
 
 listbox = None                      # tk object (talkgroup)
+listbox_rows = None                 # talk_groups index of each listbox row, None when the list is not filtered
+listbox_filter = ""                 # filter text listbox_rows was made with
 transmitButton = None               # tk object
 logList = None                      # tk object
-macros = {}
+last_heard = None                   # LastHeard history, logList shows a window of it
+journal = None                      # HeardJournal on disk, None if journalFile is off
+tx_players = {}                     # session name -> TxPlayer for play: macros
+file_status = None                  # status line to restore after a file transfer
 
 uc_background_color = "gray25"
 uc_text_color = "white"
@@ -116,13 +80,7 @@ STRING_FATAL_ERROR = "fatal error, python package not found: "
 STRING_TALKGROUP = "Talk Group"
 STRING_OK = "OK"
 STRING_REGISTERED =  "Registered"
-STRING_WINDOWS_PORT_REUSE = "On Windows, ignore the port reuse"
-STRING_FATAL_OUTPUT_STREAM = "fatal error, can not open output audio stream"
-STRING_OUTPUT_STREAM_ERROR = "Output stream  open error"
-STRING_FATAL_INPUT_STREAM = "fatal error, can not open input audio stream"
-STRING_INPUT_STREAM_ERROR = "Input stream  open error"
 STRING_CONNECTION_FAILURE = "Connection failure"
-STRING_SOCKET_FAILURE = "Socket failure"
 STRING_CONNECTED_TO = "Connected to"
 STRING_DISCONNECTED = "Disconnected "
 STRING_SERVER = "Server"
@@ -135,6 +93,7 @@ STRING_INPUT = "Input"
 STRING_OUTPUT = "Output"
 STRING_TALKGROUPS = "Talk Groups"
 STRING_TG = "TG"
+STRING_FILTER = "Find"
 STRING_TS = "TS"
 STRING_CONNECT = "Connect"
 STRING_DISCONNECT = "Disconnect"
@@ -144,15 +103,13 @@ STRING_CALL = "Call"
 STRING_SLOT = "Slot"
 STRING_LOSS = "Loss"
 STRING_DURATION = "Duration"
+STRING_HEARD_STATS = "Heard {} times, {} on the air, last {}"
 STRING_MODE = "MODE"
 STRING_REPEATER_ID = "Repeater ID"
 STRING_SUBSCRIBER_ID = "Subscriber ID"
 STRING_TAB_MAIN = "Main"
 STRING_TAB_SETTINGS = "Settings"
 STRING_TAB_ABOUT = "About"
-STRING_CONFIG_NOT_EDITED = 'Please edit the configuration file and set it up correctly. Exiting...'
-STRING_CONFIG_FILE_ERROR = "Config (ini) file error: "
-STRING_EXITING = "Exiting pyUC..."
 STRING_VOX = "Vox"
 STRING_DONGLE_MODE = "Dongle Mode"
 STRING_VOX_ENABLE = "Vox Enable"
@@ -161,92 +118,70 @@ STRING_VOX_DELAY = "Delay"
 STRING_NETWORK = "Network"
 STRING_LOOPBACK = "Loopback"
 STRING_IP_ADDRESS = "IP Address"
-STRING_PRIVATE = "Private"
-STRING_GROUP = "Group"
 STRING_TRANSMIT = "Transmit"
+STRING_SESSIONS = "Sessions"
+STRING_MONITOR = "Monitor"
+STRING_TX = "TX"
+STRING_NO_QRZ = "QRZ photos disabled, python package not found: "
+STRING_FILE_RECEIVED = "File received"
+STRING_FILE_FAILED = "File transfer failed"
+STRING_FILE_PROGRESS = "Receiving {} {}% ({} kB/s)"
+STRING_PLAY_ERROR = "Can not play file: "
 
 ###################################################################################
-# HTML/QRZ import libraries
-try:
-    from urllib.request import urlopen
-    from bs4 import BeautifulSoup
-    from PIL import Image, ImageTk
-    import requests
-except:
-    print(STRING_FATAL_ERROR + str(sys.exc_info()[1]))
-    exit(1)
-
+# HTML/QRZ libraries (PIL, bs4, requests) are only imported when useQRZ is set
+###################################################################################
+Image = ImageTk = None
 qrz_label = None
-qrz_cache = {}      # we use this cache to 1) speed execution 2) limit the lookup count on qrz.com. 3) cache the thumbnails we do find
-html_queue = None   # IPC queue to pass in lookup requests.  Each request is a callsign to lookup.  Successful lookups place the result in the ipc_queue
-
-# Place the HTML lookup and image ownload on a different thread so as to not block the UI
-def html_thread():
-    global html_queue
-    html_queue = queue.Queue()              # Create the queue
-    while done == False:
-        try:
-            callsign, name = html_queue.get(0)        # wait forever for a message to be placed in the queue (a callsign)
-            photo = getQRZImage( callsign ) if useQRZ else ""    # lookup the call and return an image     
-            ipc_queue.put(("photo", callsign, photo, name))
-        except queue.Empty:
-            pass
-        sleep(0.1)
-
-# Return the URL of an image associated with the callsign.  The URL may be cached or scraped from QRZ    
-def getImgUrl( callsign ):
-    img = ""
-    if callsign in qrz_cache:
-        return qrz_cache[callsign]['url']
+qrz_cache = None    # QRZCache on disk, it 1) speeds execution 2) limits the lookup count on qrz.com 3) keeps the thumbnails we do find
+qrz_lookup = None   # QRZLookup worker pool, the HTML lookup and image download run there so as to not block the UI or the network
+qrz_generation = 0  # Bumped for every photo request, results for an older one are stale
 
+# Import the QRZ stack and open the cache, without it we run with photos turned off
+def initQRZ():
+    global Image, ImageTk, qrz_cache, qrz_lookup, useQRZ
     try:
-        # specify the url
-        quote_page = 'https://qrz.com/lookup/' + callsign
-
-        # query the website and return the html to the variable ‘page’
-        page = urlopen(quote_page, timeout=20).read()
-
-        # parse the html using beautiful soup and store in variable `soup`
-        soup = BeautifulSoup(page, 'html.parser')
-        img = soup.find(id='mypic')['src']
+        from PIL import Image, ImageTk
+        from qrz import QRZCache, QRZLookup
     except:
-        pass
-    qrz_cache[callsign] = {'url' : img}
-    return img
-
-# Given a URL, download the image from the web and return it.
-def getQRZImage( callsign ):
-    photo = ""              # If not found, this will be returned (causes the image to blank out)
-    if len(callsign) > 0:
-        image_url = getImgUrl(callsign)
-        if len(image_url) > 0:
-            if 'image' in qrz_cache[callsign]:
-                return qrz_cache[callsign]['image']
-            resp = requests.get(image_url, stream=True).raw
-            try:
-                image = Image.open(resp)
-                image.thumbnail((170,110), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(image)
-            except:
-                pass
-            qrz_cache[callsign]['image'] = photo
-    return photo
+        logging.warning(STRING_NO_QRZ + str(sys.exc_info()[1]))
+        useQRZ = False
+        return
+    qrz_cache = QRZCache(uc_config.qrzCacheFile, uc_config.qrzCacheSize, uc_config.qrzNegativeTTL)
+    qrz_lookup = QRZLookup(qrz_cache)
+
+# Run on the main thread, ask for a callsign's photo (or a clear with "").  Only the
+# newest request may change the picture, and queued lookups for anyone else are dropped.
+def lookupCall(callsign, name):
+    global qrz_generation
+    qrz_generation += 1
+    generation = qrz_generation
+    if qrz_lookup != None:
+        qrz_lookup.cancelExcept(callsign)
+    if len(callsign) == 0 or useQRZ == False:
+        ipc_queue.put(("photo", callsign, "", name))
+        return
+    qrz_lookup.lookup(callsign).add_done_callback(lambda f: photoReady(f, generation, callsign, name))
+
+# Runs on a lookup worker (or the main thread for a cached call)
+def photoReady(future, generation, callsign, name):
+    if generation == qrz_generation and future.cancelled() == False and future.exception() == None:
+        ipc_queue.put(("photo", callsign, future.result(), name))
 
 # Run on the main thread, show the image in the passed UI element (label)
 def showQRZImage( msg, in_label ):
-    photo = msg[2]
+    photo = ""
+    if len(msg[2]) > 0 and ImageTk != None:     # PNG thumbnail bytes, Tk images can only be made on this thread
+        try:
+            photo = ImageTk.PhotoImage(Image.open(io.BytesIO(msg[2])))
+        except:
+            pass
     in_label.configure(image=photo)
     in_label.image = photo
     in_label.callsign = msg[1]
     current_call.set(msg[1])
     current_name.set(msg[3])
 
-###################################################################################
-def ping_thread():
-    while done == False:
-        sleep(20.0)
-        sendUSRPCommand(bytes("PING", 'ASCII'), USRP_TYPE_PING)
-
 ###################################################################################
 # Log output to console
 ###################################################################################
@@ -270,10 +205,10 @@ class MyDialog:
 
         Label(top, text=STRING_TALKGROUP, fg=uc_text_color, bg=uc_background_color).pack()
         
-        if len(macros) == 0:
+        if len(client.macros) == 0:
             self.e = Entry(top, fg=uc_text_color, bg=uc_background_color)
         else:
-            self.e = ttk.Combobox(top, values=list(macros.values()))
+            self.e = ttk.Combobox(top, values=list(client.macros.values()))
 
         self.e.bind("<Return>", self.ok)
         self.e.bind("<Escape>", self.cancel)
@@ -300,406 +235,28 @@ class MyDialog:
             tg_name = tg = item
             lst = item.split(',')
             if len(lst) == 1:
-                if item in macros.values():
-                    i = list(macros.values()).index(item)
-                    tg = list(macros.keys())[i]
+                if item in client.macros.values():
+                    i = list(client.macros.values()).index(item)
+                    tg = list(client.macros.keys())[i]
             else:
                 tg_name = lst[0]
                 tg = lst[1]
             connect((tg, tg_name))
-            if tg.startswith('*') == False:
-                i = None
-                for x in talk_groups[mode]:
-                    if x[1] == tg:
-                        i = x
-                if i == None: # tg not found?
+            if tg.startswith('*') == False and tg.startswith(PLAY_MACRO) == False:
+                if talk_groups[mode].indexOfRaw(tg) == -1: # tg not found?
                     talk_groups[mode].append((tg_name, tg))
                     fillTalkgroupList(master.get())
                 selectTGByValue(tg)
                 listbox.see(listbox.curselection())
         self.top.destroy()
 
-###################################################################################
-# Open the UDP socket for TX and RX
-###################################################################################
-def openStream():
-    global usrpSeq
-    global udp
-
-    usrpSeq = 0
-    udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    try:
-        udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
-    except:
-        logging.info(STRING_WINDOWS_PORT_REUSE)
-        pass
-    if (usrp_rx_port in usrp_tx_port) == False:    # single  port reply does not need a bind
-        udp.bind(('', usrp_rx_port))
-
-def sendto(usrp):
-    for port in usrp_tx_port:
-        udp.sendto(usrp, (ip_address.get(), port))
-
-from ctypes import *
-from contextlib import contextmanager
-
-ERROR_HANDLER_FUNC = CFUNCTYPE(None, c_char_p, c_int, c_char_p, c_int, c_char_p)
-
-def py_error_handler(filename, line, function, err, fmt):
-    pass
-
-c_error_handler = ERROR_HANDLER_FUNC(py_error_handler)
-
-@contextmanager
-def noalsaerr():
-    try:
-        asound = cdll.LoadLibrary('libasound.so')
-        asound.snd_lib_error_set_handler(c_error_handler)
-        yield
-        asound.snd_lib_error_set_handler(None)
-    except:
-        yield
-        pass
-
 ###################################################################################
 # Log the EOT
 ###################################################################################
-def log_end_of_transmission(call,rxslot,tg,loss,start_time):
-    logging.info('End TX:   {} {} {} {} {:.2f}s'.format(call, rxslot, tg, loss, time() - start_time))
-    logList.see(logList.insert('', 'end', None, values=(
-        strftime(" %m/%d/%y", localtime(start_time)),
-        strftime("%H:%M:%S", localtime(start_time)),
-        call.ljust(10), rxslot, tg, loss, '{:.2f}s'.format(time() - start_time))))
-    root.after(1000, logList.yview_moveto, 1)
+def log_end_of_transmission(call,rxslot,tg,loss,start_time,duration,stats=None,tg_value=None):
+    logList.append(call, rxslot, tg, loss, start_time, duration)
     current_tx_value.set(my_call)
-    html_queue.put(("", ""))  # clear the photo, use queue for short transmissions
-
-###################################################################################
-# RX thread, collect audio and metadata from AB
-###################################################################################
-def rxAudioStream():
-    global ip_address
-    global noTrace
-    global regState
-    global transmit_enable
-    global macros
-
-    logging.info('Start rx audio thread')
-    USRP = bytes("USRP", 'ASCII')
-    REG = bytes("REG:", 'ASCII')
-    UNREG = bytes("UNREG", 'ASCII')
-    OK = bytes("OK", 'ASCII')
-    INFO = bytes("INFO:", 'ASCII')
-    EXITING = bytes("EXITING", 'ASCII')
-
-    FORMAT = pyaudio.paInt16
-    CHUNK = 160 if SAMPLE_RATE == 8000 else (160*6)     # Size of chunk to read
-    CHANNELS = 1
-    RATE = SAMPLE_RATE
-    
-    try:
-        stream = p.open(format=FORMAT,
-                        channels = CHANNELS,
-                        rate = RATE,
-                        output = True,
-                        frames_per_buffer = CHUNK,
-                        output_device_index=out_index
-                        )
-    except:
-        logging.critical(STRING_FATAL_OUTPUT_STREAM + str(sys.exc_info()[1]))
-        messagebox.showinfo(STRING_USRP_CLIENT, STRING_OUTPUT_STREAM_ERROR)
-        os._exit(1)
-
-    _i = p.get_default_output_device_info().get('index') if out_index == None else out_index
-    logging.info("Output Device: {} Index: {}".format(p.get_device_info_by_host_api_device_index(0, _i).get('name'), _i))
-
-    lastKey = -1
-    start_time = time()
-    call = ''
-    name = ''
-    tg = ''
-    lastSeq = 0
-    seq = 0
-    loss = '0.00%'
-    rxslot = '0'
-    state = None
-    
-    while done == False:
-        soundData, addr = udp.recvfrom(1024)
-        if addr[0] != ip_address.get():
-            ip_address.set(addr[0]) # OK, this was supposed to help set the ip to a server, but multiple servers ping/pong.  I may remove it.
-        if (soundData[0:4] == USRP):
-            eye = soundData[0:4]
-            seq, = struct.unpack(">i", soundData[4:8])
-            memory, = struct.unpack(">i", soundData[8:12])
-            keyup, = struct.unpack(">i", soundData[12:16])
-            talkgroup, = struct.unpack(">i", soundData[16:20])
-            type, = struct.unpack("i", soundData[20:24])
-            mpxid, = struct.unpack(">i", soundData[24:28])
-            reserved, = struct.unpack(">i", soundData[28:32])
-            audio = soundData[32:]
-            if (type == USRP_TYPE_VOICE): # voice
-                audio = soundData[32:]
-                #print(eye, seq, memory, keyup, talkgroup, type, mpxid, reserved, audio, len(audio), len(soundData))
-                if (len(audio) == 320):
-                    if RATE == 48000:
-                        (audio48, state) = audioop.ratecv(audio, 2, 1, 8000, 48000, state)
-                        stream.write(bytes(audio48), CHUNK)
-                        if (seq % level_every_sample) == 0:
-                            rms = audioop.rms(audio, 2)     # Get a relative power value for the sample
-                            audio_level.set(int(rms/100))
-                    else:
-                        stream.write(audio, CHUNK)
-                if (keyup != lastKey):
-                    logging.debug('key' if keyup else 'unkey')
-                    if keyup:
-                        start_time = time()
-                    if keyup == False:
-                        log_end_of_transmission(call, rxslot, tg, loss, start_time)
-                        transmit_enable = True  # Idle state, allow local transmit
-                        audio_level.set(0)
-                lastKey = keyup
-            elif (type == USRP_TYPE_TEXT): #metadata
-                if (audio[0:4] == REG):
-                    if (audio[4:6] == OK):
-                        connected_msg.set(STRING_REGISTERED)
-                        sendMetadata()
-                        requestInfo()
-                        if in_index == -1:
-                            transmitButton.configure(state='disabled')
-                        else:
-                            transmitButton.configure(state='normal')
-                        regState = True
-                    elif (audio[4:9] == UNREG):
-                        disconnect()
-                        transmitButton.configure(state='disabled')
-                        regState = False
-                        pass
-                    elif (audio[4:11] == EXITING):
-                        disconnect()
-                        tmp = audio[:audio.find(b'\x00')].decode('ASCII') # C string
-                        args = tmp.split(" ")
-                        sleepTime = int(args[2])
-                        logging.info("AB is exiting and wants a re-reg in %s seconds...", sleepTime)
-                        if (sleepTime > 0):
-                            sleep(sleepTime)
-                            registerWithAB()
-                    logging.info(audio[:audio.find(b'\x00')].decode('ASCII'))
-                elif (audio[0:5] == INFO):
-                    _json = audio[5:audio.find(b'\x00')].decode('ASCII')
-                    if (_json[0:4] == "MSG:"):
-                        logging.info("Text Message: " + _json[4:])
-                        ipc_queue.put(("toast", "Text Message", _json[4:]))
-                    elif (_json[0:6] == "MACRO:"):  # An ad-hoc macro menu
-                        logging.info("Macro: " + _json[6:])
-                        macs = _json[6:]
-                        macrosx = dict(x.split(",") for x in macs.split("|"))
-                        macros = { k:v.strip() for k, v in macrosx.items()}
-                        ipc_queue.put(("macro", ""))    # popup the menu
-                    elif (_json[0:5] == "MENU:"):  # An ad-hoc macro menu
-                        logging.info("Menu: " + _json[5:])
-                        macs = _json[5:]
-                        macrosx = dict(x.split(",") for x in macs.split("|"))
-                        macros = { k:v.strip() for k, v in macrosx.items()}
-                    else:
-                        obj=json.loads(audio[5:audio.find(b'\x00')].decode('ASCII'))
-                        noTrace = True  # ignore the event generated by setting the combo box
-                        if (obj["tlv"]["ambe_mode"][:3] == "YSF"):
-                            master.set("YSF")
-                        else:
-                            master.set(obj["tlv"]["ambe_mode"])
-                        noTrace = False
-                        logging.info(audio[:audio.find(b'\x00')].decode('ASCII'))
-                        connected_msg.set( STRING_CONNECTED_TO + " " + obj["last_tune"] )
-                        selectTGByValue(obj["last_tune"])
-                else:
-                    # Tunnel a TLV inside of a USRP packet
-                    if audio[0] == TLV_TAG_SET_INFO:
-                        if transmit_enable == False:    #EOT missed?
-                            log_end_of_transmission(call, rxslot, tg, loss, start_time)
-                        rid = (audio[2] << 16) + (audio[3] << 8) + audio[4] # Source
-                        tg = (audio[9] << 16) + (audio[10] << 8) + audio[11] # Dest
-                        rxslot = audio[12]
-                        rxcc = audio[13]
-                        mode = STRING_PRIVATE if (rxcc  & 0x80) else STRING_GROUP
-                        name = ""
-                        if audio[14] == 0: # C string termintor for call
-                            call = str(rid)
-                        else:
-                            call = audio[14:audio.find(b'\x00', 14)].decode('ASCII')
-                            if call[0] == '{':    # its a json dict
-                                obj=json.loads(call)
-                                call = obj['call']
-                                name = obj['name'].split(' ')[0] if 'name' in obj else ""
-                        listName = master.get()
-                        if (listName == 'DSTAR') or (listName == "YSF"): # for these modes the TG is not valid
-                            tg = getCurrentTGName()
-                        elif tg == subscriber_id.get(): # is the dest TG my dmr ID? (private call)
-                            tg = my_call
-                        for item in talk_groups[listName]:
-                            if item[1] == str(tg):
-                                tg = item[0]    # Found the TG number in the list, so we can use its friendly name
-                        current_tx_value.set('{} -> {}'.format(call, tg))
-                        logging.info('Begin TX: {} {} {} {}'.format(call, rxslot, tg, mode))
-                        transmit_enable = False # Transmission from network will disable local transmit
-                        if call.isdigit() == False:
-                            html_queue.put((call, name))
-                        if ((rxcc  & 0x80) and (rid > 10000)): # > 10000 to exclude "4000" from BM
-#                            logging.info('rid {} ctg {}'.format(rid, getCurrentTG()))
-                            # a dial string with a pound is a private call, see if the current TG matches
-                            privateTG = str(rid) + '#'
-                            if (privateTG != getCurrentTG()):
-                                #Tune to tg
-                                sendRemoteControlCommandASCII("txTg=" + privateTG)
-                                talk_groups[listName].append((call + " Private", privateTG))
-                                fillTalkgroupList(listName)
-                                tg = privateTG # Make log entries say the right thing
-                            selectTGByValue(privateTG)
-            elif (type == USRP_TYPE_PING):
-                if transmit_enable == False:    # Do we think we receiving packets?, lets test for EOT missed
-                    if (lastSeq+1) == seq:
-                        logging.info("missed EOT")
-                        log_end_of_transmission(call, rxslot, tg, loss, start_time)
-                        transmit_enable = True  # Idle state, allow local transmit
-                    lastSeq = seq
-#                logging.debug(audio[:audio.find('\x00')])
-                pass
-            elif (type == USRP_TYPE_TLV):
-                tag = audio[0]
-                length = audio[1]
-                value = audio[2:]    
-                if tag == TLV_TAG_FILE_XFER:
-                    FILE_SUBCOMMAND_NAME = 0
-                    FILE_SUBCOMMAND_PAYLOAD = 1
-                    FILE_SUBCOMMAND_WRITE = 2
-                    FILE_SUBCOMMAND_READ = 3
-                    FILE_SUBCOMMAND_ERROR = 4
-                    if value[0] == FILE_SUBCOMMAND_NAME:
-                        file_len = (value[1] << 24) + (value[2] << 16) + (value[3] << 8) + value[4]
-                        file_name = value[5:]
-                        zero = file_name.find(0)
-                        file_name = file_name[:zero].decode('ASCII')
-                        logging.info("File transfer name: " + file_name)
-                        m = hashlib.md5()
-                    if value[0] == FILE_SUBCOMMAND_PAYLOAD:
-                        logging.debug("payload len = " + str(length-1))
-                        payload = value[1:length]
-                        m.update(payload)
-                        #logging.debug(payload.hex())
-                        #logging.debug(payload)
-                    if value[0] == FILE_SUBCOMMAND_WRITE:
-                        digest = m.digest().hex().upper()
-                        file_md5 = value[1:33].decode('ASCII')
-                        if (digest == file_md5):
-                            logging.info("File digest matches")
-                        else:
-                            logging.info("File digest does not match {} vs {}".format(digest, file_md5))
-                        #logging.info("write (md5): " + value[1:33].hex())
-                    if value[0] == FILE_SUBCOMMAND_ERROR:
-                        logging.info("error")
-        else:
-#            logging.info(soundData, len(soundData))
-            pass
-
-#    udp.close()
-
-###################################################################################
-# TX thread, send audio to AB
-###################################################################################
-def txAudioStream():
-    global usrpSeq
-    global ptt
-    global transmit_enable
-    FORMAT = pyaudio.paInt16                            # 16 bit signed ints
-    CHUNK = 160 if SAMPLE_RATE == 8000 else (160*6)     # Size of chunk to read
-    CHANNELS = 1                                        # mono
-    RATE = SAMPLE_RATE
-    state = None                                        # resample state between fragments
-    
-    try:
-        stream = p.open(format=FORMAT,
-                        channels = CHANNELS,
-                        rate = RATE,
-                        input = True,
-                        frames_per_buffer = CHUNK,
-                        input_device_index=in_index
-                        )
-    except:
-        logging.critical(STRING_FATAL_INPUT_STREAM + str(sys.exc_info()[1]))
-        transmit_enable = False
-        ipc_queue.put(("dialog", "Text Message", STRING_INPUT_STREAM_ERROR))
-        return
-
-    _i = p.get_default_output_device_info().get('index') if in_index == None else in_index
-    logging.info("Input Device: {} Index: {}".format(p.get_device_info_by_host_api_device_index(0, _i).get('name'), _i))
-
-    lastPtt = ptt
-    while done == False:
-        try:
-
-            if RATE == 48000:       # If we are reading at 48K we need to resample to 8K
-                audio48 = stream.read(CHUNK, exception_on_overflow=False)
-                (audio, state) = audioop.ratecv(audio48, 2, 1, 48000, 8000, state)
-            else:
-                audio = stream.read(CHUNK, exception_on_overflow=False)
-
-            rms = audioop.rms(audio, 2)     # Get a relative power value for the sample
-            ###### Vox processing #####
-            if vox_enable.get():
-                if rms > vox_threshold.get():   # is it loud enough?
-                    decay = vox_delay.get()     # Yes, reset the decay value (wont unkey for N samples)
-                    if (ptt == False) and (transmit_enable == True):            # Are we changing ptt state to True?
-                        ptt = True              # Set it
-                        showPTTState(0)         # Update the UI (turn transmit button red, etc)
-                elif ptt == True:               # Are we too soft and transmitting?
-                    decay -= 1                  # Decrement the decay counter
-                    if decay <= 0:              # Have we passed N samples, all of them less then the threshold?
-                        ptt = False             # Unkey
-                        showPTTState(1)         # Update the UI
-            ###########################
-
-            if ptt != lastPtt:
-                usrp = 'USRP'.encode('ASCII') + struct.pack('>iiiiiii',usrpSeq, 0, ptt, 0, USRP_TYPE_VOICE, 0, 0) + audio
-                sendto(usrp)
-                usrpSeq = usrpSeq + 1
-            lastPtt = ptt
-            if ptt:
-                usrp = 'USRP'.encode('ASCII') + struct.pack('>iiiiiii',usrpSeq, 0, ptt, 0, USRP_TYPE_VOICE, 0, 0) + audio
-                sendto(usrp)
-                usrpSeq = usrpSeq + 1
-                audio_level.set(int(rms/100))
-        except:
-            logging.warning("TX thread:" + str(sys.exc_info()[1]))
-
-def debugAudio():
-    p = pyaudio.PyAudio()
-    info = p.get_host_api_info_by_index(0)
-    print("------------------------------------")
-    print("Info: ", info)
-    print("------------------------------------")
-    numdevices = info.get('deviceCount')
-    for i in range(0, numdevices):
-        if (p.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels')) > 0:
-            print("Input Device id ", i, " - ", p.get_device_info_by_host_api_device_index(0, i).get('name'))
-        print("Device: ", p.get_device_info_by_host_api_device_index(0, i))
-        print("===============================")
-    print("Output: ", p.get_default_output_device_info())
-    print("Input: ", p.get_default_input_device_info())
-
-def listAudioDevices(want_input):
-    devices = []
-    p = pyaudio.PyAudio()
-    info = p.get_host_api_info_by_index(0)
-    numdevices = info.get('deviceCount')
-    for i in range(0, numdevices):
-        is_input = p.get_device_info_by_host_api_device_index(0, i).get('maxInputChannels') > 0
-        if (is_input and want_input) or (want_input == False and is_input == False):
-            devices.append(p.get_device_info_by_host_api_device_index(0, i).get('name'))
-            logging.info("Device id {} - {}".format(i, p.get_device_info_by_host_api_device_index(0, i).get('name')))
-    return devices
-
-#debugAudio()
-#exit(1)
+    lookupCall("", "")  # clear the photo, a lookup still running for the talker is ignored
 
 ###################################################################################
 # Catch and display any socket errors
@@ -708,78 +265,6 @@ def socketFailure():
     connected_msg.set( STRING_CONNECTION_FAILURE )
     logging.error(STRING_SOCKET_FAILURE)
 
-###################################################################################
-# Send command to AB
-###################################################################################
-def sendUSRPCommand( cmd, packetType ):
-    global usrpSeq
-    logging.info("sendUSRPCommand: "+ str(cmd))
-    try:
-        # Send "text" packet to AB. 
-        usrp = 'USRP'.encode('ASCII') + (struct.pack('>iiiiiii',usrpSeq, 0, 0, 0, packetType << 24, 0, 0)) + cmd
-        usrpSeq = (usrpSeq + 1) & 0xffff
-        sendto(usrp)
-    except:
-        traceback.print_exc()
-        socketFailure()
-
-###################################################################################
-# Send command to AB
-###################################################################################
-def sendRemoteControlCommand( cmd ):
-    logging.info("sendRemoteControlCommand: "+ str(cmd))
-    # Use TLV to send command (wrapped in a USRP packet). 
-    tlv = struct.pack("BB", TLV_TAG_REMOTE_CMD, len(cmd))[0:2] + cmd
-    sendUSRPCommand(tlv, USRP_TYPE_TLV)
-
-def sendRemoteControlCommandASCII( cmd ):
-    sendRemoteControlCommand(bytes(cmd, 'ASCII'))
-###################################################################################
-# Send command to DMRGateway
-###################################################################################
-def sendToGateway( cmd ):
-    logging.info("sendToGateway: " + cmd)
-
-###################################################################################
-# Begin the registration sequence
-###################################################################################
-def registerWithAB():
-    sendUSRPCommand(bytes("REG:DVSWITCH", 'ASCII'), USRP_TYPE_TEXT)
-
-###################################################################################
-# Unregister from server
-###################################################################################
-def unregisterWithAB():
-    sendUSRPCommand(bytes("REG:UNREG", 'ASCII'), USRP_TYPE_TEXT)
-
-###################################################################################
-# Request the INFO json from AB
-###################################################################################
-def requestInfo():
-    sendUSRPCommand(bytes("INFO:", 'ASCII'), USRP_TYPE_TEXT)
-
-###################################################################################
-# 
-###################################################################################
-def sendMetadata():
-    dmr_id = subscriber_id.get()
-    call = bytes(my_call, 'ASCII')+bytes(chr(0), 'ASCII')
-    tlvLen = 3 + 4 + 3 + 1 + 1 + len(my_call) + 1                      # dmrID, repeaterID, tg, ts, cc, call, 0
-    cmd = struct.pack("BBBBBBBBBBBBBB", TLV_TAG_SET_INFO, tlvLen, ((dmr_id >> 16) & 0xff),((dmr_id >> 8) & 0xff),(dmr_id & 0xff),0,0,0,0,0,0,0,0,0)[0:14] + call
-    sendUSRPCommand(cmd, USRP_TYPE_TEXT)
-
-###################################################################################
-# Set the size (number of bits) of each AMBE sample
-###################################################################################
-def setAMBESize(size):
-    sendRemoteControlCommandASCII("ambeSize="+size)
-
-###################################################################################
-# Set the AMBE mode to DMR|DSTAR|YSF|NXDN|P25
-###################################################################################
-def setAMBEMode(mode):
-    sendRemoteControlCommandASCII("ambeMode="+mode)
-
 ###################################################################################
 # 
 ###################################################################################
@@ -792,12 +277,6 @@ def getInfo():
 def setRemoteNetwork( netName ):
     logging.info("setRemoteNetwork")
 
-###################################################################################
-# Set the AB mode by running the named macro
-###################################################################################
-def setMode( mode ):
-    sendUSRPCommand(bytes("*" + mode, 'ASCII'), USRP_TYPE_DTMF)
-
 ###################################################################################
 # Tell AB to select the passed tg
 ###################################################################################
@@ -811,79 +290,53 @@ def setRemoteTG( tg ):
             foo = listbox.get(atg)
             tgs = tgs + comma + foo.split(',')[1]
             comma = ","
-        sendRemoteControlCommandASCII(tgs)
-        sendRemoteControlCommandASCII("txTg=0")
+        client.sendRemoteControlCommandASCII(tgs)
+        client.sendRemoteControlCommandASCII("txTg=0")
         connected_msg.set(STRING_CONNECTED_TO)
         transmitButton.configure(state='disabled')
     else :
-        sendRemoteControlCommandASCII("tgs=" + str(tg))
-        sendUSRPCommand(bytes(str(tg), 'ASCII'), USRP_TYPE_DTMF)
-    transmit_enable = True
-##        setAMBEMode(master.get())
+        client.setRemoteTG(tg)
+##        client.setAMBEMode(master.get())
     setDMRInfo()
 
-###################################################################################
-# Set the slot 
-###################################################################################
-def setRemoteTS( ts ):
-    sendRemoteControlCommandASCII("txTs=" + str(ts))
-
-###################################################################################
-#
-###################################################################################
-def setDMRID( id ):
-    sendRemoteControlCommandASCII("gateway_dmr_id=" + str(id))
-
-###################################################################################
-#
-###################################################################################
-def setPeerID( id ):
-    sendRemoteControlCommandASCII("gateway_peer_id=" + str(id))
-
-###################################################################################
-#
-###################################################################################
-def setDMRCall( call ):
-    sendRemoteControlCommandASCII("gateway_call=" + call)
-
 ###################################################################################
 #
 ###################################################################################
 def setDMRInfo():
-    sendToGateway("set info " + str(subscriber_id.get()) + ',' + str(repeater_id.get()) + ',' + str(getCurrentTG()) + ',' + str(slot.get()) + ',1')
+    client.sendToGateway("set info " + str(subscriber_id.get()) + ',' + str(repeater_id.get()) + ',' + str(getCurrentTG()) + ',' + str(slot.get()) + ',1')
 
 ###################################################################################
 #
 ###################################################################################
 def setVoxData():
     v = "true" if vox_enable.get() > 0 else "false"
-    sendToGateway("set vox " + v)
-    sendToGateway("set vox_threshold " + str(vox_threshold.get()))
-    sendToGateway("set vox_delay " + str(vox_delay.get()))
+    client.sendToGateway("set vox " + v)
+    client.sendToGateway("set vox_threshold " + str(vox_threshold.get()))
+    client.sendToGateway("set vox_delay " + str(vox_delay.get()))
 
 ###################################################################################
 #
 ###################################################################################
 def getVoxData():
-    sendToGateway("get vox")
-    sendToGateway("get vox_threshold ")
-    sendToGateway("get vox_delay ")
+    client.sendToGateway("get vox")
+    client.sendToGateway("get vox_threshold ")
+    client.sendToGateway("get vox_delay ")
 
 ###################################################################################
 #
 ###################################################################################
 def setAudioData():
     dm = "true" if dongle_mode.get() > 0 else "false"
-    sendToGateway("set dongle_mode " + dm)
-    sendToGateway("set sp_level " + str(sp_vol.get()))
-    sendToGateway("set mic_level " + str(mic_vol.get()))
+    client.sendToGateway("set dongle_mode " + dm)
+    client.sendToGateway("set sp_level " + str(sp_vol.get()))
+    client.sendToGateway("set mic_level " + str(mic_vol.get()))
 
 ###################################################################################
 #
 ###################################################################################
 def getCurrentTG():
     items = map(int, listbox.curselection())    # get the item selected in the list
-    _first = next(iter(items))
+    _first = tgIndex(next(iter(items)))
     tg = talk_groups[master.get()][_first][1].translate(noQuote) # get the tg at that index
     return tg
 
@@ -891,32 +344,37 @@ def getCurrentTG():
 #
 ###################################################################################
 def selectTGByValue(val):
-    count = 0
-    listName = master.get()
-    for item in talk_groups[listName]:
-        if item[1].translate(noQuote) == val:
-            listbox.selection_clear(0,listbox.size()-1)
-            listbox.selection_set(count)
-        count = count + 1
+    row = tgRow(talk_groups[master.get()].indexOf(val))
+    if row != -1:
+        listbox.selection_clear(0,listbox.size()-1)
+        listbox.selection_set(row)
+
+###################################################################################
+# Map between listbox rows and talk_groups indexes (they differ while filtered)
+###################################################################################
+def tgIndex(row):
+    return row if listbox_rows == None else listbox_rows[row]
+
+def tgRow(index):
+    if index == -1 or listbox_rows == None:
+        return index
+    try:
+        return listbox_rows.index(index)
+    except ValueError:      # filtered out
+        return -1
 
 ###################################################################################
 #
 ###################################################################################
 def findTG(tg):
-    listName = master.get()
-    itemNum = 0
-    for item in talk_groups[listName]:
-        if item[1] == tg:
-            return itemNum
-        itemNum = itemNum+1
-    return -1
+    return talk_groups[master.get()].indexOfRaw(tg)
     
 ###################################################################################
 #
 ###################################################################################
 def getCurrentTGName():
     items = map(int, listbox.curselection())
-    _first = next(iter(items))
+    _first = tgIndex(next(iter(items)))
     tg = talk_groups[master.get()][_first][0]
     return tg
 
@@ -924,7 +382,7 @@ def getCurrentTGName():
 # Connect to a specific set of TS/TG values
 ###################################################################################
 def connect(tup):
-    if regState == False:
+    if client.regState == False:
         start()
     if tup != None:
         tg = tup[0]
@@ -932,12 +390,15 @@ def connect(tup):
     else:
         tg = getCurrentTG()
         tg_name = getCurrentTGName()
+    if tg.startswith(PLAY_MACRO):       # A local macro, transmit a file
+        playFile(tg[len(PLAY_MACRO):])
+        return
     if tg.startswith('*') == False:     # If it is not a macro, do a full dial sequence
         connected_msg.set( STRING_CONNECTED_TO + " " + tg_name )
 #       transmitButton.configure(state='normal')
     
         setRemoteNetwork(master.get())
-        setRemoteTS(slot.get())
+        client.setRemoteTS(slot.get())
     setRemoteTG(tg)     # set the TG (or a macro command)
 
 ###################################################################################
@@ -978,25 +439,134 @@ def toast_fade_away():
             toast_frame.destroy()
             toast_frame = None
  
-def process_queue():
-    try:
-        msg = ipc_queue.get(0)      # wait forever for a message to be placed in the queue
-        if msg[0] == "toast":   # a toast is a tupple of title and text
-            popup_toast(msg)
-        if msg[0] == "photo":    # an image is just a string containing the call to display
-            showQRZImage(msg, qrz_label) 
-        if msg[0] == "macro":
-            tgDialog(True)       
-        if msg[0] == "dialog":
-            messagebox.showinfo(STRING_USRP_CLIENT, msg[2], parent=root)
-    except queue.Empty:
-        pass
-    root.after(100, process_queue)
+###################################################################################
+# Carry messages from any thread to the Tk main thread.  put() wakes Tk with one
+# virtual event per burst; dispatch() drains everything pending in that wakeup and
+# drops superseded photo/level updates, so an idle client never wakes at all.
+###################################################################################
+class UIEventBus:
+
+    COALESCE = ("photo", "level")   # only the newest of these in a batch matters
+    EVENT = "<<UIEvent>>"
+
+    def __init__(self, root, handler):
+        self.root = root
+        self.handler = handler
+        self.queue = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.armed = True           # the first dispatch is an after() so nothing waits on mainloop starting
+        self.polling = False        # Tcl without thread support, fall back to a timer
+        root.bind(self.EVENT, self.dispatch)
+        root.after(100, self.dispatch)
+
+    def put(self, msg):
+        self.queue.put(msg)
+        with self.lock:
+            if self.armed == True:  # a wakeup is already on its way
+                return
+            self.armed = True
+        try:
+            self.root.event_generate(self.EVENT, when="tail")
+        except (RuntimeError, TclError):
+            logging.warning("UI wakeups unavailable, polling: " + str(sys.exc_info()[1]))
+            self.polling = True
+            self.root.after(100, self.dispatch)
+
+    def dispatch(self, event=None):
+        with self.lock:
+            self.armed = self.polling
+        batch = []
+        try:
+            while True:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        newest = {msg[0]: i for i, msg in enumerate(batch) if msg[0] in self.COALESCE}
+        for i, msg in enumerate(batch):
+            if msg[0] in newest and newest[msg[0]] != i:
+                continue
+            try:
+                self.handler(msg)
+            except:
+                logging.warning("UI event " + msg[0] + ": " + str(sys.exc_info()[1]))
+        if self.polling == True:
+            self.root.after(100, self.dispatch)
+
+def process_message(msg):
+    global noTrace, file_status
+    if msg[0] == "toast":   # a toast is a tupple of title and text
+        popup_toast(msg)
+    if msg[0] == "photo":    # an image is just a string containing the call to display
+        showQRZImage(msg, qrz_label) 
+    if msg[0] == "macro":
+        tgDialog(True)       
+    if msg[0] == "dialog":
+        messagebox.showinfo(STRING_USRP_CLIENT, msg[2], parent=root)
+    if msg[0] == "fatal":
+        messagebox.showinfo(STRING_USRP_CLIENT, msg[1], parent=root)
+        os._exit(1)
+    if msg[0] == "about_image":
+        showAboutImage(msg[1])
+    if msg[0] == "file_progress":   # name, received, size, bytes/s
+        if file_status == None:
+            file_status = connected_msg.get()     # put back when the file is done
+        connected_msg.set(STRING_FILE_PROGRESS.format(msg[1], msg[2] * 100 // max(msg[3], 1), msg[4] // 1024))
+    if msg[0] == "file_done":   # name, path, ok, message
+        if file_status != None:
+            connected_msg.set(file_status)
+            file_status = None
+        popup_toast(("toast", STRING_FILE_RECEIVED if msg[3] else STRING_FILE_FAILED, "{}\n{}".format(msg[1], msg[4])))
+    if msg[0] == "registered":
+        startupReport()         # once, the first time we register
+        connected_msg.set(STRING_REGISTERED)
+        if in_index == -1:
+            transmitButton.configure(state='disabled')
+        else:
+            transmitButton.configure(state='normal')
+    if msg[0] == "unregistered":
+        disconnect()
+        transmitButton.configure(state='disabled')
+    if msg[0] == "disconnected":
+        disconnect()
+    if msg[0] == "info":
+        noTrace = True  # ignore the event generated by setting the combo box
+        master.set(msg[1])
+        noTrace = False
+        connected_msg.set( STRING_CONNECTED_TO + " " + msg[2] )
+        selectTGByValue(msg[2])
+    if msg[0] == "begin_tx":
+        call = msg[1]
+        current_tx_value.set('{} -> {}'.format(call, msg[4]))
+        if call.isdigit() == False:
+            lookupCall(call, msg[2])
+    if msg[0] == "end_tx":
+        log_end_of_transmission(*msg[1:])
+        audio_level.set(0)
+        audio_peak.set(0)
+    if msg[0] == "private_call":
+        if msg[1] == master.get():
+            fillTalkgroupList(msg[1])
+        selectTGByValue(msg[2])
+    if msg[0] == "level":
+        audio_level.set(msg[1])
+        audio_peak.set(msg[2])
+    if msg[0] == "ptt":
+        showPTTState(0 if msg[1] else 1)
+    if msg[0] == "play":     # name, state
+        current_tx_value.set('{} -> {}'.format(msg[1], getCurrentTG()) if msg[2] else my_call)
+    if msg[0] == "address":
+        ip_address.set(msg[1])
+    if msg[0] == "socket_failure":
+        socketFailure()
 
 def init_queue():
     global ipc_queue
-    ipc_queue = queue.Queue()
-    root.after(100, process_queue)
+    ipc_queue = UIEventBus(root, process_message)
+
+# Events from the sessions the UI does not control, only traffic and messages get through
+def otherSessionEvent(event):
+    if event[0] in ("begin_tx", "end_tx", "toast", "ptt", "dialog", "file_progress", "file_done", "play"):
+        ipc_queue.put(event)
 
 ###################################################################################
 # Process the button press for disconnect
@@ -1010,12 +580,8 @@ def disconnectButton():
 #
 ###################################################################################
 def start():
-    global regState
-    if asl_mode.get() != 0:    # Does this look like a ASL connection to USRP?
-        transmitButton.configure(state='normal')    # Yes, fake the registration
-        regState = True
-    else:
-        registerWithAB()
+    client.aslMode = asl_mode.get()
+    client.start()
 
 ###################################################################################
 # Combined command to get all values from servers and display them on UI
@@ -1026,7 +592,7 @@ def getValuesFromServer():
 
     # get values from Analog_Bridge (repeater ID, Sub ID, master, tg, slot)
     ### Old Command ### sendRemoteControlCommand('get_info')
-    sendToGateway('get info')
+    client.sendToGateway('get info')
     #   current_tx_value.set(my_call)          #Subscriber  call
     #    master.set(servers[0])              #DMR Master
     #   repeater_id.set(311317)              #DMR Peer ID
@@ -1063,37 +629,57 @@ def sendValuesToServer():
 # Toggle PTT and display new state
 ###################################################################################
 def transmit():
-    global ptt
-    
-    if (transmit_enable == False) and (ptt == False):  # Do not allow transmit key if rx is active
+    client = txClient()
+    if (client.transmitEnable == False) and (client.ptt == False):  # Do not allow transmit key if rx is active
         return
 
-    ptt = not ptt
-    if ptt:
+    client.ptt = not client.ptt
+    if client.ptt:
         showPTTState(0)
     else:
         showPTTState(1)
 
+###################################################################################
+# The session the mic (and the transmit button) goes to
+###################################################################################
+def txClient():
+    return client if pipeline == None else pipeline.txSession.client
+
+###################################################################################
+# Transmit a WAV or PCM file (a play: macro) on the session the mic goes to
+###################################################################################
+def playFile(path):
+    session = txClient()
+    try:
+        source = FileSource(os.path.expanduser(path.strip()))
+    except:
+        messagebox.showinfo(STRING_USRP_CLIENT, STRING_PLAY_ERROR + str(sys.exc_info()[1]), parent=root)
+        return
+    if session.name not in tx_players:
+        tx_players[session.name] = TxPlayer(session)
+    tx_players[session.name].play(source)
+
 ###################################################################################
 # Update UI with PTT state.
 ###################################################################################
 def showPTTState(flag):
     global tx_start_time
-    if ptt:
+    if txClient().ptt:
         transmitButton.configure(highlightbackground='red')
         ttk.Style(root).configure("bar.Horizontal.TProgressbar", troughcolor=uc_background_color, bordercolor=uc_text_color, background="red", lightcolor="red", darkcolor="red")
         tx_start_time = time()
         current_tx_value.set('{} -> {}'.format(my_call, getCurrentTG()))
-        html_queue.put((my_call, ""))     # Show my own pic when I transmit
+        lookupCall(my_call, "")     # Show my own pic when I transmit
+        if journal != None:
+            journal.transmit(True, my_call, slot.get(), getCurrentTG(), getCurrentTGName())
         logging.info("PTT ON")
     else:
         transmitButton.configure(highlightbackground=uc_background_color)
         ttk.Style(root).configure("bar.Horizontal.TProgressbar", troughcolor=uc_background_color, bordercolor=uc_text_color, background="green", lightcolor="green", darkcolor="green")
         if flag == 1:
-            _date = strftime("%m/%d/%y", localtime(time()))
-            _time = strftime("%H:%M:%S", localtime(time()))
-            _duration = '{:.2f}'.format(time() - tx_start_time)
-            logList.see(logList.insert('', 'end', None, values=(_date, _time, my_call, str(slot.get()), str(getCurrentTGName()), '0.00%', str(_duration)+'s')))
+            logList.append(my_call, str(slot.get()), str(getCurrentTGName()), '0.00%', tx_start_time, time() - tx_start_time)
+            if journal != None:
+                journal.transmit(False, my_call, slot.get(), getCurrentTG(), getCurrentTGName())
             current_tx_value.set(my_call)
         ipc_queue.put(empty_photo)  # clear the pic when in idle state
         logging.info("PTT OFF")
@@ -1108,6 +694,15 @@ def makeTkVar( constructor, val, trace=None ):
         avar.trace('w', trace)
     return avar
 
+###################################################################################
+# Read a Tk value that may be half typed in by the user
+###################################################################################
+def tkValue( avar, valDefault ):
+    try:
+        return avar.get()
+    except:
+        return valDefault
+
 ###################################################################################
 # Callback when the master has changed
 ###################################################################################
@@ -1117,9 +712,8 @@ def masterChanged(*args):
     ipc_queue.put(empty_photo)                   # Remove any picture from screen
     if (noTrace != True):               # ignore the event generated by setting the combo box (requestInfo side effect)
         logging.info("New mode selected: %s", master.get())
-        setMode(master.get())
-        transmit_enable = True
-        root.after(1000, requestInfo())
+        client.setMode(master.get())
+        root.after(1000, client.requestInfo())
 
 ###################################################################################
 # Callback when a button is pressed
@@ -1169,6 +763,17 @@ def makeAudioFrame( parent ):
     ttk.Scale(audioFrame, from_=0, to=100, orient=HORIZONTAL, variable=sp_vol,
               command=lambda x: cb(sp_vol)).grid(column=2, row=2, sticky=(W,E), pady=1)
 
+    audioFrame.devicesListed = False      # filled in by listDevices() when the tab is first shown
+    return audioFrame
+
+###################################################################################
+# Enumerating the sound cards means starting PortAudio, so it waits until someone
+# looks at the Settings tab
+###################################################################################
+def listDevices( audioFrame ):
+    if audioFrame.devicesListed:
+        return
+    audioFrame.devicesListed = True
     devices = listAudioDevices(True)
     if len(devices) > 0:
         whiteLabel(audioFrame, STRING_INPUT).grid(column=1, row=3, sticky=W, padx = 5)
@@ -1178,25 +783,41 @@ def makeAudioFrame( parent ):
         inp.config(width=20, bg=uc_background_color)
         inp.grid(column=2, row=3, sticky=W)
 
-    whiteLabel(audioFrame, STRING_OUTPUT).grid(column=1, row=4, sticky=W, padx = 5)
     devices = listAudioDevices(False)
-    outvar = StringVar(root)
-    outvar.set(devices[0]) # default value
-    out = OptionMenu(audioFrame, outvar, *devices)
-    out.config(width=20, bg=uc_background_color)
-    out.grid(column=2, row=4, sticky=W)
-
-    return audioFrame
+    if len(devices) > 0:
+        whiteLabel(audioFrame, STRING_OUTPUT).grid(column=1, row=4, sticky=W, padx = 5)
+        outvar = StringVar(root)
+        outvar.set(devices[0]) # default value
+        out = OptionMenu(audioFrame, outvar, *devices)
+        out.config(width=20, bg=uc_background_color)
+        out.grid(column=2, row=4, sticky=W)
 
 ###################################################################################
 # Populate the talkgroup list with the entries loaded from the configuration file
 ###################################################################################
-def fillTalkgroupList( listName ):
+def fillTalkgroupList( listName, within=None ):
+    global listbox_rows, listbox_filter
+    tgs = talk_groups[listName]
+    listbox_filter = tg_filter.get().strip()
+    if len(listbox_filter) == 0:
+        listbox_rows = None
+        names = tgs.names()
+    else:
+        listbox_rows = tgs.search(listbox_filter, within)
+        names = [tgs[i][0] for i in listbox_rows]
     listbox.delete(0, END)
-    for item in talk_groups[listName]:
-        listbox.insert(END, item[0])
+    if len(names) > 0:
+        listbox.insert(END, *names)     # one Tcl call for the whole list
     listbox.selection_set(0)
 
+###################################################################################
+# Type ahead in the find box, while the text only grows search the rows already shown
+###################################################################################
+def filterChanged(*args):
+    text = tg_filter.get().strip()
+    grew = listbox_rows != None and len(listbox_filter) > 0 and text.startswith(listbox_filter)
+    fillTalkgroupList(master.get(), listbox_rows if grew else None)
+
 ###################################################################################
 #
 ###################################################################################
@@ -1222,17 +843,75 @@ def makeGroupFrame( parent ):
     ttk.Button(dmrFrame, text=STRING_TG, command= lambda: tgDialog(False), width = 3).grid(column=1, row=3, sticky=W)
     ttk.Button(dmrFrame, text=STRING_CONNECT, command= lambda: connect(None)).grid(column=2, row=3, sticky=W)
     ttk.Button(dmrFrame, text=STRING_DISCONNECT, command=disconnectButton).grid(column=3, row=3, sticky=W)
+    whiteLabel(dmrFrame, STRING_FILTER).grid(column=1, row=4, sticky=W, padx = 5)
+    find = Entry(dmrFrame, width = 20, fg=uc_text_color, bg=uc_background_color, textvariable = tg_filter)
+    find.grid(column=2, row=4, sticky=W, columnspan=2)
+    find.bind("<Escape>", lambda e: tg_filter.set(""))
     return dmrFrame
 
 ###################################################################################
 #
 ###################################################################################
+###################################################################################
+# A Treeview that only ever holds the rows on screen.  The history lives in a
+# LastHeard ring and the scrollbar moves a window over it; while the window is at
+# the bottom it follows new rows.
+###################################################################################
+class LastHeardView(ttk.Treeview):
+
+    def __init__(self, parent, history, rows=10, **kw):
+        ttk.Treeview.__init__(self, parent, height=rows, **kw)
+        self.history = history
+        self.rows = rows
+        self.top = 0                # row number (see LastHeard) of the first row shown
+        self.follow = True
+        self.scrollbar = None
+        self.bind("<MouseWheel>", lambda e: self.yview("scroll", -1 if e.delta > 0 else 1, "units"))
+        self.bind("<Button-4>", lambda e: self.yview("scroll", -1, "units"))
+        self.bind("<Button-5>", lambda e: self.yview("scroll", 1, "units"))
+
+    def append(self, call, slot, tg, loss, start_time, duration):
+        self.history.add(start_time, call, slot, tg, loss, duration)
+        self.refresh()
+
+    def refresh(self):
+        history = self.history
+        if self.follow:
+            self.top = history.total - self.rows
+        self.top = max(min(self.top, history.total - self.rows), history.first)
+        self.delete(*self.get_children())
+        for i, e in enumerate(history.window(self.top, self.rows)):
+            self.insert('', 'end', str(self.top + i), values=(
+                strftime(" %m/%d/%y", localtime(e.start_time)),
+                strftime("%H:%M:%S", localtime(e.start_time)),
+                e.call.ljust(10), e.slot, e.tg, e.loss, '{:.2f}s'.format(e.duration)))
+        if self.scrollbar != None:
+            kept = max(len(history), 1)
+            first = (self.top - history.first) / kept
+            self.scrollbar.set(first, min(first + self.rows / kept, 1.0))
+
+    # Scrollbar command, same arguments as Treeview.yview
+    def yview(self, *args):
+        if len(args) == 0:
+            return ttk.Treeview.yview(self)
+        history = self.history
+        if args[0] == "moveto":
+            self.top = history.first + int(float(args[1]) * len(history))
+        elif args[0] == "scroll":
+            step = self.rows if args[2] == "pages" else 1
+            self.top += int(args[1]) * step
+        self.follow = self.top >= history.total - self.rows
+        self.refresh()
+
 def makeLogFrame( parent ):
     global logList
     logFrame = Frame(parent, pady = 5, padx = 5, bg = uc_background_color, bd = 1, relief = SUNKEN)
 
-    logList = ttk.Treeview(logFrame)
+    logList = LastHeardView(logFrame, last_heard)
     logList.grid(column=1, row=2, sticky=W, columnspan=5)
+    scrollbar = ttk.Scrollbar(logFrame, orient=VERTICAL, command=logList.yview)
+    scrollbar.grid(column=6, row=2, sticky=(N,S))
+    logList.scrollbar = scrollbar
     
     cols = (STRING_DATE, STRING_TIME, STRING_CALL, STRING_SLOT, STRING_TG, STRING_LOSS, STRING_DURATION)
     widths = [85, 85, 80, 55, 150, 70, 95]
@@ -1246,6 +925,7 @@ def makeLogFrame( parent ):
         i += 1
 
     setup_rightmouse_menu(root, logList)
+    logList.refresh()
     return logFrame
 
 ###################################################################################
@@ -1262,6 +942,8 @@ def makeTransmitFrame(parent):
     #ttk.Scale(transmitFrame, from_=0, to=100, orient=HORIZONTAL, variable=audio_level,).grid(column=1, row=2, sticky=(W,E), pady=1)
 
     ttk.Progressbar(transmitFrame, style="bar.Horizontal.TProgressbar", orient=HORIZONTAL, variable=audio_level).grid(column=1, row=2, sticky=(W,E), pady=1)
+    if uc_config.levelPeakHold > 0:     # thin bar under the level showing the held peak
+        ttk.Progressbar(transmitFrame, style="peak.Horizontal.TProgressbar", orient=HORIZONTAL, variable=audio_peak).grid(column=1, row=3, sticky=(W,E))
 
 
     return transmitFrame
@@ -1273,7 +955,12 @@ def makeTransmitFrame(parent):
 def clickQRZImage(event):
     call = event.widget.callsign
     if len(call) > 0:
-        webbrowser.open_new_tab("http://www.qrz.com/lookup/"+call)
+        openWebPage("http://www.qrz.com/lookup/"+call)
+
+# webbrowser is only imported the first time someone clicks a link
+def openWebPage(url):
+    import webbrowser
+    webbrowser.open_new_tab(url)
 
 def makeQRZFrame(parent):
     global qrz_label, qrz_call, qrz_name
@@ -1344,6 +1031,33 @@ def makeVoxSettingsFrame( parent ):
 
     return voxSettings
 
+###################################################################################
+# Monitor, volume in the mix and TX selection for each AB this process serves
+###################################################################################
+def makeSessionsFrame( parent ):
+    sessionsFrame = LabelFrame(parent, text=STRING_SESSIONS, padx=5, pady = 4, fg=uc_text_color, bg = uc_background_color, relief = SUNKEN)
+    for row, session in enumerate(sessions, start=1):
+        whiteLabel(sessionsFrame, session.name).grid(column=1, row=row, sticky=W, padx = 5)
+        monitor = makeTkVar(IntVar, 1, lambda *args, c=session: setSessionMonitor(c))
+        Checkbutton(sessionsFrame, text = STRING_MONITOR, variable=monitor, fg=uc_text_color, bg = uc_background_color, bd = 0, highlightthickness = 0).grid(column=2, row=row, sticky=W)
+        gain = makeTkVar(IntVar, 100, lambda *args, c=session: setSessionGain(c))
+        ttk.Scale(sessionsFrame, from_=0, to=200, orient=HORIZONTAL, variable=gain).grid(column=3, row=row, sticky=(W,E), padx = 5)
+        Radiobutton(sessionsFrame, text = STRING_TX, variable=tx_session, value=session.name, command=setTxSession,
+                    fg=uc_text_color, bg = uc_background_color, selectcolor = uc_background_color, highlightthickness = 0).grid(column=4, row=row, sticky=W)
+        session_vars[session.name] = (monitor, gain)
+    return sessionsFrame
+
+session_vars = {}                   # session name -> (monitor, gain) Tk variables
+
+def setSessionMonitor(session):
+    pipeline.setMonitor(pipeline.sessionFor(session), session_vars[session.name][0].get() == 1)
+
+def setSessionGain(session):
+    pipeline.sessionFor(session).gain = tkValue(session_vars[session.name][1], 100) / 100.0
+
+def setTxSession():
+    pipeline.setTxSession(pipeline.sessionFor(sessions.byName(tx_session.get())))
+
 ###################################################################################
 #
 ###################################################################################
@@ -1363,7 +1077,11 @@ def makeSettingsFrame( parent ):
     makeModeFrame(settingsFrame).grid(column=1, row=1, sticky=(N,W), padx = 5)
     makeIPSettingsFrame(settingsFrame).grid(column=2, row=1, sticky=(N,W), padx = 5, pady = 5, columnspan=2)
     makeVoxSettingsFrame(settingsFrame).grid(column=1, row=2, sticky=(N,W), padx = 5)
-    makeAudioFrame(settingsFrame).grid(column=2, row=2, sticky=(N,W), padx = 5)
+    audioFrame = makeAudioFrame(settingsFrame)
+    audioFrame.grid(column=2, row=2, sticky=(N,W), padx = 5)
+    if len(sessions) > 1:
+        makeSessionsFrame(settingsFrame).grid(column=1, row=3, sticky=(N,W), padx = 5, pady = 5, columnspan=2)
+    settingsFrame.onShow = lambda: listDevices(audioFrame)
     return settingsFrame
 
 ###################################################################################
@@ -1382,33 +1100,63 @@ def makeAboutFrame( parent ):
     aboutText += "contribute to the development branch located at"
     linkText = "https://github.com/DVSwitch/USRP_Client\n"
 
-    background = None
-    try:
-        image_url = "https://media.boingboing.net/wp-content/uploads/2017/06/giphy-2.gif"
-        image_byt = urllib.request.urlopen(image_url).read()
-        image_b64 = base64.encodebytes(image_byt)
-        background = PhotoImage(data=image_b64)
-        background = background.subsample(3, 3)
-        lx = Label(aboutFrame, text="maz", anchor=W, image=background, cursor="hand2")
-        lx.photo = background
-        lx.callsign = "n4irr"
-        lx.bind("<Button-1>", clickQRZImage)
-        lx.grid(column=1, row=1, sticky=NW, padx = 5, pady = 5)
+    global about_label
+    about_label = Label(aboutFrame, text="maz", anchor=W, bg = uc_background_color, cursor="hand2")
+    about_label.callsign = "n4irr"
+    about_label.bind("<Button-1>", clickQRZImage)
+    about_label.grid(column=1, row=1, sticky=NW, padx = 5, pady = 5)
+    aboutFrame.onShow = fetchAboutImage
 
-    except:
-        logging.warning("no image:" + str(sys.exc_info()[1]))
     msg = Message(aboutFrame, text=aboutText, fg=uc_text_color, bg = uc_background_color, anchor=W, width=500)
     msg.grid(column=2, row=1, sticky=NW, padx = 5, pady = 0)
 
     link = Label(aboutFrame, text=linkText, bg = uc_background_color, fg='blue', anchor=W, cursor="hand2")
     link.grid(column=2, row=2, sticky=NW, padx = 5, pady = 0)
-    link.bind("<Button-1>", lambda e: webbrowser.open_new("https://github.com/DVSwitch/USRP_Client"))
+    link.bind("<Button-1>", lambda e: openWebPage("https://github.com/DVSwitch/USRP_Client"))
     f = font.Font(link, link.cget("font"))
     f.configure(underline=True)
     link.configure(font=f)
 
     return aboutFrame
 
+###################################################################################
+# The About picture is downloaded (once) the first time the tab is shown, on a
+# thread so a slow network never holds up the UI
+###################################################################################
+about_label = None
+about_fetched = False
+ABOUT_IMAGE_URL = "https://media.boingboing.net/wp-content/uploads/2017/06/giphy-2.gif"
+
+def fetchAboutImage():
+    global about_fetched
+    if about_fetched:
+        return
+    about_fetched = True
+    def fetch():
+        try:
+            import urllib.request
+            with urllib.request.urlopen(ABOUT_IMAGE_URL, timeout=10) as f:
+                ipc_queue.put(("about_image", f.read()))
+        except:
+            logging.warning("no image:" + str(sys.exc_info()[1]))
+    threading.Thread(target=fetch, daemon=True).start()
+
+def showAboutImage(data):
+    try:
+        import base64
+        background = PhotoImage(data=base64.encodebytes(data)).subsample(3, 3)
+        about_label.configure(image=background)
+        about_label.photo = background
+    except:
+        logging.warning("no image:" + str(sys.exc_info()[1]))
+
+# Give a tab the chance to do its expensive setup the first time it is selected
+def tabChanged(event):
+    tab = root.nametowidget(nb.select())
+    onShow = getattr(tab, 'onShow', None)
+    if onShow != None:
+        onShow()
+
 ###################################################################################
 # Each second this function will be called, update the status bar
 ###################################################################################
@@ -1439,42 +1187,30 @@ def setStyles():
     style.map('TNotebook.Tab', background=[('disabled', 'magenta')])
     style.configure('TButton', foreground=uc_text_color, background=uc_background_color)
     style.configure("bar.Horizontal.TProgressbar", troughcolor=uc_background_color, bordercolor=uc_text_color, background="green", lightcolor="green", darkcolor="green")
+    style.configure("peak.Horizontal.TProgressbar", thickness=4, troughcolor=uc_background_color, bordercolor=uc_background_color, background="orange", lightcolor="orange", darkcolor="orange")
 
 ###################################################################################
-# Read an int value from the ini file.  If an error or value is Default, return the 
-# valDefault passed in.
+# Opening the sound card makes PortAudio probe every ALSA device, seconds on a Pi.
+# Do it on a thread so the window and the registration with AB do not wait for it.
 ###################################################################################
-def readValue( config, stanza, valName, valDefault, func ):
-    try:
-        val = config.get(stanza, valName).split(None)[0]
-        if val.lower() == "default":  # This is a special case for the in and out index settings
-            return valDefault
-        return func(val)
-    except:
-        return valDefault
-
-###################################################################################
-# It is required that the user edit the ini file and fill in at least three values.
-# The callsign, DMR Id and the USRP server address must be set to something other
-# than the default values to be valid.
-###################################################################################
-def validateConfigInfo():
-    valid = (my_call != "N0CALL")               # Make sure they set a ham radio callsign
-    valid &= (subscriber_id != 3112000)         # Make sure they set a DMR/CCS7 ID
-    valid &= (ip_address.get() != "1.2.3.4")    # Make sure they have a valid address for AB
-    return valid
+def startAudio():
+    def run():
+        if pipeline.start() != False:
+            startupMark("audio")
+    threading.Thread(target=run, daemon=True).start()
 
 ###################################################################################
-# Close down the app when the main window closes.  Signal the threads to terminate
-# and tell AB we are done.
+# Close down the app when the main window closes.  Tell AB we are done and stop
+# the network loop.
 ###################################################################################
 def on_closing():
-    global done
-    logging.info(STRING_EXITING)
-    done = True             # Signal the threads to terminate
-    if regState == True:    # If we were registered, tell AB we are done
-        sleep(1)            # wait just a moment for them to die
-        unregisterWithAB()
+    sessions.stop()
+    if qrz_lookup != None:
+        qrz_lookup.close()
+    if journal != None:
+        journal.close()
+    if pipeline != None:
+        pipeline.close()
     root.destroy()
 
 ############################################################################################################
@@ -1493,7 +1229,7 @@ def lookup_call_on_web( service, url):
     is_valid, call = get_rt_menu_call()
     if is_valid == True:
         logging.info("Lookup call " + call + " on service " + service)
-        webbrowser.open_new_tab(url+call)
+        openWebPage(url+call)
 
 def menu1():
     lookup_call_on_web( "QRZ", "http://www.qrz.com/lookup/")
@@ -1509,6 +1245,12 @@ def menu4():
     pass
 def menu5():
     pass
+def menu6():
+    is_valid, call = get_rt_menu_call()
+    heard = last_heard.stats(call)
+    if heard != None:
+        airtime = '{}:{:02d}'.format(int(heard[1]) // 60, int(heard[1]) % 60)
+        popup_toast(("toast", call, STRING_HEARD_STATS.format(heard[0], airtime, strftime("%H:%M:%S", localtime(heard[2])))))
 
 def setup_rightmouse_menu(master, tree):
     tree.aMenu = Menu(master, tearoff=0)
@@ -1517,6 +1259,7 @@ def setup_rightmouse_menu(master, tree):
     tree.aMenu.add_command(label='Brandmeister', command=menu3)
     tree.aMenu.add_command(label='Hamdata lookup', command=menu4)
     tree.aMenu.add_command(label='Private Call', command=menu5)
+    tree.aMenu.add_command(label='Heard stats', command=menu6)
 
     # attach popup to treeview widget
     tree.bind("<Button-2>", popup)
@@ -1539,64 +1282,43 @@ def popupFocusOut(self,event=None):
 # Global commands
 ############################################################################################################
 
+# Load data from the config file
+startupMark("imports")
+uc_config = loadConfig(args.config)
+sessions = SessionGroup.fromConfig(uc_config)
+client = sessions.primary
+startupMark("config")
+
 root = Tk()
 root.title(STRING_USRP_CLIENT)
 root.resizable(width=FALSE, height=FALSE)
+uc_background_color = uc_config.backgroundColor
+uc_text_color = uc_config.textColor
 root.configure(bg=uc_background_color)
 
 nb = ttk.Notebook(root)     # A tabbed interface container
 
-# Load data from the config file
-if len(sys.argv) > 1:
-    config_file_name = sys.argv[1]      # Use the command line argument for the path to the config file
-else:
-    config_file_name = str(Path(sys.argv[0]).parent) + "/pyUC.ini"       # Use the default config file name in the same dir as .py file
-config = configparser.ConfigParser(inline_comment_prefixes=(';',))
-config.optionxform = lambda option: option
-try:
-    config.read(config_file_name)
-    my_call = config.get('DEFAULTS', "myCall").split(None)[0]
-    loopback = makeTkVar(IntVar, config.get('DEFAULTS', "loopback").split(None)[0])
-    dongle_mode = makeTkVar(IntVar, config.get('DEFAULTS', "dongleMode").split(None)[0])
-    vox_enable = makeTkVar(IntVar, config.get('DEFAULTS', "voxEnable").split(None)[0])
-    mic_vol = makeTkVar(IntVar, config.get('DEFAULTS', "micVol").split(None)[0])
-    sp_vol = makeTkVar(IntVar, config.get('DEFAULTS', "spVol").split(None)[0])
-    repeater_id = makeTkVar(IntVar, config.get('DEFAULTS', "repeaterID").split(None)[0])
-    subscriber_id = makeTkVar(IntVar, config.get('DEFAULTS', "subscriberID").split(None)[0])
-    vox_threshold = makeTkVar(IntVar, config.get('DEFAULTS', "voxThreshold").split(None)[0])
-    vox_delay = makeTkVar(IntVar, config.get('DEFAULTS', "voxDelay").split(None)[0])
-    ip_address = makeTkVar(StringVar, config.get('DEFAULTS', "ipAddress").split(None)[0])
-    usrp_tx_port = [int(i) for i in config.get('DEFAULTS', "usrpTxPort").split(',')]
-    usrp_rx_port = int(config.get('DEFAULTS', "usrpRxPort").split(None)[0])
-    slot = makeTkVar(IntVar, config.get('DEFAULTS', "slot").split(None)[0])
-    defaultServer = config.get('DEFAULTS', "defaultServer").split(None)[0]
-    asl_mode = makeTkVar(IntVar, config.get('DEFAULTS', "aslMode").split(None)[0])
-    useQRZ = bool(readValue(config, 'DEFAULTS', 'useQRZ', True, int))
-    level_every_sample = int(readValue(config, 'DEFAULTS', 'levelEverySample', 2, int))
-    NAT_ping_timer = int(readValue(config, 'DEFAULTS', 'pingTimer', 0, int))
-
-    in_index = readValue(config, 'DEFAULTS', 'in_index', None, int)
-    out_index = readValue(config, 'DEFAULTS', 'out_index', None, int)
-
-    uc_background_color = readValue(config, 'DEFAULTS', 'backgroundColor', 'gray25', str)
-    uc_text_color = readValue(config, 'DEFAULTS', 'textColor', 'white', str)
-
-    talk_groups = {}
-    for sect in config.sections():
-        if (sect != "DEFAULTS") and (sect != "MACROS"):
-            talk_groups[sect] = config.items(sect)
-
-    if "MACROS" in config.sections():
-        for x in config.items("MACROS"):
-            macros[x[1]] = x[0]
-
-    if validateConfigInfo() == False:
-        logging.error(STRING_CONFIG_NOT_EDITED)
-        os._exit(1)
-        
-except:
-    logging.error(STRING_CONFIG_FILE_ERROR + str(sys.exc_info()[1]))
-    sys.exit('Configuration file \''+config_file_name+'\' is not a valid configuration file! Exiting...')
+my_call = uc_config.myCall
+loopback = makeTkVar(IntVar, uc_config.loopback)
+dongle_mode = makeTkVar(IntVar, uc_config.dongleMode)
+vox_enable = makeTkVar(IntVar, uc_config.voxEnable, lambda *args: setattr(pipeline, 'voxEnable', tkValue(vox_enable, 0)))
+mic_vol = makeTkVar(IntVar, uc_config.micVol)
+sp_vol = makeTkVar(IntVar, uc_config.spVol)
+repeater_id = makeTkVar(IntVar, uc_config.repeaterID)
+subscriber_id = makeTkVar(IntVar, uc_config.subscriberID, lambda *args: setattr(client, 'subscriberID', tkValue(subscriber_id, client.subscriberID)))
+vox_threshold = makeTkVar(IntVar, uc_config.voxThreshold, lambda *args: setattr(pipeline, 'voxThreshold', tkValue(vox_threshold, pipeline.voxThreshold)))
+vox_delay = makeTkVar(IntVar, uc_config.voxDelay, lambda *args: setattr(pipeline, 'voxDelay', tkValue(vox_delay, pipeline.voxDelay)))
+ip_address = makeTkVar(StringVar, uc_config.ipAddress, lambda *args: setattr(client, 'ipAddress', ip_address.get()))
+slot = makeTkVar(IntVar, uc_config.slot)
+defaultServer = uc_config.defaultServer
+asl_mode = makeTkVar(IntVar, uc_config.aslMode)
+useQRZ = uc_config.useQRZ
+last_heard = LastHeard(uc_config.lastHeardSize)
+journal = openHeardJournal(uc_config.journalFile)
+if useQRZ:
+    initQRZ()
+in_index = uc_config.inIndex
+talk_groups = client.talkGroups
 
 servers = sorted(talk_groups.keys())
 master = makeTkVar(StringVar, defaultServer, masterChanged)
@@ -1604,7 +1326,10 @@ connected_msg = makeTkVar(StringVar, STRING_CONNECTED_TO)
 current_tx_value = makeTkVar(StringVar, my_call)
 current_call = makeTkVar(StringVar, "")
 current_name = makeTkVar(StringVar, "")
+tg_filter = makeTkVar(StringVar, "", filterChanged)
+tx_session = makeTkVar(StringVar, client.name)
 audio_level = makeTkVar(IntVar, 0)
+audio_peak = makeTkVar(IntVar, 0)
 
 setStyles()
 
@@ -1613,24 +1338,32 @@ nb.add(makeAppFrame( nb ), text=STRING_TAB_MAIN)
 nb.add(makeSettingsFrame( nb ), text=STRING_TAB_SETTINGS)
 nb.add(makeAboutFrame( nb ), text=STRING_TAB_ABOUT)
 nb.grid(column=1, row=1, sticky='EW')
+nb.bind("<<NotebookTabChanged>>", tabChanged)
 
 # Create the other frames
 makeLogFrame(root).grid(column=1, row=2)
 makeStatusBar(root).grid(column=1, row=3, sticky=W+E)
 
 init_queue()    # Create the queue for thread to main app communications
-openStream()    # Open the UDP stream to AB
-with noalsaerr():
-    p = pyaudio.PyAudio()
-_thread.start_new_thread( rxAudioStream, () )
-if in_index != -1:  # Do not launch the TX thread if the user wants RX only access
-    _thread.start_new_thread( txAudioStream, () )
-_thread.start_new_thread( html_thread, () )     # Start up the HTML thread for background image loads
-if NAT_ping_timer > 0:
-    _thread.start_new_thread( ping_thread, () )
+client.subscribe(ipc_queue.put)     # Session events are handled on the main thread
+for session in sessions.clients[1:]:    # The UI follows the primary session, the others only add to last heard
+    session.subscribe(otherSessionEvent)
+if journal != None:
+    for session in sessions:
+        session.subscribe(journal.onEvent)   # Journal writes are queued, they never wait on the disk
+sessions.openStreams()              # Open the UDP stream to each AB
+pipeline = AudioPipeline(client, uc_config)
+for session in sessions.clients[1:]:
+    pipeline.addSession(session)
+startupMark("ui")
+sessions.startLoop()                # The network side of every session runs on one event loop (QRZ lookups have their own threads)
+startupMark("loop")
 
 disconnect()    # Start out in the disconnected state
 start()         # Begin the handshake with AB (register)
+for session in sessions.clients[1:]:
+    session.start()
+root.after_idle(startAudio)     # The sound card is opened once the window is up
 
 root.protocol("WM_DELETE_WINDOW", on_closing)
 root.mainloop()
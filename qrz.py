@@ -0,0 +1,201 @@
+###################################################################################
+# pyUC ("puck") QRZ photo lookups
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# Scrape a station's photo from qrz.com and keep a thumbnail of it on disk.  The
+# thumbnails are PNG bytes so they can be fetched on any thread and turned into a
+# Tk image on the main thread.
+###################################################################################
+
+from time import time
+from pathlib import Path
+import threading
+import sqlite3
+import logging
+import sys
+import io
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from PIL import Image
+import requests
+
+THUMBNAIL_SIZE = (170, 110)
+DEFAULT_CACHE_FILE = str(Path.home() / '.cache' / 'pyUC' / 'qrz.db')
+
+###################################################################################
+# SQLite backed LRU of callsign -> (image url, thumbnail).  A lookup that found no
+# photo is stored with an empty thumbnail and retried after negativeTTL seconds; a
+# photo is refreshed after positiveTTL.  Only maxEntries rows are kept, the least
+# recently used go first.  Safe to share between threads.
+###################################################################################
+class QRZCache:
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, maxEntries=1000, negativeTTL=86400, positiveTTL=30*86400):
+        self.maxEntries = maxEntries
+        self.negativeTTL = negativeTTL
+        self.positiveTTL = positiveTTL
+        self.lock = threading.Lock()
+        try:
+            if path != ':memory:':
+                Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+        except:
+            logging.warning("QRZ cache {} unavailable, using memory: {}".format(path, sys.exc_info()[1]))
+            self.db = sqlite3.connect(':memory:', check_same_thread=False)
+        self.db.execute('CREATE TABLE IF NOT EXISTS qrz (call TEXT PRIMARY KEY, url TEXT, thumb BLOB, fetched REAL, used REAL)')
+        self.db.execute('CREATE INDEX IF NOT EXISTS qrz_used ON qrz (used)')
+        self.db.commit()
+
+    ###################################################################################
+    # (url, thumbnail bytes) or None if the call is unknown or its entry has expired
+    ###################################################################################
+    def get(self, callsign, now=None):
+        now = time() if now == None else now
+        with self.lock:
+            row = self.db.execute('SELECT url, thumb, fetched FROM qrz WHERE call = ?', (callsign,)).fetchone()
+            if row == None:
+                return None
+            url, thumb, fetched = row
+            ttl = self.positiveTTL if len(thumb) > 0 else self.negativeTTL
+            if now - fetched > ttl:
+                return None
+            self.db.execute('UPDATE qrz SET used = ? WHERE call = ?', (now, callsign))
+            self.db.commit()
+        return (url, bytes(thumb))
+
+    def put(self, callsign, url, thumb, now=None):
+        now = time() if now == None else now
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO qrz VALUES (?, ?, ?, ?, ?)', (callsign, url, thumb, now, now))
+            self.db.execute('DELETE FROM qrz WHERE call IN (SELECT call FROM qrz ORDER BY used DESC LIMIT -1 OFFSET ?)', (self.maxEntries,))
+            self.db.commit()
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM qrz').fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+###################################################################################
+# Look up stations' photos on a small pool of worker threads sharing one HTTP
+# session.  Asking for a call that is already being looked up returns the same
+# future, and lookups that are no longer wanted (the talker unkeyed) can be
+# cancelled before they start.  Every request has a (connect, read) timeout.
+###################################################################################
+class QRZLookup:
+
+    def __init__(self, cache, workers=4, timeout=(5, 10), baseUrl='https://qrz.com/lookup/'):
+        self.cache = cache
+        self.timeout = timeout
+        self.baseUrl = baseUrl
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='qrz')
+        self.inflight = {}          # callsign -> Future of thumbnail bytes
+        self.lock = threading.Lock()
+
+    ###################################################################################
+    # Future of the thumbnail bytes for a callsign (b'' when there is no photo)
+    ###################################################################################
+    def lookup(self, callsign):
+        with self.lock:
+            future = self.inflight.get(callsign)
+            if future != None:
+                return future
+            future = self.executor.submit(self.getThumbnailFor, callsign)
+            self.inflight[callsign] = future
+        future.add_done_callback(lambda f: self.done(callsign, f))   # may run right here, so not under the lock
+        return future
+
+    def done(self, callsign, future):
+        with self.lock:
+            if self.inflight.get(callsign) is future:
+                del self.inflight[callsign]
+
+    ###################################################################################
+    # Drop queued lookups for every call but keep (those already running finish and
+    # land in the cache, nobody waits for them)
+    ###################################################################################
+    def cancelExcept(self, keep=None):
+        with self.lock:
+            stale = [f for call, f in self.inflight.items() if call != keep]
+        for future in stale:
+            future.cancel()
+
+    def close(self):
+        self.cancelExcept()
+        self.executor.shutdown(wait=False)
+        self.session.close()
+
+    ###################################################################################
+    # Thumbnail bytes for a callsign, from the cache when we can so restarts do not
+    # hit qrz.com again
+    ###################################################################################
+    def getThumbnailFor(self, callsign):
+        if len(callsign) == 0:
+            return b''
+        hit = self.cache.get(callsign)
+        if hit != None:
+            return hit[1]
+        image_url = self.getImgUrl(callsign)
+        if image_url == None:   # qrz.com did not answer, try again next time
+            return b''
+        thumb = self.getThumbnail(image_url) if len(image_url) > 0 else b''
+        if thumb == None:       # the image server did not answer, same
+            return b''
+        self.cache.put(callsign, image_url, thumb)
+        return thumb
+
+    # Return the URL of an image associated with the callsign scraped from QRZ, ""
+    # if the page has none and None if the page could not be fetched
+    def getImgUrl(self, callsign):
+        quote_page = self.baseUrl + callsign
+        try:
+            resp = self.session.get(quote_page, timeout=self.timeout)
+            resp.raise_for_status()
+            page = resp.text
+        except requests.RequestException:
+            logging.info("QRZ lookup of {} failed: {}".format(callsign, sys.exc_info()[1]))
+            return None
+        try:
+            soup = BeautifulSoup(page, 'html.parser')
+            return urljoin(quote_page, soup.find(id='mypic')['src'])
+        except:
+            return ""
+
+    # Download an image and shrink it to a PNG thumbnail, b'' if it is not an image
+    # and None if it could not be fetched
+    def getThumbnail(self, image_url):
+        try:
+            resp = self.session.get(image_url, timeout=self.timeout)
+            resp.raise_for_status()
+        except requests.RequestException:
+            logging.info("QRZ image {} failed: {}".format(image_url, sys.exc_info()[1]))
+            return None
+        try:
+            image = Image.open(io.BytesIO(resp.content))
+            image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+            out = io.BytesIO()
+            image.save(out, 'PNG')
+            return out.getvalue()
+        except:
+            return b''
@@ -0,0 +1,321 @@
+###################################################################################
+# pyUC ("puck") transmission recorder
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# Every received transmission saved as its own 8K WAV file, named by time, call and
+# talkgroup, with one json line per file in index.jsonl next to them:
+#
+#   recordDir = ~/pyUC/recordings        in pyUC.ini, recordFormat = ulaw halves the size
+#   python3 recorder.py recordDir --call N4IRR --tg 310 --since 2026-10-01
+#
+# Recordings are kept apart by the same (ip, port, tg) source as the Mixer, so two
+# streams heard at once on a session go to two files.  frame() and onEvent() only
+# queue, a writer thread does the file work so the disk never holds up RX.  When the
+# queue is full frames are dropped (and counted), not waited for.
+###################################################################################
+
+from datetime import datetime
+from time import time
+from pathlib import Path
+import threading
+import argparse
+import logging
+import struct
+import queue
+import json
+import sys
+import os
+import re
+from lastheard import parseTime
+
+RECORD_FORMATS = ("wav", "ulaw")
+INDEX_FILE = "index.jsonl"
+RECORD_IDLE_TIMEOUT = 5.0           # a transmission with no frame (and no end) for this long is closed
+RECORD_END_WAIT = 1.0               # after a source unkeys, how long its end_tx has to arrive
+
+WAVE_FORMAT_PCM = 1
+WAVE_FORMAT_MULAW = 7
+
+###################################################################################
+# A mono 8K WAV written as it goes, the sizes in the header are filled in on close.
+# ulaw files carry the cbSize field and the fact chunk that non PCM WAV needs.
+###################################################################################
+class WavWriter:
+
+    def __init__(self, path, format="wav"):
+        self.path = path
+        self.ulaw = format == "ulaw"
+        self.encoder = None
+        if self.ulaw:
+            from codec import makeVoiceCodec
+            self.encoder = makeVoiceCodec("ulaw")
+        self.file = open(path, 'wb', buffering=65536)
+        self.dataBytes = 0
+        self.file.write(self.header())
+
+    def header(self):
+        width = 1 if self.ulaw else 2
+        fmt = struct.pack('<HHIIHH', WAVE_FORMAT_MULAW if self.ulaw else WAVE_FORMAT_PCM, 1, 8000, 8000 * width, width, 8 * width)
+        if self.ulaw:
+            fmt += struct.pack('<H', 0)     # cbSize, no extra format bytes
+        chunks = b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+        if self.ulaw:
+            chunks += b'fact' + struct.pack('<II', 4, self.dataBytes)
+        chunks += b'data' + struct.pack('<I', self.dataBytes)
+        return b'RIFF' + struct.pack('<I', 4 + len(chunks) + self.dataBytes) + b'WAVE' + chunks
+
+    def write(self, pcm):
+        data = self.encoder.encode(pcm) if self.ulaw else pcm
+        self.file.write(data)
+        self.dataBytes += len(data)
+
+    def close(self):
+        if self.dataBytes & 1:          # chunks are word aligned
+            self.file.write(b'\0')
+        self.file.seek(0)
+        self.file.write(self.header())
+        self.file.close()
+
+    @property
+    def seconds(self):
+        return self.dataBytes / (8000.0 if self.ulaw else 16000.0)
+
+###################################################################################
+# The transmission being recorded for one source (ip, port, tg) of a session
+###################################################################################
+class Recording:
+
+    def __init__(self, directory, session, source, format, now, dropped):
+        self.session = session
+        self.source = source
+        self.startTime = now
+        self.lastTime = now
+        self.ended = False              # the source unkeyed, waiting for its end_tx
+        self.dropped = dropped          # Recorder.dropped when this started
+        self.tempPath = os.path.join(directory, ".recording-{}-{}.wav".format(os.getpid(), id(self)))
+        self.wav = WavWriter(self.tempPath, format)
+        self.meta = {}
+
+###################################################################################
+# Taps the voice and events of each session (see AudioPipeline.attach)
+###################################################################################
+class Recorder:
+
+    def __init__(self, directory, format="wav", maxQueue=500):
+        self.directory = directory
+        self.format = format if format in RECORD_FORMATS else "wav"
+        if format != self.format:
+            logging.warning("Unknown recordFormat {}, using wav".format(format))
+        self.queue = queue.Queue(maxQueue)     # about 10s of audio from one station
+        self.dropped = 0                # frames the writer could not keep up with
+        self.written = 0                # files saved
+        self.recordings = {}            # (session, source) -> Recording, writer thread only
+        self.meta = {}                  # (session, tg) -> begin_tx details, writer thread only
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        self.thread = threading.Thread(target=self.writer, daemon=True)
+        self.thread.start()
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    ###################################################################################
+    # A received voice frame from a Mixer source, None when that source unkeys
+    ###################################################################################
+    def frame(self, session, source, frame):
+        if frame != None:
+            frame = bytes(frame)        # frame may be a view of the RX buffer
+        self.put(("frame", (session, source), frame))
+
+    # dest is the numeric talkgroup of the event, what the voice sources carry; the
+    # event's tg is the name the talkgroup list gives it
+    def onEvent(self, session, event, dest=None):
+        if event[0] == "begin_tx":      # call, name, slot, tg, mode, tg_value
+            self.put(("begin", (session, dest), {'call': event[1], 'name': event[2], 'slot': event[3], 'tg_name': str(event[4]), 'mode': event[5]}))
+        elif event[0] == "end_tx":      # call, slot, tg, loss, start, duration, stats, tg_value
+            self.put(("end", (session, dest), {'call': event[1], 'slot': event[2], 'tg_name': str(event[3]), 'loss': event[4]}))
+
+    def writer(self):
+        expireTime = time()
+        while True:
+            try:
+                item = self.queue.get(timeout=RECORD_END_WAIT)
+            except queue.Empty:
+                item = ()
+            if item == None:            # close() was called
+                break
+            try:
+                if len(item) > 0:
+                    self.handle(*item)
+                if time() - expireTime >= RECORD_END_WAIT:     # other sources may keep the queue busy
+                    expireTime = time()
+                    self.expire()
+            except:
+                logging.warning("Recorder thread:" + str(sys.exc_info()[1]))
+        for key in list(self.recordings):
+            self.finish(key)
+
+    def handle(self, kind, key, value):
+        now = time()
+        if kind == "frame":
+            session, source = key
+            recording = self.recordings.get(key)
+            if value == None:           # unkey, close once the end_tx has added its details
+                if recording != None:
+                    recording.ended = True
+                    recording.lastTime = now
+                return
+            if recording == None and source[2] != 0:    # audio that came before AB said the talkgroup
+                recording = self.recordings.pop((session, (source[0], source[1], 0)), None)
+                if recording != None:
+                    recording.source = source
+                    self.recordings[key] = recording
+            if recording == None or recording.ended:
+                if recording != None:
+                    self.finish(key)
+                recording = self.recordings[key] = Recording(self.directory, session, source, self.format, now, self.dropped)
+                recording.meta.update(self.meta.get((session, source[2]), {}))
+            recording.wav.write(value)
+            recording.lastTime = now
+        elif kind == "begin":
+            self.meta[key] = value
+            for recording in self.matching(key):    # AB named the station after the audio started
+                recording.meta.update(value)
+        elif kind == "end":
+            recordings = self.matching(key)
+            ended = [r for r in recordings if r.ended]
+            for recording in (ended if len(ended) > 0 else recordings):
+                recording.meta.update({k: v for k, v in value.items() if v not in ("", None)})
+                self.finish((recording.session, recording.source))
+            self.meta.pop(key, None)
+
+    ###################################################################################
+    # The recordings of a session's source with that talkgroup, or all of the
+    # session's if none is on it (the event may name a talkgroup the voice does not)
+    ###################################################################################
+    def matching(self, key):
+        session, dest = key
+        recordings = [r for r in self.recordings.values() if r.session == session]
+        same = [r for r in recordings if r.source[2] == dest]
+        return same if len(same) > 0 else recordings
+
+    def expire(self):
+        now = time()
+        for key, recording in list(self.recordings.items()):
+            if now - recording.lastTime > (RECORD_END_WAIT if recording.ended else RECORD_IDLE_TIMEOUT):
+                self.finish(key)
+
+    ###################################################################################
+    # Close the file, give it its real name and add it to the index
+    ###################################################################################
+    def finish(self, key):
+        recording = self.recordings.pop(key)
+        wav = recording.wav
+        wav.close()
+        meta = recording.meta
+        tg = str(recording.source[2])   # the talkgroup number, the same one --tg matches
+        start = datetime.fromtimestamp(recording.startTime)
+        name = "{}_{}_TG{}.wav".format(start.strftime("%Y%m%d-%H%M%S"), safeName(meta.get('call', 'unknown')), safeName(tg))
+        folder = os.path.join(self.directory, start.strftime("%Y-%m-%d"))
+        os.makedirs(folder, exist_ok=True)
+        path = uniquePath(os.path.join(folder, name))
+        os.replace(recording.tempPath, path)
+        record = {'file': os.path.relpath(path, self.directory), 'time': round(recording.startTime, 2),
+                  'duration': round(wav.seconds, 2), 'session': recording.session,
+                  'source': "{}:{}".format(recording.source[0], recording.source[1]),
+                  'format': self.format, 'dropped': self.dropped - recording.dropped}
+        record.update(meta)
+        record['tg'] = tg
+        with open(os.path.join(self.directory, INDEX_FILE), 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        self.written += 1
+        logging.debug("Recorded " + path)
+
+    # Finish what is queued and stop the writer
+    def close(self, timeout=5.0):
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+def safeName(text):
+    return re.sub(r'[^A-Za-z0-9#@+-]', '', str(text))[:32] or "unknown"
+
+def uniquePath(path):
+    base, ext = os.path.splitext(path)
+    n = 1
+    while os.path.exists(path):
+        path = "{}-{}{}".format(base, n, ext)
+        n += 1
+    return path
+
+###################################################################################
+# The recorder for a recordDir setting, None if it is off or can not be used
+###################################################################################
+def openRecorder(path, format="wav"):
+    if path == None or path.lower() == "none":
+        return None
+    try:
+        return Recorder(path, format)
+    except:
+        logging.warning("Can not record to {}: {}".format(path, sys.exc_info()[1]))
+        return None
+
+###################################################################################
+# Rows of the index, oldest first.  Every filter is optional.
+###################################################################################
+def queryIndex(path, since=None, until=None, call=None, tg=None):
+    rows = []
+    with open(os.path.join(path, INDEX_FILE), 'r') as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+            except ValueError:          # a line cut short by a crash
+                continue
+            if (since != None and row['time'] < since) or (until != None and row['time'] >= until):
+                continue
+            if (call != None and row.get('call') != call) or (tg != None and row.get('tg') != tg):
+                continue
+            rows.append(row)
+    return rows
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='recorder.py', description='Search the pyUC recordings')
+    parser.add_argument('directory')
+    parser.add_argument('--since', type=parseTime)
+    parser.add_argument('--until', type=parseTime)
+    parser.add_argument('--call')
+    parser.add_argument('--tg')
+    parser.add_argument('--format', default='text', choices=('text', 'json'))
+    args = parser.parse_args(argv[1:])
+
+    try:
+        rows = queryIndex(args.directory, args.since, args.until, args.call, args.tg)
+    except OSError:
+        print("recorder.py: can not read {}: {}".format(args.directory, sys.exc_info()[1]), file=sys.stderr)
+        return 1
+    if args.format == 'json':
+        json.dump(rows, sys.stdout, indent=1)
+        print()
+    else:
+        for row in rows:
+            print("{}  {:<10} {:>8}  {:6.1f}s  {}".format(datetime.fromtimestamp(row['time']).isoformat(' ', 'seconds'),
+                  row.get('call', ''), row.get('tg', ''), row['duration'], os.path.join(args.directory, row['file'])))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
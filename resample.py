@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+###################################################################################
+# pyUC ("puck") sample rate conversion
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# Resamplers for 16 bit mono PCM, used between the 8K USRP voice frames and the
+# sound card rate.  Every resampler takes and returns bytes, keeps its own state
+# between 20ms blocks and is created with makeResampler().
+#
+#   python3 resample.py --bench      prints the cost of one 20ms block per tier
+###################################################################################
+
+from math import gcd
+import numpy as np
+
+RESAMPLE_QUALITY = ("linear", "low", "medium", "high")
+
+# taps per polyphase branch (times the ratio when going down) and Kaiser window beta per tier
+POLYPHASE_TIERS = {
+    "low":    (8, 5.0),
+    "medium": (16, 7.0),
+    "high":   (32, 9.0),
+}
+
+###################################################################################
+# Rates are the same, nothing to do
+###################################################################################
+class PassThrough:
+
+    def __init__(self, inRate, outRate):
+        self.inRate = inRate
+        self.outRate = outRate
+
+    def process(self, pcm):
+        return pcm
+
+    def reset(self):
+        pass
+
+###################################################################################
+# Straight line interpolation, the cheapest tier and about what audioop.ratecv did
+###################################################################################
+class LinearResampler:
+
+    def __init__(self, inRate, outRate):
+        self.inRate = inRate
+        self.outRate = outRate
+        self.reset()
+
+    def reset(self):
+        self.last = 0.0                 # last input sample of the previous block
+        self.pos = 0                    # next output position after last, in 1/outRate input samples
+
+    def process(self, pcm):
+        x = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+        end = len(x) * self.outRate
+        t = np.arange(self.pos, end, self.inRate)
+        y = np.interp(t / self.outRate, np.arange(len(x) + 1), np.concatenate(([self.last], x)))
+        self.pos = self.pos + len(t) * self.inRate - end
+        if len(x):
+            self.last = x[-1]
+        return y.astype('<i2').tobytes()
+
+###################################################################################
+# Rational L/M polyphase FIR resampler.  A windowed sinc low pass is designed at the
+# upsampled rate and split into L branches of K taps; each output sample is one K
+# tap dot product, computed for a whole block at once with numpy.
+###################################################################################
+class PolyphaseResampler:
+
+    def __init__(self, inRate, outRate, quality="medium"):
+        self.inRate = inRate
+        self.outRate = outRate
+        g = gcd(inRate, outRate)
+        self.L = outRate // g           # upsample factor
+        self.M = inRate // g            # downsample factor
+        taps, beta = POLYPHASE_TIERS[quality]
+        self.K = taps * -(-self.M // self.L) if self.M > self.L else taps   # same sharpness at the narrower cutoff
+
+        # Prototype low pass at the upsampled rate, cut off just below the lower Nyquist
+        n = self.L * self.K
+        cutoff = 0.45 / max(self.L, self.M)         # cycles per (upsampled) sample
+        t = np.arange(n) - (n - 1) / 2.0
+        h = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(n, beta)
+        h *= self.L / h.sum()                        # unity gain through the zero stuffing
+
+        # Branch p holds h[p], h[p+L], ... reversed so it lines up with a window of input
+        self.branches = np.ascontiguousarray(h.reshape(self.K, self.L).T[:, ::-1], dtype=np.float32)
+        self.reset()
+
+    def reset(self):
+        self.hist = np.zeros(self.K - 1, dtype=np.float32)
+        self.t = 0                      # next output position, in upsampled samples from block start
+
+    def process(self, pcm):
+        x = np.frombuffer(pcm, dtype='<i2').astype(np.float32)
+        xext = np.concatenate((self.hist, x))
+        windows = np.lib.stride_tricks.sliding_window_view(xext, self.K)   # row i ends at input i
+        end = len(x) * self.L
+        if self.M == 1:                 # integer upsample (8K -> 48K), every branch for every input
+            y = (windows @ self.branches.T).ravel()
+        elif self.L == 1:               # integer downsample (48K -> 8K), one branch, every Mth input
+            y = windows[self.t::self.M] @ self.branches[0]
+        else:
+            t = np.arange(self.t, end, self.M)
+            y = np.einsum('ij,ij->i', windows[t // self.L], self.branches[t % self.L])
+        count = len(y)
+        self.t = self.t + count * self.M - end
+        self.hist = xext[len(xext) - (self.K - 1):]
+        return np.clip(y, -32768, 32767).astype('<i2').tobytes()
+
+###################################################################################
+# Pick a resampler for a rate pair and quality tier (see RESAMPLE_QUALITY)
+###################################################################################
+def makeResampler(inRate, outRate, quality="medium"):
+    if inRate == outRate:
+        return PassThrough(inRate, outRate)
+    if quality == "linear":
+        return LinearResampler(inRate, outRate)
+    if quality not in POLYPHASE_TIERS:
+        raise ValueError("unknown resample quality: " + str(quality))
+    return PolyphaseResampler(inRate, outRate, quality)
+
+###################################################################################
+# Time one 20ms block through each tier in both directions
+###################################################################################
+def bench(blocks=2000):
+    from timeit import timeit
+    rng = np.random.default_rng(1)
+    for inRate, outRate in ((8000, 48000), (48000, 8000), (8000, 16000), (16000, 8000)):
+        pcm = rng.integers(-8000, 8000, inRate // 50, dtype=np.int16).tobytes()
+        for quality in RESAMPLE_QUALITY:
+            r = makeResampler(inRate, outRate, quality)
+            us = timeit(lambda: r.process(pcm), number=blocks) / blocks * 1e6
+            print("{:>5} -> {:<5} {:<7} {:8.1f} us/block".format(inRate, outRate, quality, us))
+        try:
+            import warnings
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                import audioop
+            state = [None]
+            def ratecv():
+                out, state[0] = audioop.ratecv(pcm, 2, 1, inRate, outRate, state[0])
+            us = timeit(ratecv, number=blocks) / blocks * 1e6
+            print("{:>5} -> {:<5} {:<7} {:8.1f} us/block".format(inRate, outRate, "audioop", us))
+        except ImportError:
+            pass
+
+if __name__ == '__main__':
+    import sys
+    if '--bench' in sys.argv:
+        bench()
+    else:
+        print("usage: resample.py --bench")
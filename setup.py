@@ -24,7 +24,7 @@ setup(name='pyUC',
       keywords='dmr ysf nxdn p25 dstar radio digital mmdvm ham amateur radio',
       author='Michael Zingman, N4IRR',
       author_email='n4irr@amsat.org',
-      install_requires=['pyaudio', 'ImageTk', 'BeautifulSoup4', 'pillow', 'requests'],
+      install_requires=['pyaudio', 'ImageTk', 'BeautifulSoup4', 'pillow', 'requests', 'numpy'],
       license='GPLv3',
       url='https://github.com/DVSwitch/USRP_Client',
       packages=['pyUC'],
@@ -0,0 +1,57 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from codec import makeVoiceCodec
+
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore")
+    audioop = pytest.importorskip("audioop")
+
+def speech(frames=50, seed=1):
+    rng = np.random.default_rng(seed)
+    t = np.arange(frames * 160)
+    x = 9000 * np.sin(2 * np.pi * 440 * t / 8000) + rng.normal(0, 3000, len(t))
+    x[:160] = rng.integers(-32768, 32768, 160)          # full scale, clipping included
+    return np.clip(x, -32768, 32767).astype('<i2').tobytes()
+
+def test_ulaw_matches_audioop():
+    codec = makeVoiceCodec("ulaw")
+    every = np.arange(-32768, 32768, dtype='<i2').tobytes()
+    assert codec.encode(every) == audioop.lin2ulaw(every, 2)
+    codes = bytes(range(256))
+    assert codec.decode(codes) == audioop.ulaw2lin(codes, 2)
+
+def test_adpcm_matches_audioop_across_frames():
+    codec = makeVoiceCodec("adpcm")
+    pcm = speech()
+    encState = decState = None
+    for i in range(0, len(pcm), 320):
+        frame = pcm[i:i+320]
+        expected, encState = audioop.lin2adpcm(frame, 2, encState)
+        data = codec.encode(frame)
+        assert data == expected
+        expected, decState = audioop.adpcm2lin(data, 2, decState)
+        assert codec.decode(data) == expected
+
+def test_adpcm_reset_starts_from_silence():
+    codec = makeVoiceCodec("adpcm")
+    frame = speech(1)
+    first = codec.encode(frame)
+    assert codec.encode(frame) != first
+    codec.reset()
+    assert codec.encode(frame) == first
+
+def test_adpcm_rejects_odd_sample_counts():
+    codec = makeVoiceCodec("adpcm")
+    for size in (2, 318, 3):
+        with pytest.raises(ValueError):
+            codec.encode(bytes(size))
+    assert codec.encodeState == (0, 0)      # nothing was half encoded
+    assert len(codec.encode(bytes(4))) == 1
+
+def test_unknown_codec():
+    assert makeVoiceCodec("pcm").encode(b'\1\2') == b'\1\2'
+    with pytest.raises(ValueError):
+        makeVoiceCodec("gsm")
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+from dmrid import loadIdDatabase, compileIndex, readRecords, DMRIdDatabase
+
+def load(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return loadIdDatabase(str(path))
+
+def test_dmrids_dat_tab_separated(tmp_path):
+    db = load(tmp_path, 'DMRIds.dat', '3100001\tN4IRR\tMike, Jr\n3100002\tN4IRS\tSteve\n#comment\n3100003\tK4XYZ\n')
+    assert len(db) == 3
+    assert db.lookup(3100001) == ('N4IRR', 'Mike,')
+    assert db.lookup(3100003) == ('K4XYZ', '')
+
+def test_csv_with_header(tmp_path):
+    db = load(tmp_path, 'user.csv', 'RADIO_ID,CALLSIGN,FIRST_NAME,LAST_NAME,CITY\n'
+                                    '3100001,N4IRR,Mike Bob,Smith,Atlanta\nnot,a,row\n3100002, N4IRS ,Steve,,\n')
+    assert len(db) == 2
+    assert db.lookup(3100001) == ('N4IRR', 'Mike')
+    assert db.lookup(3100002) == ('N4IRS', 'Steve')
+
+def test_csv_without_header(tmp_path):
+    db = load(tmp_path, 'user.csv', '3100001,N4IRR,Mike,Smith\n3100002,N4IRS\n')
+    assert db.lookup(3100001) == ('N4IRR', 'Mike')
+    assert db.lookup(3100002) == ('N4IRS', '')
+
+def test_users_json(tmp_path):
+    db = load(tmp_path, 'users.json', '{"users": [{"id": 3100001, "callsign": "N4IRR", "fname": "Mike"}]}')
+    assert db.lookup(3100001) == ('N4IRR', 'Mike')
+
+def test_binary_search_edges(tmp_path):
+    ids = [1, 2, 1000, 3100001, 0xffffffff]
+    db = load(tmp_path, 'user.csv', ''.join('{},C{}\n'.format(rid, rid) for rid in reversed(ids)))
+    for rid in ids:
+        assert db.lookup(rid) == ('C{}'.format(rid), '')
+    for rid in (0, 3, 999, 3100000, 3100002, 0xfffffffe, 0x100000000, -1):
+        assert db.lookup(rid) == None
+
+def test_empty_dump(tmp_path):
+    path = tmp_path / 'user.csv'
+    path.write_text('RADIO_ID,CALLSIGN\n')
+    assert compileIndex(str(path), str(path) + '.idx') == 0
+    db = DMRIdDatabase(str(path) + '.idx')
+    assert len(db) == 0 and db.lookup(3100001) == None
+
+def test_stale_index_is_rebuilt(tmp_path):
+    path = tmp_path / 'DMRIds.dat'
+    path.write_text('3100001 N4IRR Mike\n')
+    assert loadIdDatabase(str(path)).lookup(3100001) == ('N4IRR', 'Mike')
+    index = str(path) + '.idx'
+    built = os.stat(index).st_mtime
+    path.write_text('3100001 N4IRR Michael\n3100002 N4IRS Steve\n')
+    os.utime(str(path), (built + 10, built + 10))
+    db = loadIdDatabase(str(path))
+    assert db.lookup(3100001) == ('N4IRR', 'Michael') and len(db) == 2
+    os.utime(index, (built + 20, built + 20))   # newer than the dump, used as is
+    path.write_text('garbage')
+    os.utime(str(path), (built + 15, built + 15))
+    assert len(loadIdDatabase(str(path))) == 2
+
+def test_bad_files(tmp_path):
+    assert load(tmp_path, 'user.csv', 'foo,bar\n1,2\n') == None
+    bad = tmp_path / 'bad.idx'
+    bad.write_bytes(b'NOTANIDX' + bytes(8))
+    with pytest.raises(ValueError):
+        DMRIdDatabase(str(bad))
+    with pytest.raises(ValueError):
+        list(readRecords(str(tmp_path / 'user.csv')))
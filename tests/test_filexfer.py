@@ -0,0 +1,45 @@
+import hashlib
+import os
+
+from filexfer import FileReceiver, FILE_IDLE_TIMEOUT
+from usrp import FILE_SUBCOMMAND_NAME, FILE_SUBCOMMAND_PAYLOAD, FILE_SUBCOMMAND_WRITE
+
+AB = ('127.0.0.1', 34001)
+
+def send(receiver, data, name=b'tg.json', md5=None, now=0.0):
+    events = []
+    receiver.emit = events.append
+    receiver.handle(AB, bytes([FILE_SUBCOMMAND_NAME]) + len(data).to_bytes(4, 'big') + name + b'\0', 0, now)
+    for i in range(0, len(data), 254):
+        chunk = bytes([FILE_SUBCOMMAND_PAYLOAD]) + data[i:i+254]
+        receiver.handle(AB, chunk, len(chunk), now)
+    if md5 != False:
+        digest = (md5 or hashlib.md5(data).hexdigest().upper()).encode()
+        receiver.handle(AB, bytes([FILE_SUBCOMMAND_WRITE]) + digest, 33, now)
+    return events
+
+def test_file_is_saved_when_md5_matches(tmp_path):
+    data = os.urandom(1000)
+    events = send(FileReceiver(str(tmp_path), None), data)
+    assert events[-1] == ('file_done', 'tg.json', str(tmp_path / 'tg.json'), True, '1000 bytes')
+    assert (tmp_path / 'tg.json').read_bytes() == data
+    assert os.listdir(str(tmp_path)) == ['tg.json']
+
+def test_md5_mismatch_keeps_the_old_file(tmp_path):
+    (tmp_path / 'tg.json').write_bytes(b'old')
+    events = send(FileReceiver(str(tmp_path), None), os.urandom(1000), md5='0' * 32)
+    assert events[-1][3] == False and 'digest' in events[-1][4]
+    assert (tmp_path / 'tg.json').read_bytes() == b'old'
+    assert os.listdir(str(tmp_path)) == ['tg.json']
+
+def test_stalled_transfer_is_expired(tmp_path):
+    receiver = FileReceiver(str(tmp_path), None)
+    events = send(receiver, os.urandom(1000), md5=False)
+    assert len(receiver.transfers) == 1
+    receiver.expire(FILE_IDLE_TIMEOUT + 1)
+    assert events[-1][4] == 'timed out'
+    assert receiver.transfers == {} and os.listdir(str(tmp_path)) == []
+
+def test_path_in_name_is_stripped(tmp_path):
+    send(FileReceiver(str(tmp_path), None), b'x', name=b'../../x.ini')
+    assert os.listdir(str(tmp_path)) == ['x.ini']
@@ -0,0 +1,70 @@
+from audio import JitterBuffer, FRAME_BYTES
+from usrp import seqDiff
+
+def frame(n):
+    return bytes([n & 0xff]) * FRAME_BYTES
+
+def filled(seqs, minDepth=2, maxDepth=10):
+    jb = JitterBuffer(minDepth, maxDepth)
+    for seq in seqs:
+        jb.put(seq, frame(seq))
+    jb.drain()
+    return jb
+
+def test_seqdiff_wraps_at_16_bits():
+    assert seqDiff(0, 0xffff) == 1
+    assert seqDiff(0xffff, 0) == -1
+    assert seqDiff(5, 3) == 2
+    assert seqDiff(0x20000, 0x1ffff) == 1     # a 32 bit sender's low bits wrap the same way
+
+def test_reordered_frames_play_in_order():
+    jb = filled([1, 3, 2, 4])
+    assert [jb.get(block=False) for _ in range(4)] == [frame(1), frame(2), frame(3), frame(4)]
+    assert jb.get(block=False) == None
+
+def test_missing_frame_is_concealed():
+    jb = filled([1, 3])
+    assert jb.get(block=False) == frame(1)
+    concealed = jb.get(block=False)
+    assert len(concealed) == FRAME_BYTES and concealed != frame(1)
+    assert jb.get(block=False) == frame(3)
+    assert jb.lost == 1 and jb.concealments == 1
+
+def test_duplicate_and_late_frames_are_dropped():
+    jb = filled([1, 2, 2])
+    assert jb.get(block=False) == frame(1)
+    jb.put(1, frame(1))
+    assert jb.duplicates == 1 and jb.late == 1
+
+def test_forward_jump_resyncs():
+    jb = filled([1, 2])
+    assert jb.get(block=False) == frame(1)
+    assert jb.get(block=False) == frame(2)
+    for seq in range(5000, 5050):       # AB restarted far ahead
+        jb.put(seq, frame(seq))
+    assert jb.get(block=False) == frame(5000)
+    played = [jb.get(block=False) for _ in range(3)]
+    assert jb.concealments == 0         # the backlog is trimmed, not concealed
+    assert all(f[0] > 5000 & 0xff for f in played)
+    assert len(jb.frames) <= jb.target + 2
+
+def test_sequence_wraps_at_16_bits():
+    jb = filled([0xfffe, 0xffff, 0, 1])
+    assert [jb.get(block=False) for _ in range(4)] == [frame(0xfffe), frame(0xffff), frame(0), frame(1)]
+    assert jb.nextSeq == 2 and jb.late == 0 and jb.concealments == 0
+
+def test_32_bit_sender_crosses_a_16_bit_wrap():
+    jb = filled([0x2fffe, 0x2ffff, 0x30000, 0x30001])
+    assert [jb.get(block=False) for _ in range(4)] == [frame(0xfe), frame(0xff), frame(0), frame(1)]
+    assert jb.late == 0 and jb.concealments == 0
+
+def test_ping_in_the_stream_is_not_concealed():
+    jb = JitterBuffer(2, 10)
+    jb.put(10, frame(10))
+    jb.put(11, frame(11))
+    jb.skip(12)                         # AB sent a ping between two voice frames
+    jb.put(13, frame(13))
+    jb.drain()
+    assert [jb.get(block=False) for _ in range(3)] == [frame(10), frame(11), frame(13)]
+    assert jb.get(block=False) == None
+    assert jb.lost == 0 and jb.concealments == 0
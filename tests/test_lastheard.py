@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+from lastheard import HeardJournal, queryJournal, airtime, main
+from usrp import USRPClient, UCConfig, TalkGroupList, packUSRP, USRP_TYPE_VOICE, USRP_TYPE_TEXT, TLV_TAG_SET_INFO
+
+AB = ('1.2.3.4', 12345)
+
+def setInfo(rid, tg, call):
+    body = bytes([TLV_TAG_SET_INFO, 0]) + rid.to_bytes(3, 'big') + bytes(4) + tg.to_bytes(3, 'big') + bytes([2, 1])
+    return packUSRP(0, 0, USRP_TYPE_TEXT, body + call.encode() + b'\0')
+
+def transmission(client, call, tg, seq):
+    client.handlePacket(setInfo(3100001, tg, call), AB)
+    for i in range(5):
+        client.handlePacket(packUSRP(seq + i, 1, USRP_TYPE_VOICE, bytes(320)), AB)
+    client.handlePacket(packUSRP(seq + 5, 0, USRP_TYPE_VOICE, b''), AB)
+
+def test_talkgroups_are_journaled_by_number(tmp_path):
+    path = str(tmp_path / 'journal.db')
+    journal = HeardJournal(path)
+    config = UCConfig()
+    config.talkGroups = {'DMR': TalkGroupList([('TAC 310', '310'), ('Worldwide', '91')])}
+    client = USRPClient(config)
+    client.subscribe(journal.onEvent)
+    transmission(client, 'N4IRR', 310, 100)
+    transmission(client, 'N4IRS', 91, 200)
+    transmission(client, 'N4IRR', 310, 300)
+    transmission(client, 'N4IRR', 3100, 400)       # not in the list
+    journal.transmit(True, 'N0CALL', 2, '310', 'TAC 310')
+    journal.transmit(False, 'N0CALL', 2, '310', 'TAC 310')
+    journal.close()
+
+    rows = queryJournal(path, tg='310')
+    assert [(r['call'], r['source']) for r in rows] == [('N4IRR', 'rx'), ('N4IRR', 'rx'), ('N0CALL', 'tx')]
+    assert set(r['tg_name'] for r in rows) == {'TAC 310'}
+    assert len(queryJournal(path, tg='310', event='begin')) == 3
+    totals = airtime(queryJournal(path))
+    assert [(t['tg'], t['tg_name'], t['count']) for t in totals][:2] == [('310', 'TAC 310', 3), ('91', 'Worldwide', 1)]
+    assert queryJournal(path, tg='3100')[0]['tg_name'] == '3100'
+
+def test_old_journal_gets_the_name_column(tmp_path):
+    path = str(tmp_path / 'journal.db')
+    db = sqlite3.connect(path)
+    db.execute('CREATE TABLE journal (id INTEGER PRIMARY KEY, time REAL, event TEXT, call TEXT, name TEXT,'
+               ' slot TEXT, tg TEXT, mode TEXT, loss TEXT, duration REAL, source TEXT)')
+    db.execute("INSERT INTO journal (time, event, call, tg, duration) VALUES (1.0, 'end', 'N4IRR', 'TAC 310', 2.0)")
+    db.commit()
+    db.close()
+    assert queryJournal(path)[0]['tg_name'] == None   # read only, left as it was
+    journal = HeardJournal(path)
+    journal.record('end', 'N4IRS', 1, '91', duration=1.0, when=2.0, tgName='Worldwide')
+    journal.close()
+    assert [r['tg_name'] for r in queryJournal(path)] == [None, 'Worldwide']
+
+def test_missing_journal_is_not_created(tmp_path, capsys):
+    path = tmp_path / 'nothing.db'
+    with pytest.raises(FileNotFoundError):
+        queryJournal(str(path))
+    assert main(['lastheard.py', str(path)]) == 1
+    assert 'nothing.db' in capsys.readouterr().err
+    assert not path.exists()
@@ -0,0 +1,52 @@
+import numpy as np
+
+from audio import LevelMeter
+
+def tone(amplitude):
+    return np.full(160, amplitude, dtype='<i2').tobytes()
+
+def meter(**kw):
+    events = []
+    return LevelMeter(events.append, **kw), events
+
+def test_publish_is_throttled_to_fps():
+    m, events = meter(fps=10, peakHold=0)
+    for i in range(50):                     # one second of 20ms frames
+        m.update(tone(1000), now=1.0 + i * 0.020)
+    assert len(events) == 10
+    assert events[0] == ("level", 10, 10)
+
+def test_loudest_since_the_last_publish_is_shown():
+    m, events = meter(fps=10, peakHold=0)
+    m.update(tone(500), now=1.0)
+    m.update(tone(3000), now=1.02)
+    m.update(tone(800), now=1.04)
+    m.update(tone(700), now=1.10)
+    assert events == [("level", 5, 5), ("level", 30, 30)]
+
+def test_peak_is_held_then_decays():
+    m, events = meter(fps=10, peakHold=1.0)
+    m.update(tone(5000), now=1.0)
+    m.update(tone(1000), now=1.5)
+    m.update(tone(1000), now=1.9)
+    m.update(tone(1000), now=2.0)           # held for its full second
+    m.update(tone(1000), now=2.1)
+    assert [e[2] for e in events] == [50, 50, 50, 10, 10]
+    assert [e[1] for e in events] == [50, 10, 10, 10, 10]
+    m.update(tone(2000), now=2.2)           # louder than the held peak, shown at once
+    assert events[-1] == ("level", 20, 20)
+
+def test_every_nth_frame_is_measured():
+    m, events = meter(fps=1000, peakHold=0, every=3)
+    for i, amplitude in enumerate([9000, 9000, 100, 9000, 9000, 200]):
+        m.update(tone(amplitude), now=1.0 + i)
+    assert events == [("level", 1, 1), ("level", 2, 2)]
+
+def test_power_from_the_caller_and_silence():
+    m, events = meter(fps=10, peakHold=1.0)
+    m.update(tone(1000), power=4200, now=1.0)
+    assert events[-1] == ("level", 42, 10)
+    m.silence()
+    assert events[-1] == ("level", 0, 0)
+    m.update(tone(300), now=1.05)           # the hold went with the silence
+    assert events[-1] == ("level", 3, 3)
@@ -0,0 +1,92 @@
+import numpy as np
+
+from audio import Mixer, AudioPipeline, SessionAudio, FRAME_BYTES
+from usrp import USRPClient, UCConfig
+
+A = ('10.0.0.1', 34001, 310)
+B = ('10.0.0.2', 34001, 91)
+P = ('10.0.0.3', 34001, 9990)
+
+def frame(value):
+    return np.full(FRAME_BYTES // 2, value, dtype='<i2').tobytes()
+
+def samples(block):
+    return set(np.frombuffer(block, dtype='<i2').tolist())
+
+def talk(mixer, key, values, session=None, seq=0):
+    for i, value in enumerate(values):
+        mixer.put(key, seq + i, frame(value), session)
+    mixer.put(key, seq + len(values), None, session)     # unkey, play out what is held
+
+def test_sources_are_summed_and_saturated():
+    mixer = Mixer()
+    talk(mixer, A, [1000, 20000, -20000])
+    talk(mixer, B, [234, 20000, -20000])
+    assert samples(mixer.mix()) == {1234}
+    assert samples(mixer.mix()) == {32767}
+    assert samples(mixer.mix()) == {-32768}
+    assert mixer.mix() == None
+
+def test_one_source_at_unity_is_passed_through():
+    mixer = Mixer()
+    talk(mixer, A, [1000])
+    assert mixer.mix() == frame(1000)
+
+def test_gains_by_key_talkgroup_and_session():
+    mixer = Mixer()
+    mixer.setGain(91, 0.5)                  # set before the source exists, kept for it
+    session = SessionAudio(None, gain=0.5)
+    talk(mixer, A, [1000, 1000], session)
+    talk(mixer, B, [1000, 1000])
+    assert samples(mixer.mix()) == {500 + 500}
+    mixer.setGain(A, 2.0)
+    assert samples(mixer.mix()) == {1000 + 500}
+
+def test_priority_ducks_the_others_until_it_ends():
+    mixer = Mixer(priorityTGs=['9990'], duckGain=0.25)
+    talk(mixer, A, [4000] * 4)
+    talk(mixer, P, [1000, 1000])
+    assert samples(mixer.mix()) == {1000 + 1000}
+    assert mixer.ducking
+    assert samples(mixer.mix()) == {1000 + 1000}
+    assert samples(mixer.mix()) == {4000}   # the priority stream ended, A is back to full
+    assert mixer.ducking == False
+    mixer.setPriority(91)
+    talk(mixer, B, [400])
+    assert samples(mixer.mix()) == {400 + 1000}
+
+def test_idle_sources_are_forgotten_with_their_counters():
+    mixer = Mixer(idleTimeout=10.0)
+    talk(mixer, A, [1, 2])
+    mixer.put(A, 0, frame(1))               # a duplicate, seq 0 is still held
+    while mixer.mix() != None:
+        pass
+    source = mixer.sources[A]
+    mixer.expire(source.lastHeard + 5.0)
+    assert A in mixer.sources
+    mixer.expire(source.lastHeard + 10.0)
+    assert mixer.sources == {}
+    assert mixer.counters()['duplicates'] == 1 and mixer.counters()['sources'] == 0
+
+def test_end_tx_drains_the_session():
+    config = UCConfig()
+    config.jitterMinDepth = 5               # 100ms, nothing plays on its own in this test
+    client = USRPClient(config)
+    pipeline = AudioPipeline(client, config)
+    session = pipeline.sessions[0]
+    pipeline.mixer.put(A, 0, frame(100), session)
+    pipeline.mixer.put(A, 1, frame(200), session)
+    assert pipeline.mixer.mix() == None and pipeline.mixer.waiting()
+    pipeline.onEvent(("end_tx", "N4IRR", 2, "TAC 310", "0.00%", 0, 0.04, {}, "310"), session)
+    assert samples(pipeline.mixer.mix()) == {100}
+    assert samples(pipeline.mixer.mix()) == {200}
+    assert pipeline.mixer.mix() == None
+
+def test_ping_skips_every_stream_of_the_sender():
+    mixer = Mixer()
+    mixer.put(A, 10, frame(1))
+    mixer.skip(('10.0.0.1', 34001, 0), 11)  # the ping carried no talkgroup
+    mixer.put(A, 12, frame(2))
+    mixer.put(A, 13, None)
+    assert [samples(mixer.mix()) for _ in range(2)] == [{1}, {2}]
+    assert mixer.counters()['concealments'] == 0
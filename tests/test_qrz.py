@@ -0,0 +1,64 @@
+import io
+import threading
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+pytest.importorskip("bs4")
+pytest.importorskip("requests")
+Image = pytest.importorskip("PIL.Image")
+from qrz import QRZCache, QRZLookup
+
+def png():
+    out = io.BytesIO()
+    Image.new('RGB', (400, 300), 'red').save(out, 'PNG')
+    return out.getvalue()
+
+PAGES = {
+    '/lookup/N4IRR': (200, b'<html><img id="mypic" src="/pic.png"></html>'),
+    '/lookup/NOPIC': (200, b'<html>no photo</html>'),
+    '/lookup/DOWN': (503, b'busy'),
+    '/lookup/BADPIC': (200, b'<html><img id="mypic" src="/missing.png"></html>'),
+    '/pic.png': (200, png()),
+}
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        status, body = PAGES.get(self.path, (404, b''))
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def lookup():
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    qrz = QRZLookup(QRZCache(':memory:'), baseUrl='http://127.0.0.1:{}/lookup/'.format(server.server_port))
+    yield qrz
+    qrz.close()
+    server.shutdown()
+
+def test_photo_is_fetched_and_cached(lookup):
+    thumb = lookup.lookup('N4IRR').result(5)
+    assert thumb.startswith(b'\x89PNG')
+    assert lookup.cache.get('N4IRR')[1] == thumb
+
+def test_page_without_photo_is_cached_as_none(lookup):
+    assert lookup.lookup('NOPIC').result(5) == b''
+    assert lookup.cache.get('NOPIC') == ('', b'')
+
+def test_http_errors_are_not_cached(lookup):
+    assert lookup.lookup('DOWN').result(5) == b''
+    assert lookup.lookup('BADPIC').result(5) == b''
+    assert lookup.cache.get('DOWN') == None
+    assert lookup.cache.get('BADPIC') == None
+
+def test_connection_failure_is_not_cached():
+    qrz = QRZLookup(QRZCache(':memory:'), timeout=(1, 1), baseUrl='http://127.0.0.1:9/lookup/')
+    assert qrz.lookup('N4IRR').result(5) == b''
+    assert qrz.cache.get('N4IRR') == None
+    qrz.close()
@@ -0,0 +1,59 @@
+import json
+import os
+import struct
+import wave
+
+from recorder import Recorder, WavWriter, queryIndex
+
+def frame(n):
+    return bytes([n]) * 320
+
+def test_two_sources_on_one_session_record_separately(tmp_path):
+    rec = Recorder(str(tmp_path))
+    a = ('10.0.0.1', 34001, 310)
+    b = ('10.0.0.2', 34001, 91)
+    rec.onEvent('DMR', ('begin_tx', 'N4IRR', '', 2, 'TAC 310', 'Group', '310'), 310)
+    rec.onEvent('DMR', ('begin_tx', 'N4IRS', '', 1, 'WW', 'Group', '91'), 91)
+    for _ in range(5):
+        rec.frame('DMR', a, frame(1))
+        rec.frame('DMR', b, frame(2))
+    rec.frame('DMR', a, None)
+    rec.onEvent('DMR', ('end_tx', 'N4IRR', 2, 'TAC 310', '0.00%', 0, 0.1, {}, '310'), 310)
+    rec.frame('DMR', b, frame(2))
+    rec.frame('DMR', b, None)
+    rec.onEvent('DMR', ('end_tx', 'N4IRS', 1, 'WW', '0.00%', 0, 0.12, {}, '91'), 91)
+    rec.close()
+
+    rows = [json.loads(line) for line in open(tmp_path / 'index.jsonl')]
+    assert sorted(r['call'] for r in rows) == ['N4IRR', 'N4IRS']
+    for row in rows:
+        w = wave.open(os.path.join(str(tmp_path), row['file']))
+        data = w.readframes(w.getnframes())
+        expected = frame(1) * 5 if row['call'] == 'N4IRR' else frame(2) * 6
+        assert data == expected
+        assert row['loss'] == '0.00%'
+
+def test_listed_talkgroups_are_recorded_by_number(tmp_path):
+    rec = Recorder(str(tmp_path))
+    rec.onEvent('DMR', ('begin_tx', 'N4IRR', '', 2, 'TAC 310', 'Group', '310'), 310)
+    rec.frame('DMR', ('10.0.0.1', 34001, 310), frame(1))
+    rec.frame('DMR', ('10.0.0.1', 34001, 310), None)
+    rec.onEvent('DMR', ('end_tx', 'N4IRR', 2, 'TAC 310', '0.00%', 0, 0.02, {}, '310'), 310)
+    rec.close()
+
+    rows = queryIndex(str(tmp_path), tg='310')
+    assert len(rows) == 1
+    assert rows[0]['tg_name'] == 'TAC 310' and rows[0]['file'].endswith('_N4IRR_TG310.wav')
+
+def test_ulaw_fmt_chunk_has_cbsize(tmp_path):
+    path = str(tmp_path / 'u.wav')
+    wav = WavWriter(path, 'ulaw')
+    wav.write(frame(1) * 3)
+    wav.close()
+    data = open(path, 'rb').read()
+    assert data[12:16] == b'fmt ' and struct.unpack_from('<I', data, 16)[0] == 18
+    tag, channels, rate, byteRate, align, bits, cbSize = struct.unpack_from('<HHIIHHH', data, 20)
+    assert (tag, channels, rate, byteRate, align, bits, cbSize) == (7, 1, 8000, 8000, 1, 8, 0)
+    assert data[38:42] == b'fact' and struct.unpack_from('<II', data, 42) == (4, 480)
+    assert data[50:54] == b'data' and struct.unpack_from('<I', data, 54)[0] == 480
+    assert struct.unpack_from('<I', data, 4)[0] == len(data) - 8
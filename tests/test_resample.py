@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from resample import makeResampler, RESAMPLE_QUALITY
+
+def tone(rate, hz, seconds=1.0, amplitude=10000):
+    t = np.arange(int(rate * seconds)) / rate
+    return (amplitude * np.sin(2 * np.pi * hz * t)).astype('<i2').tobytes()
+
+def blocks(resampler, pcm, rate):
+    step = rate // 50 * 2                   # 20ms of 16 bit samples
+    return b''.join(resampler.process(pcm[i:i+step]) for i in range(0, len(pcm), step))
+
+# SNR in dB of a tone against the best fitting sine at the same frequency
+def snr(pcm, rate, hz):
+    y = np.frombuffer(pcm, dtype='<i2').astype(float)[rate // 10:]     # skip the filter's start up
+    t = np.arange(len(y)) / rate
+    basis = np.column_stack((np.sin(2 * np.pi * hz * t), np.cos(2 * np.pi * hz * t)))
+    fit = basis @ np.linalg.lstsq(basis, y, rcond=None)[0]
+    return 10 * np.log10(np.sum(fit ** 2) / np.sum((y - fit) ** 2))
+
+@pytest.mark.parametrize("inRate,outRate", [(8000, 48000), (48000, 8000), (8000, 44100), (44100, 8000)])
+def test_polyphase_snr(inRate, outRate):
+    for quality, floor in (("low", 35), ("medium", 50), ("high", 60)):
+        out = blocks(makeResampler(inRate, outRate, quality), tone(inRate, 1000), inRate)
+        assert abs(len(out) // 2 - outRate) <= 1
+        assert snr(out, outRate, 1000) > floor, quality
+
+def test_blocks_join_seamlessly():
+    pcm = tone(8000, 700)
+    whole = makeResampler(8000, 44100).process(pcm)
+    assert np.abs(np.frombuffer(blocks(makeResampler(8000, 44100), pcm, 8000), dtype='<i2')[:len(whole) // 2].astype(int)
+                  - np.frombuffer(whole, dtype='<i2')).max() <= 1
+
+def test_downsample_removes_what_8k_can_not_carry():
+    out = blocks(makeResampler(48000, 8000, "high"), tone(48000, 6000), 48000)
+    assert np.abs(np.frombuffer(out, dtype='<i2')[800:]).max() < 100
+
+def test_make_resampler():
+    assert makeResampler(8000, 8000).process(b'\1\2') == b'\1\2'
+    assert set(RESAMPLE_QUALITY) == {"linear", "low", "medium", "high"}
+    with pytest.raises(ValueError):
+        makeResampler(8000, 48000, "best")
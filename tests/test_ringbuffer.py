@@ -0,0 +1,81 @@
+import threading
+
+import numpy as np
+import pytest
+
+from audio import RingBuffer, AudioPipeline
+from usrp import USRPClient, UCConfig
+
+def pcm(values):
+    return np.asarray(values, dtype='<i2').tobytes()
+
+def test_wraparound_keeps_order():
+    ring = RingBuffer(100)
+    nextValue = 0
+    expected = 0
+    for size in [30, 70, 45, 99, 1, 64, 100, 17] * 20:
+        assert ring.write(pcm(np.arange(nextValue, nextValue + size) & 0x7fff)) == size
+        nextValue += size
+        out = np.frombuffer(ring.read(size), dtype='<i2')
+        assert list(out) == list(np.arange(expected, expected + size) & 0x7fff)
+        expected += size
+    assert ring.available() == 0 and ring.free() == 100
+
+def test_write_is_all_or_nothing():
+    ring = RingBuffer(10)
+    assert ring.write(pcm(range(8))) == 8
+    assert ring.write(pcm(range(3))) == 0      # only 2 free
+    assert ring.available() == 8 and ring.free() == 2
+    assert ring.read(20) == pcm(range(8))      # a read takes what there is
+    assert ring.read(5) == b''
+
+def test_one_producer_one_consumer():
+    ring = RingBuffer(64)
+    total = 20000
+    received = []
+    def consumer():
+        while len(received) < total:
+            if ring.waitFor(lambda: ring.available() > 0, 2.0) == False:
+                return
+            received.extend(np.frombuffer(ring.read(48), dtype='<i2').tolist())
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    sent = 0
+    while sent < total:
+        n = min(37, total - sent)
+        if ring.waitFor(lambda: ring.free() >= n, 2.0) == False:
+            break
+        assert ring.write(pcm((np.arange(sent, sent + n) % 30000))) == n
+        sent += n
+    thread.join(5)
+    assert received == [i % 30000 for i in range(total)]
+
+def pipeline():
+    config = UCConfig()
+    return AudioPipeline(USRPClient(config), config)
+
+def test_underruns_are_counted():
+    pyaudio = pytest.importorskip("pyaudio")       # the callbacks use its status flags
+    p = pipeline()
+    p.outRing.write(pcm(range(100)))
+    data, flag = p.outCallback(None, 80, None, 0)
+    assert data == pcm(range(80)) and flag == pyaudio.paContinue and p.underruns == 0
+    data, flag = p.outCallback(None, 80, None, 0)      # idle, silence is not an underrun
+    assert data == pcm(range(80, 100)) + bytes(120) and p.underruns == 0
+    p.playing = True
+    p.outCallback(None, 80, None, 0)
+    p.outCallback(None, 0, None, pyaudio.paOutputUnderflow)
+    assert p.underruns == 2
+
+def test_overruns_are_counted():
+    pyaudio = pytest.importorskip("pyaudio")       # the callbacks use its status flags
+    p = pipeline()
+    block = pcm(range(960))
+    writes = p.inRing.capacity // 960
+    for _ in range(writes):
+        p.inCallback(block, 960, None, 0)
+    assert p.overruns == 0
+    p.inCallback(block, 960, None, 0)                   # ring full, the block is dropped
+    p.inCallback(block, 960, None, pyaudio.paInputOverflow)
+    assert p.overruns == 3
+    assert p.inRing.available() == writes * 960
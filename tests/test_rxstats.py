@@ -0,0 +1,97 @@
+from usrp import (RxStats, USRPClient, UCConfig, packUSRP, USRP_TYPE_VOICE, USRP_TYPE_TEXT,
+                  USRP_TYPE_PING, TLV_TAG_SET_INFO)
+
+AB = ('1.2.3.4', 12345)
+
+def test_clean_stream():
+    stats = RxStats()
+    for i in range(10):
+        stats.update(100 + i, now=i * 0.020)
+    assert stats.asDict()['expected'] == 10 and stats.lost() == 0 and stats.lossString() == '0.00%'
+    assert stats.jitter < 1e-9 and abs(stats.maxGap - 0.020) < 1e-9
+
+def test_loss_duplicates_and_reordering():
+    stats = RxStats()
+    for seq in (1, 2, 4, 3, 3, 6):
+        stats.update(seq, now=0.0)
+    assert (stats.expected(), stats.received, stats.lost()) == (6, 5, 1)
+    assert stats.duplicates == 1 and stats.outOfOrder == 1
+    assert stats.lossString() == '16.67%'
+
+def test_jitter_and_gap():
+    stats = RxStats()
+    stats.update(1, now=0.0)
+    stats.update(2, now=0.060)              # 40ms late
+    assert abs(stats.jitter - 0.040 / 16) < 1e-9
+    assert abs(stats.maxGap - 0.060) < 1e-9
+    stats.reset()
+    assert stats.expected() == 0 and stats.lossPercent() == 0.0
+
+def test_wrap_at_16_bits_is_not_loss():
+    stats = RxStats()
+    for seq in (0xfffe, 0xffff, 0, 1):
+        stats.update(seq, now=0.0)
+    assert stats.expected() == 4 and stats.lost() == 0 and stats.outOfOrder == 0
+
+def test_ping_in_the_stream_is_not_loss():
+    stats = RxStats()
+    stats.update(0xffff, now=0.0)
+    stats.skip(0)
+    stats.update(1, now=0.0)
+    stats.update(3, now=0.0)
+    assert (stats.expected(), stats.received, stats.lost()) == (4, 3, 1)
+
+def setInfo(rid, tg, call):
+    body = bytes([TLV_TAG_SET_INFO, 0]) + rid.to_bytes(3, 'big') + bytes(4) + tg.to_bytes(3, 'big') + bytes([2, 1])
+    return packUSRP(0, 0, USRP_TYPE_TEXT, body + call.encode() + b'\0')
+
+def voice(seq, keyup):
+    return packUSRP(seq, keyup, USRP_TYPE_VOICE, bytes(320) if keyup else b'')
+
+def test_missed_eot_does_not_carry_stats_to_the_next_caller():
+    client = USRPClient(UCConfig())
+    ends = []
+    client.subscribe(lambda e: ends.append(e) if e[0] == 'end_tx' else None)
+    client.handlePacket(setInfo(3100001, 310, 'N4IRR'), AB)
+    for seq in range(200, 210):
+        client.handlePacket(voice(seq, True), AB)
+    # no unkey, the next caller's SET_INFO ends the first transmission
+    client.handlePacket(setInfo(3100002, 310, 'N4IRS'), AB)
+    for seq in range(300, 310):
+        client.handlePacket(voice(seq, True), AB)
+    client.handlePacket(voice(310, False), AB)
+    assert [e[1] for e in ends] == ['N4IRR', 'N4IRS']
+    assert ends[1][4] == '0.00%'
+    assert ends[1][7]['expected'] == 11 and ends[1][7]['lost'] == 0
+
+def test_missed_eot_found_by_ping():
+    client = USRPClient(UCConfig())
+    ends = []
+    client.subscribe(lambda e: ends.append(e) if e[0] == 'end_tx' else None)
+    client.handlePacket(setInfo(3100001, 310, 'N4IRR'), AB)
+    for seq in range(200, 205):
+        client.handlePacket(voice(seq, True), AB)
+    client.handlePacket(packUSRP(40, 0, USRP_TYPE_PING, b'PING'), AB)
+    client.handlePacket(packUSRP(41, 0, USRP_TYPE_PING, b'PING'), AB)
+    assert len(ends) == 1 and ends[0][7]['received'] == 5
+    for seq in range(900, 903):             # the next transmission, with no SET_INFO
+        client.handlePacket(voice(seq, True), AB)
+    client.handlePacket(voice(903, False), AB)
+    assert len(ends) == 2 and ends[1][7]['expected'] == 4 and ends[1][4] == '0.00%'
+
+def test_pings_during_a_transmission_are_not_loss():
+    client = USRPClient(UCConfig())
+    ends = []
+    client.subscribe(lambda e: ends.append(e) if e[0] == 'end_tx' else None)
+    client.handlePacket(packUSRP(0xfff0, 0, USRP_TYPE_PING, b'PING'), AB)
+    client.handlePacket(setInfo(3100001, 310, 'N4IRR'), AB)
+    seq = 0xfff1
+    for i in range(40):                 # wraps, with a ping every 10 frames
+        if i % 10 == 5:
+            client.handlePacket(packUSRP(seq, 0, USRP_TYPE_PING, b'PING'), AB)
+            seq = (seq + 1) & 0xffff
+        client.handlePacket(voice(seq, True), AB)
+        seq = (seq + 1) & 0xffff
+    client.handlePacket(voice(seq, False), AB)
+    assert len(ends) == 1 and ends[0][4] == '0.00%'
+    assert ends[0][7]['received'] == 41 and ends[0][7]['lost'] == 0
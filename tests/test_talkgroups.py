@@ -0,0 +1,23 @@
+from usrp import TalkGroupList
+
+def test_search_name_and_value_any_case():
+    tgs = TalkGroupList([('Disconnect', '4000'), ('TAC 310', '310'), ('Tac 311', '311'), ('Parrot', '"9990"')])
+    assert tgs.search('tac') == [1, 2]
+    assert tgs.search('999') == [3]             # quotes are not part of the key
+    assert tgs.search('') == [0, 1, 2, 3]
+    assert tgs.search('nothing') == []
+
+def test_search_within_previous_result():
+    tgs = TalkGroupList([('TAC 310', '310'), ('TAC 311', '311'), ('World', '91')])
+    first = tgs.search('tac')
+    assert tgs.search('tac 31', first) == [0, 1]
+    assert tgs.search('tac 311', tgs.search('tac 31', first)) == [1]
+
+def test_search_sees_appended_entries():
+    tgs = TalkGroupList([('TAC 310', '310')])
+    assert tgs.search('310') == [0]
+    tgs.append(('Ohio', '3139'))
+    tgs.extend([('Georgia', '3113')])
+    assert tgs.search('31') == [0, 1, 2]
+    assert tgs.indexOf(3139) == 1
+    assert tgs.nameOf('9', 'none') == 'none'
@@ -0,0 +1,80 @@
+import struct
+from time import monotonic
+
+import numpy as np
+
+from txplay import TxPlayer, FileSource, FRAME_BYTES, FRAME_TIME
+
+class FakeClient:
+
+    def __init__(self):
+        self.ptt = False
+        self.txSource = None
+        self.transmitEnable = True
+        self.done = False
+        self.name = "DMR"
+        self.sent = []                  # (time, audio, keyup)
+        self.events = []
+
+    def sendVoice(self, audio, keyup):
+        self.sent.append((monotonic(), bytes(audio), keyup))
+
+    def emit(self, event):
+        self.events.append(event)
+
+def writeWav(path, samples, rate=8000, channels=1):
+    data = np.asarray(samples, dtype='<i2').tobytes()
+    fmt = struct.pack('<HHIIHH', 1, channels, rate, rate * channels * 2, channels * 2, 16)
+    with open(path, 'wb') as f:
+        f.write(b'RIFF' + struct.pack('<I', 4 + 8 + len(fmt) + 8 + len(data)) + b'WAVE')
+        f.write(b'fmt ' + struct.pack('<I', len(fmt)) + fmt + b'data' + struct.pack('<I', len(data)) + data)
+    return str(path)
+
+def play(path):
+    client = FakeClient()
+    player = TxPlayer(client)
+    assert player.play(FileSource(path))
+    player.wait(5)
+    return client, player
+
+def test_frames_keyup_and_unkey(tmp_path):
+    samples = np.arange(1000) - 500         # 6 whole frames and 40 samples
+    client, player = play(writeWav(tmp_path / 'id.wav', samples))
+    frames = [audio for _, audio, keyup in client.sent if keyup]
+    assert len(frames) == 7 and all(len(f) == FRAME_BYTES for f in frames)
+    assert b''.join(frames)[:2000] == np.asarray(samples, dtype='<i2').tobytes()
+    assert frames[-1][80:] == bytes(FRAME_BYTES - 80)  # the last one is padded with silence
+    assert client.sent[-1][2] == False and client.sent[-1][1] == bytes(FRAME_BYTES)
+    assert [keyup for _, _, keyup in client.sent] == [True] * 7 + [False]
+    assert client.events == [("play", "id.wav", True), ("play", "id.wav", False)]
+    assert client.txSource == None
+
+def test_frames_are_paced(tmp_path):
+    client, player = play(writeWav(tmp_path / 'id.wav', np.zeros(160 * 10)))
+    times = [t for t, _, keyup in client.sent if keyup]
+    assert times[-1] - times[0] >= 9 * FRAME_TIME - 0.002
+    assert times[-1] - times[0] < 9 * FRAME_TIME + 0.1
+
+def test_stereo_48k_is_mixed_down_and_resampled(tmp_path):
+    stereo = np.zeros((4800, 2))            # 100ms
+    stereo[:, 0] = 1000
+    stereo[:, 1] = 3000
+    source = FileSource(writeWav(tmp_path / 'st.wav', stereo.ravel(), 48000, 2))
+    assert len(source) == 5
+    pcm = np.frombuffer(source.pcm, dtype='<i2')
+    assert abs(len(pcm) - 800) <= 1
+    assert np.all(np.abs(pcm[200:600] - 2000) <= 20)   # left and right averaged, away from the filter edges
+
+def test_raw_pcm_and_busy_channel(tmp_path):
+    path = tmp_path / 'id.pcm'
+    path.write_bytes(bytes(FRAME_BYTES * 2))
+    assert len(FileSource(str(path))) == 2
+    client = FakeClient()
+    client.ptt = True
+    assert TxPlayer(client).play(FileSource(str(path))) == False
+    client.ptt = False
+    client.transmitEnable = False           # a station is being received
+    player = TxPlayer(client)
+    assert player.play(FileSource(str(path)), waitClear=0.2)
+    player.wait(5)
+    assert client.sent == [] and client.events == []
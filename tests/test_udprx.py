@@ -0,0 +1,73 @@
+import os
+import socket
+
+import pytest
+
+from udprx import UDPReceiver, loadRecvmmsg, BUFFER_SIZE
+
+def sockets(senders=2):
+    rx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    rx.bind(('127.0.0.1', 0))
+    rx.setblocking(False)
+    tx = []
+    for _ in range(senders):
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        s.bind(('127.0.0.1', 0))
+        tx.append(s)
+    return rx, tx
+
+def exchange(count, batch, useRecvmmsg):
+    rx, tx = sockets()
+    got = []
+    receiver = UDPReceiver(rx, lambda datagram, addr: got.append((bytes(datagram), addr)), batch, useRecvmmsg)
+    sent = []
+    for i in range(count):
+        payload = os.urandom(1 + (i * 37) % 400) if i != 3 else b'x' * 352
+        sender = tx[i % len(tx)]
+        sender.sendto(payload, rx.getsockname())
+        sent.append((payload, sender.getsockname()))
+    receiver.readReady()
+    for s in [rx] + tx:
+        s.close()
+    return receiver, got, sent
+
+def test_batched_receive():
+    if loadRecvmmsg() == None:
+        pytest.skip("no recvmmsg here")
+    receiver, got, sent = exchange(40, 16, True)
+    assert receiver.mmsg != None
+    assert got == sent
+    assert (receiver.packets, receiver.syscalls) == (40, 3)    # 16 + 16 + 8
+    assert receiver.bytes == sum(len(p) for p, _ in sent)
+    rates = receiver.rates()
+    assert rates['batched'] and rates['syscalls_per_packet'] == round(3 / 40, 2)
+
+def test_batched_receive_stops_after_max_batches():
+    if loadRecvmmsg() == None:
+        pytest.skip("no recvmmsg here")
+    receiver, got, sent = exchange(40, 4, True)
+    assert got == sent[:32] and receiver.syscalls == 8
+
+def test_fallback_receive():
+    receiver, got, sent = exchange(20, 32, False)
+    assert receiver.mmsg == None
+    assert got == sent
+    assert (receiver.packets, receiver.syscalls) == (20, 21)   # the last call finds the socket empty
+    rates = receiver.rates()
+    assert rates['batched'] == False and rates['syscalls_per_packet'] == 1.05
+    assert receiver.rates()['pps'] == 0.0                      # counted from the last call
+
+def test_handler_errors_do_not_stop_the_drain():
+    rx, tx = sockets(1)
+    got = []
+    def handler(datagram, addr):
+        got.append(bytes(datagram))
+        if len(got) == 1:
+            raise ValueError("bad packet")
+    receiver = UDPReceiver(rx, handler, 8, True)
+    for payload in (b'a', b'bb', b'c' * BUFFER_SIZE):
+        tx[0].sendto(payload, rx.getsockname())
+    receiver.readReady()
+    assert got == [b'a', b'bb', b'c' * BUFFER_SIZE]
+    rx.close()
+    tx[0].close()
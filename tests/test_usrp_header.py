@@ -0,0 +1,49 @@
+import struct
+
+import pytest
+
+from usrp import (packUSRP, unpackUSRP, USRPPacker, USRP, USRP_HEADER_SIZE, USRP_TYPE_VOICE, USRP_TYPE_DTMF,
+                  USRP_TYPE_TEXT, USRP_TYPE_PING, USRP_TYPE_TLV, USRP_TYPE_VOICE_ADPCM, USRP_TYPE_VOICE_ULAW)
+
+# How pyUC built packets before the header was a precompiled struct
+def baselineVoice(seq, ptt, audio):
+    return 'USRP'.encode('ASCII') + struct.pack('>iiiiiii', seq, 0, ptt, 0, USRP_TYPE_VOICE, 0, 0) + audio
+
+def baselineCommand(seq, packetType, cmd):
+    return 'USRP'.encode('ASCII') + (struct.pack('>iiiiiii', seq, 0, 0, 0, packetType << 24, 0, 0)) + cmd
+
+# and read them: big endian fields, but the type as AB writes it, a little endian int
+def baselineUnpack(soundData):
+    fields = [struct.unpack('>i', soundData[i:i+4])[0] for i in range(4, 32, 4)]
+    fields[4] = struct.unpack('<i', soundData[20:24])[0]
+    return (soundData[0:4],) + tuple(fields)
+
+@pytest.mark.parametrize("seq", [0, 1, 0x1234, 0xffff])
+def test_voice_matches_baseline(seq):
+    audio = bytes(range(256)) + bytes(64)
+    assert packUSRP(seq, 1, USRP_TYPE_VOICE, audio) == baselineVoice(seq, 1, audio)
+    assert packUSRP(seq, 0, USRP_TYPE_VOICE, b'') == baselineVoice(seq, 0, b'')
+
+@pytest.mark.parametrize("packetType", [USRP_TYPE_DTMF, USRP_TYPE_TEXT, USRP_TYPE_PING, USRP_TYPE_TLV])
+def test_commands_put_the_type_in_the_top_byte(packetType):
+    cmd = b'REG:' + bytes(10)
+    packet = packUSRP(0x0102, 0, packetType, cmd)
+    assert packet == baselineCommand(0x0102, packetType, cmd)
+    assert packet[20:24] == bytes([packetType, 0, 0, 0])
+
+def test_packer_reuses_its_buffer():
+    packer = USRPPacker()
+    first = packer.pack(7, 0, USRP_TYPE_PING, b'PING')
+    assert bytes(first) == baselineCommand(7, USRP_TYPE_PING, b'PING')
+    second = packer.pack(8, 1, USRP_TYPE_VOICE, bytes(320), talkgroup=310)
+    assert bytes(second) == packUSRP(8, 1, USRP_TYPE_VOICE, bytes(320), 310)
+    assert len(second) == USRP_HEADER_SIZE + 320 and USRP_HEADER_SIZE == 32
+    assert bytes(first[4:8]) == struct.pack('>i', 8)     # a view of the shared buffer
+
+@pytest.mark.parametrize("packetType", [USRP_TYPE_VOICE, USRP_TYPE_TEXT, USRP_TYPE_PING, USRP_TYPE_TLV,
+                                        USRP_TYPE_VOICE_ADPCM, USRP_TYPE_VOICE_ULAW])
+def test_unpack_matches_baseline(packetType):
+    header = b'USRP' + struct.pack('>iiii', 0xfffe, 3, 1, 3100) + struct.pack('<i', packetType) + struct.pack('>ii', 9, 0)
+    packet = bytearray(header + bytes(160))
+    assert unpackUSRP(packet) == baselineUnpack(bytes(packet))
+    assert unpackUSRP(memoryview(packet)) == (USRP, 0xfffe, 3, 1, 3100, packetType, 9, 0)
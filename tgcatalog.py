@@ -0,0 +1,108 @@
+###################################################################################
+# pyUC ("puck") talkgroup catalog import
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# Talkgroup lists published by the networks, added after the hand written entries
+# of a mode with a [CATALOGS] section in pyUC.ini:
+#
+#   [CATALOGS]
+#   DMR = /home/pi/bm_talkgroups.json
+#
+# JSON may be an {"id": "name"} object (the Brandmeister talkgroup list) or a list
+# of objects with id/tg/talkgroup and name fields; CSV has a header with the same
+# names, or is "name,tg" like the ini.  A parsed file is kept next to it (or under
+# ~/.cache/pyUC) as <file>.tgc so later starts only unpickle a list.
+###################################################################################
+
+from pathlib import Path
+import pickle
+import json
+import csv
+import io
+import logging
+import sys
+import os
+
+CATALOG_CACHE_VERSION = 1
+VALUE_COLUMNS = ('id', 'tg', 'talkgroup', 'value', 'dial')
+NAME_COLUMNS = ('name', 'title', 'description')
+
+###################################################################################
+# [(name, value)] from a catalog file, in file order
+###################################################################################
+def readCatalog(path):
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        text = f.read()
+    if text.lstrip()[:1] in ('{', '['):
+        obj = json.loads(text)
+        if isinstance(obj, dict) and all(isinstance(v, str) for v in obj.values()):
+            return [(name.strip(), str(value).strip()) for value, name in obj.items()]
+        if isinstance(obj, dict):
+            obj = obj.get('talkgroups', obj.get('results', []))
+        return namedRows({k.lower(): v for k, v in row.items()} for row in obj)
+    reader = csv.reader(io.StringIO(text))
+    first = next(reader, None)
+    if first == None:
+        return []
+    header = [h.strip().lower() for h in first]
+    if any(h in VALUE_COLUMNS for h in header):
+        return namedRows(dict(zip(header, row)) for row in reader)
+    rows = [first] + list(reader)
+    if first[0].strip().isdigit():     # tg,name
+        return [(row[1].strip(), row[0].strip()) for row in rows if len(row) > 1]
+    return [(row[0].strip(), row[1].strip()) for row in rows if len(row) > 1]
+
+def namedRows(rows):
+    result = []
+    for row in rows:
+        value = next((row[k] for k in VALUE_COLUMNS if k in row), None)
+        name = next((row[k] for k in NAME_COLUMNS if k in row and row[k]), None)
+        if value == None or str(value).strip() == "":
+            continue
+        value = str(value).strip()
+        result.append(((str(name).strip() if name != None else value), value))
+    return result
+
+###################################################################################
+# readCatalog() through the compiled cache, [] (and a warning) if it can not be read
+###################################################################################
+def loadCatalog(path):
+    cachePath = path + '.tgc'
+    if os.access(os.path.dirname(os.path.abspath(path)), os.W_OK) == False:
+        cachePath = str(Path.home() / '.cache' / 'pyUC' / (Path(path).name + '.tgc'))
+    try:
+        mtime = Path(path).stat().st_mtime
+        try:
+            with open(cachePath, 'rb') as f:
+                version, cachedTime, items = pickle.load(f)
+            if version == CATALOG_CACHE_VERSION and cachedTime == mtime:
+                return items
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            pass
+        items = readCatalog(path)
+        try:
+            Path(cachePath).parent.mkdir(parents=True, exist_ok=True)
+            with open(cachePath + '.tmp', 'wb') as f:
+                pickle.dump((CATALOG_CACHE_VERSION, mtime, items), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(cachePath + '.tmp', cachePath)
+        except OSError:
+            logging.warning("Can not cache talkgroup catalog {}: {}".format(cachePath, sys.exc_info()[1]))
+        logging.info("Imported {} talkgroups from {}".format(len(items), path))
+        return items
+    except:
+        logging.warning("Can not import talkgroup catalog {}: {}".format(path, sys.exc_info()[1]))
+        return []
@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+###################################################################################
+# pyUC ("puck") file transmit
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# Transmit a recording (station ID, net preamble) to AB instead of the mic.  Frames
+# go out every 20ms by the monotonic clock: each send time is worked out from the
+# start, not from the last send, so sleep() running late never adds up.
+#
+#   [MACROS]
+#   Station ID = play:/home/pi/id.wav
+#
+#   python3 txplay.py [pyUC.ini] id.wav [--tg 310]      register, play, unregister
+#
+# Files are WAV (8 or 16 bit PCM or u-law, any rate, mono or stereo) or raw 8K 16 bit
+# mono PCM (.pcm or .raw).
+###################################################################################
+
+from time import monotonic, sleep
+from pathlib import Path
+import threading
+import argparse
+import logging
+import struct
+import sys
+import os
+import numpy as np
+from resample import makeResampler
+
+PLAY_MACRO = "play:"                # macro (or talkgroup) values that start with this play a file
+FRAME_TIME = 0.020                  # Each USRP voice frame is 20ms
+FRAME_BYTES = 320                   # 160 samples of 16 bit 8K PCM
+MAX_LATE_FRAMES = 3                 # further behind than this and the schedule starts over
+
+###################################################################################
+# 8K 16 bit mono PCM from a WAV or raw file
+###################################################################################
+def readWav(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[0:4] != b'RIFF' or data[8:12] != b'WAVE':
+        raise ValueError("not a WAV file")
+    fmt = None
+    samples = None
+    i = 12
+    while i + 8 <= len(data):
+        chunk, size = data[i:i+4], struct.unpack_from('<I', data, i + 4)[0]
+        body = data[i+8:i+8+size]
+        if chunk == b'fmt ':
+            fmt = struct.unpack_from('<HHIIHH', body)
+        elif chunk == b'data':
+            samples = body
+        i += 8 + size + (size & 1)
+    if fmt == None or samples == None:
+        raise ValueError("WAV file has no fmt or data")
+    tag, channels, rate, _, _, bits = fmt
+    if tag == 7 and bits == 8:          # u-law, as recorder.py writes
+        from codec import ULAW_DECODE
+        x = ULAW_DECODE[np.frombuffer(samples, dtype=np.uint8)]
+    elif tag == 1 and bits == 16:
+        x = np.frombuffer(samples[:len(samples) & ~1], dtype='<i2')
+    elif tag == 1 and bits == 8:        # unsigned
+        x = (np.frombuffer(samples, dtype=np.uint8).astype(np.int16) - 128) << 8
+    else:
+        raise ValueError("unsupported WAV format {} with {} bits".format(tag, bits))
+    if channels > 1:
+        x = x[:len(x) - len(x) % channels].reshape(-1, channels).mean(axis=1)
+    pcm = np.asarray(x, dtype='<i2').tobytes()
+    return makeResampler(rate, 8000, "high").process(pcm) if rate != 8000 else pcm
+
+def readAudioFile(path):
+    if os.path.splitext(path)[1].lower() in ('.pcm', '.raw'):
+        with open(path, 'rb') as f:
+            return f.read()
+    return readWav(path)
+
+###################################################################################
+# Something to transmit, read() gives the next 20ms frame and None at the end
+###################################################################################
+class TxSource:
+
+    name = ""
+
+    def read(self):
+        return None
+
+class FileSource(TxSource):
+
+    def __init__(self, path):
+        self.name = Path(path).name
+        self.pcm = readAudioFile(path)      # announcements are short, convert the whole file up front
+        self.pos = 0
+
+    def read(self):
+        if self.pos >= len(self.pcm):
+            return None
+        frame = self.pcm[self.pos:self.pos + FRAME_BYTES]
+        self.pos += FRAME_BYTES
+        return frame + bytes(FRAME_BYTES - len(frame))  # pad the last one
+
+    def __len__(self):
+        return (len(self.pcm) + FRAME_BYTES - 1) // FRAME_BYTES
+
+###################################################################################
+# Sends a TxSource to one client on its own thread.  While it plays client.txSource
+# is set and the mic thread stays quiet.
+###################################################################################
+class TxPlayer:
+
+    def __init__(self, client):
+        self.client = client
+        self.thread = None
+        self.stopping = False
+        self.late = 0                   # frames sent late in the last play
+        self.maxLate = 0.0              # worst lateness in the last play, seconds
+
+    @property
+    def busy(self):
+        return self.thread != None and self.thread.is_alive()
+
+    ###################################################################################
+    # Start playing, False if something else is transmitting or already playing.  The
+    # channel is waited for (up to waitClear seconds) if a station is being received.
+    ###################################################################################
+    def play(self, source, waitClear=10.0):
+        if self.busy or self.client.ptt or self.client.txSource != None:
+            logging.warning("Can not play {}, already transmitting".format(source.name))
+            return False
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, args=(source, waitClear), daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self.stopping = True
+
+    def wait(self, timeout=None):
+        if self.thread != None:
+            self.thread.join(timeout)
+
+    def run(self, source, waitClear):
+        client = self.client
+        deadline = monotonic() + waitClear
+        while client.transmitEnable == False and client.done == False:   # let the other station finish
+            if monotonic() > deadline or self.stopping:
+                logging.warning("Play {} abandoned, channel busy".format(source.name))
+                return
+            sleep(0.1)
+        client.txSource = source
+        client.emit(("play", source.name, True))
+        logging.info("Play {} on {}".format(source.name, client.name))
+        frames = 0
+        self.late = 0
+        self.maxLate = 0.0
+        try:
+            start = monotonic()
+            frame = source.read()
+            while frame != None and self.stopping == False and client.done == False:
+                due = start + frames * FRAME_TIME
+                now = monotonic()
+                if now < due:
+                    sleep(due - now)
+                else:
+                    lateness = now - due
+                    if lateness > 0.001:
+                        self.late += 1
+                        self.maxLate = max(self.maxLate, lateness)
+                    if lateness > MAX_LATE_FRAMES * FRAME_TIME:    # stalled, do not burst to catch up
+                        start = now - frames * FRAME_TIME
+                client.sendVoice(frame, True)
+                frames += 1
+                frame = source.read()
+            client.sendVoice(bytes(FRAME_BYTES), False)    # unkey
+        except:
+            logging.warning("Play thread:" + str(sys.exc_info()[1]))
+        finally:
+            client.txSource = None
+            client.emit(("play", source.name, False))
+        logging.info("Played {}: {} frames in {:.2f}s, {} late (worst {:.1f}ms)".format(source.name, frames,
+                     monotonic() - start, self.late, self.maxLate * 1000))
+
+###################################################################################
+# Register with AB, play the files and leave
+###################################################################################
+def main(argv):
+    from usrp import USRPClient, loadConfig
+    parser = argparse.ArgumentParser(prog='txplay.py', description='Transmit WAV or PCM files through AB')
+    parser.add_argument('config', nargs='?', default=str(Path(argv[0]).parent) + "/pyUC.ini", help='path to pyUC.ini')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--tg', help='talkgroup to select before playing')
+    args = parser.parse_args(argv[1:])
+    if args.config.lower().endswith(('.wav', '.pcm', '.raw')):     # no ini given, the first file took its place
+        args.files.insert(0, args.config)
+        args.config = str(Path(argv[0]).parent) + "/pyUC.ini"
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    sources = [FileSource(path) for path in args.files]
+    client = USRPClient(loadConfig(args.config))
+    client.openStream()
+    client.startLoop()
+    try:
+        if client.submit(client.register()).result() == False:
+            logging.error("AB did not answer")
+            return 1
+        if args.tg != None:
+            client.setRemoteTG(args.tg)
+            sleep(0.5)
+        player = TxPlayer(client)
+        for source in sources:
+            if player.play(source):
+                player.wait()
+            sleep(0.5)                  # let AB unkey before the next one
+    finally:
+        client.stop()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,194 @@
+###################################################################################
+# pyUC ("puck") batched UDP receive
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# Reads every datagram waiting on a socket each time the event loop says it is
+# readable, into buffers allocated once.  On Linux a whole burst comes in with one
+# recvmmsg() call, elsewhere recvfrom_into() is called until the socket is empty.
+# The handler gets a memoryview of the datagram that is only valid until it returns.
+###################################################################################
+
+from time import monotonic
+import ctypes
+import ctypes.util
+import socket
+import errno
+import logging
+import sys
+import os
+
+BUFFER_SIZE = 2048                  # larger than any USRP packet
+MSG_DONTWAIT = 0x40
+
+###################################################################################
+# recvmmsg(2) through ctypes, None where libc does not have it
+###################################################################################
+class iovec(ctypes.Structure):
+    _fields_ = [('iov_base', ctypes.c_void_p), ('iov_len', ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [('msg_name', ctypes.c_void_p), ('msg_namelen', ctypes.c_uint32),
+                ('msg_iov', ctypes.POINTER(iovec)), ('msg_iovlen', ctypes.c_size_t),
+                ('msg_control', ctypes.c_void_p), ('msg_controllen', ctypes.c_size_t),
+                ('msg_flags', ctypes.c_int)]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [('msg_hdr', msghdr), ('msg_len', ctypes.c_uint)]
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [('sin_family', ctypes.c_ushort), ('sin_port', ctypes.c_uint16),
+                ('sin_addr', ctypes.c_uint8 * 4), ('sin_zero', ctypes.c_uint8 * 8)]
+
+recvmmsg = None
+
+def loadRecvmmsg():
+    global recvmmsg
+    if recvmmsg == None and sys.platform.startswith('linux'):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            recvmmsg = libc.recvmmsg
+            recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+            recvmmsg.restype = ctypes.c_int
+        except (OSError, AttributeError):
+            recvmmsg = False
+    return recvmmsg or None
+
+###################################################################################
+# batch preallocated slots, each a buffer, its iovec and a sockaddr for the sender
+###################################################################################
+class MMsgBatch:
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.buffers = (ctypes.c_char * (BUFFER_SIZE * batch))()
+        self.view = memoryview(self.buffers).cast('B')
+        self.iov = (iovec * batch)()
+        self.names = (sockaddr_in * batch)()
+        self.msgs = (mmsghdr * batch)()
+        self.used = batch               # slots the last call filled
+        # The lengths and sender addresses are read through plain memoryviews, a
+        # ctypes attribute access per packet costs more than the system call saves
+        self.lengths = memoryview(self.msgs).cast('B').cast('I')
+        self.lengthStride = ctypes.sizeof(mmsghdr) // 4
+        self.lengthOffset = mmsghdr.msg_len.offset // 4
+        self.rawNames = memoryview(self.names).cast('B')
+        self.addresses = {}             # raw port and address -> (ip, port)
+        base = ctypes.addressof(self.buffers)
+        for i in range(batch):
+            self.iov[i].iov_base = base + i * BUFFER_SIZE
+            self.iov[i].iov_len = BUFFER_SIZE
+            hdr = self.msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(self.names[i])
+            hdr.msg_iov = ctypes.pointer(self.iov[i])
+            hdr.msg_iovlen = 1
+
+    # Number of datagrams read, 0 when none are waiting
+    def recv(self, fd):
+        for i in range(self.used):      # the kernel shortens these, give the room back
+            self.msgs[i].msg_hdr.msg_namelen = ctypes.sizeof(sockaddr_in)
+        n = recvmmsg(fd, self.msgs, self.batch, MSG_DONTWAIT, None)
+        self.used = max(n, 0)
+        if n < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return 0
+            raise OSError(err, os.strerror(err))
+        return n
+
+    def datagram(self, i):
+        raw = self.rawNames[i * 16 + 2:i * 16 + 8].tobytes()
+        addr = self.addresses.get(raw)
+        if addr == None:
+            addr = (socket.inet_ntoa(raw[2:]), int.from_bytes(raw[:2], 'big'))
+            if len(self.addresses) < 256:   # a handful of ABs, but do not grow on a scan
+                self.addresses[raw] = addr
+        start = i * BUFFER_SIZE
+        return self.view[start:start + self.lengths[i * self.lengthStride + self.lengthOffset]], addr
+
+###################################################################################
+# Drains a non-blocking socket into handler(datagram, addr) each time readReady() is
+# called by the loop.  Counts packets and receive system calls so the cost per packet
+# can be watched as more streams fan in.
+###################################################################################
+class UDPReceiver:
+
+    def __init__(self, sock, handler, batch=32, useRecvmmsg=True):
+        self.sock = sock
+        self.fd = sock.fileno()
+        self.handler = handler
+        self.batch = batch
+        self.mmsg = MMsgBatch(batch) if useRecvmmsg and loadRecvmmsg() != None else None
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.view = memoryview(self.buffer)
+        self.packets = 0
+        self.syscalls = 0
+        self.bytes = 0
+        self.markTime = monotonic()
+        self.markPackets = 0
+        self.markSyscalls = 0
+
+    def readReady(self):
+        try:
+            if self.mmsg != None:
+                self.drainBatched()
+            else:
+                self.drain()
+        except OSError as e:     # an ICMP error from an earlier send, the next read will work
+            logging.warning("RX:" + str(e))
+
+    def drainBatched(self, maxBatches=8):
+        mmsg = self.mmsg
+        for _ in range(maxBatches):     # let the loop breathe during a flood
+            n = mmsg.recv(self.fd)
+            self.syscalls += 1
+            for i in range(n):
+                datagram, addr = mmsg.datagram(i)
+                self.packets += 1
+                self.bytes += len(datagram)
+                self.dispatch(datagram, addr)
+            if n < self.batch:      # the socket is empty
+                return
+
+    def drain(self):
+        for _ in range(self.batch):     # let the loop breathe between bursts
+            self.syscalls += 1
+            try:
+                nbytes, addr = self.sock.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                return
+            self.packets += 1
+            self.bytes += nbytes
+            self.dispatch(self.view[:nbytes], addr)
+
+    def dispatch(self, datagram, addr):
+        try:
+            self.handler(datagram, addr)
+        except:
+            logging.warning("RX:" + str(sys.exc_info()[1]))
+
+    ###################################################################################
+    # Packets a second and receive calls per packet since the last call
+    ###################################################################################
+    def rates(self, now=None):
+        now = monotonic() if now == None else now
+        packets = self.packets - self.markPackets
+        syscalls = self.syscalls - self.markSyscalls
+        elapsed = now - self.markTime
+        self.markTime, self.markPackets, self.markSyscalls = now, self.packets, self.syscalls
+        return {'pps': round(packets / elapsed, 1) if elapsed > 0 else 0.0,
+                'syscalls_per_packet': round(syscalls / packets, 2) if packets > 0 else 0.0,
+                'batched': self.mmsg != None}
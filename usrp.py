@@ -0,0 +1,1272 @@
+#!/usr/bin/python3
+###################################################################################
+# pyUC ("puck") headless USRP core
+# Copyright (C) 2014, 2015, 2016, 2019, 2020 N4IRR
+#
+# This software is for use on amateur radio networks only, it is to be used
+# for educational purposes only. Its use on commercial networks is strictly
+# prohibited.  Permission to use, copy, modify, and/or distribute this software
+# hereby granted, provided that the above copyright notice and this permission
+# notice appear in all copies.
+#
+# THE SOFTWARE IS PROVIDED "AS IS" AND DVSWITCH DISCLAIMS ALL WARRANTIES WITH
+# REGARD TO THIS SOFTWARE INCLUDING ALL IMPLIED WARRANTIES OF MERCHANTABILITY
+# AND FITNESS.  IN NO EVENT SHALL N4IRR BE LIABLE FOR ANY SPECIAL, DIRECT,
+# INDIRECT, OR CONSEQUENTIAL DAMAGES OR ANY DAMAGES WHATSOEVER RESULTING FROM
+# LOSS OF USE, DATA OR PROFITS, WHETHER IN AN ACTION OF CONTRACT, NEGLIGENCE
+# OR OTHER TORTIOUS ACTION, ARISING OUT OF OR IN CONNECTION WITH THE USE OR
+# PERFORMANCE OF THIS SOFTWARE.
+###################################################################################
+# This module holds everything needed to talk to Analog_Bridge (AB) without a UI:
+# the USRP packet format, the registration/session state machine and the receive
+# loop.  The Tk front end (pyUC.py) and the headless gateway both drive a
+# USRPClient and subscribe to the events it emits.
+#
+# The network side runs on an asyncio event loop: a DatagramProtocol feeds
+# handlePacket, the NAT ping and AB's re-registration request are loop timers,
+# and stop() cancels them and closes the transport.  Scripts can drive the client
+# with `await client.run()` or `await client.register()`; the Tk front end runs
+# the loop on a thread of its own with startLoop().
+###################################################################################
+
+from time import time, monotonic
+from pathlib import Path
+import asyncio
+import socket
+import struct
+import threading
+import configparser
+import argparse
+import copy
+import json
+import logging
+import sys
+import os
+import signal
+from tgcatalog import loadCatalog
+from udprx import UDPReceiver
+
+###################################################################################
+# USRP packet types
+###################################################################################
+USRP_TYPE_VOICE = 0
+USRP_TYPE_DTMF = 1
+USRP_TYPE_TEXT = 2
+USRP_TYPE_PING = 3
+USRP_TYPE_TLV = 4
+USRP_TYPE_VOICE_ADPCM = 5
+USRP_TYPE_VOICE_ULAW = 6
+
+VOICE_TYPES = {USRP_TYPE_VOICE: "pcm", USRP_TYPE_VOICE_ULAW: "ulaw", USRP_TYPE_VOICE_ADPCM: "adpcm"}
+
+###################################################################################
+# TLV tags
+###################################################################################
+TLV_TAG_BEGIN_TX    = 0
+TLV_TAG_AMBE        = 1
+TLV_TAG_END_TX      = 2
+TLV_TAG_TG_TUNE     = 3
+TLV_TAG_PLAY_AMBE   = 4
+TLV_TAG_REMOTE_CMD  = 5
+TLV_TAG_AMBE_49     = 6
+TLV_TAG_AMBE_72     = 7
+TLV_TAG_SET_INFO    = 8
+TLV_TAG_IMBE        = 9
+TLV_TAG_DSAMBE      = 10
+TLV_TAG_FILE_XFER   = 11
+
+###################################################################################
+# File transfer sub commands (TLV_TAG_FILE_XFER)
+###################################################################################
+FILE_SUBCOMMAND_NAME = 0
+FILE_SUBCOMMAND_PAYLOAD = 1
+FILE_SUBCOMMAND_WRITE = 2
+FILE_SUBCOMMAND_READ = 3
+FILE_SUBCOMMAND_ERROR = 4
+
+###################################################################################
+# Strings
+###################################################################################
+STRING_WINDOWS_PORT_REUSE = "On Windows, ignore the port reuse"
+STRING_SOCKET_FAILURE = "Socket failure"
+STRING_PRIVATE = "Private"
+STRING_GROUP = "Group"
+STRING_CONFIG_NOT_EDITED = 'Please edit the configuration file and set it up correctly. Exiting...'
+STRING_CONFIG_FILE_ERROR = "Config (ini) file error: "
+STRING_EXITING = "Exiting pyUC..."
+
+USRP = bytes("USRP", 'ASCII')
+REG = bytes("REG:", 'ASCII')
+UNREG = bytes("UNREG", 'ASCII')
+OK = bytes("OK", 'ASCII')
+INFO = bytes("INFO:", 'ASCII')
+EXITING = bytes("EXITING", 'ASCII')
+
+noQuote = {ord('"'): ''}
+
+###################################################################################
+# Startup timing.  Phases are marked in seconds since this module was imported
+# (the first thing pyUC does); with --profile the main thread also runs under
+# cProfile until the first registration.
+###################################################################################
+PROCESS_START = monotonic()
+startupMarks = []               # (phase, seconds)
+startupProfiler = None
+startupReported = False
+
+def startupMark(phase):
+    elapsed = monotonic() - PROCESS_START
+    startupMarks.append((phase, elapsed))
+    return elapsed
+
+def startProfile():
+    global startupProfiler
+    import cProfile
+    startupProfiler = cProfile.Profile()
+    startupProfiler.enable()
+
+# Log the phases, and stop and save the profile.  Call on the thread that started it.
+def startupReport(path='pyUC-startup.prof', top=25):
+    global startupProfiler, startupReported
+    if startupReported == True:
+        return
+    startupReported = True
+    logging.info("Startup: " + ", ".join("{} {:.3f}s".format(phase, t) for phase, t in startupMarks))
+    if startupProfiler != None:
+        import pstats
+        import io
+        startupProfiler.disable()
+        startupProfiler.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(startupProfiler, stream=out).sort_stats('cumulative').print_stats(top)
+        logging.info("Startup profile saved to {}\n{}".format(path, out.getvalue()))
+        startupProfiler = None
+
+###################################################################################
+# The (name, value) talkgroups of one mode, in display order, indexed by value so
+# a keyup never scans the list.  Values are dial strings ("9990#" keeps its quotes
+# in the ini), the index holds them with the quotes removed and as written.  The
+# first entry wins when a value is listed twice.  Only append/extend keep the
+# index up to date, which is all pyUC does to these lists.
+###################################################################################
+class TalkGroupList(list):
+
+    def __init__(self, items=()):
+        list.__init__(self)
+        self.byValue = {}       # value without quotes -> index
+        self.byRaw = {}         # value as written -> index
+        self.nameList = None    # names and search keys, built when first asked for
+        self.searchKeys = None
+        self.extend(items)
+
+    def append(self, item):
+        self.byValue.setdefault(item[1].translate(noQuote), len(self))
+        self.byRaw.setdefault(item[1], len(self))
+        list.append(self, item)
+        if self.nameList != None:
+            self.nameList.append(item[0])
+            self.searchKeys.append((item[0] + '\t' + item[1].translate(noQuote)).lower())
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    # Index of a value (without quotes, str or int), -1 if not in the list
+    def indexOf(self, value):
+        return self.byValue.get(str(value), -1)
+
+    # Index of a value exactly as written, -1 if not in the list
+    def indexOfRaw(self, value):
+        return self.byRaw.get(value, -1)
+
+    # Friendly name of a value (without quotes), default if not in the list
+    def nameOf(self, value, default=None):
+        i = self.byValue.get(str(value), -1)
+        return default if i == -1 else self[i][0]
+
+    # Every name in order (for filling a listbox in one call)
+    def names(self):
+        if self.nameList == None:
+            self.nameList = [item[0] for item in self]
+            self.searchKeys = [(item[0] + '\t' + item[1].translate(noQuote)).lower() for item in self]
+        return self.nameList
+
+    # Indexes of the entries whose name or value contains text (any case).  Pass the
+    # previous result as within when text only grew, to search just those.
+    def search(self, text, within=None):
+        self.names()
+        text = text.lower()
+        keys = self.searchKeys
+        candidates = range(len(keys)) if within == None else within
+        return [i for i in candidates if text in keys[i]]
+
+###################################################################################
+# The 32 byte USRP header: eye, seq, memory, keyup, talkgroup, type, mpxid, reserved.
+# The packet type lives in the first byte of its field, which is what AB expects
+# (it reads that field as a little endian int).
+###################################################################################
+USRP_HEADER = struct.Struct('>4siiiiB3xii')
+USRP_HEADER_SIZE = USRP_HEADER.size
+USRP_MAX_PAYLOAD = 1024
+
+###################################################################################
+# Decode a header in place (bytes, bytearray or memoryview, no slicing)
+###################################################################################
+def unpackUSRP(buf):
+    return USRP_HEADER.unpack_from(buf)
+
+###################################################################################
+# Build a USRP packet as a new bytes object
+###################################################################################
+def packUSRP(seq, keyup, packetType, payload, talkgroup=0):
+    return USRP_HEADER.pack(USRP, seq, 0, keyup, talkgroup, packetType, 0, 0) + payload
+
+###################################################################################
+# Builds outgoing packets in one preallocated buffer.  The view returned by pack()
+# is only valid until the next call, so send it before packing again.
+###################################################################################
+class USRPPacker:
+
+    def __init__(self, maxPayload=USRP_MAX_PAYLOAD):
+        self.buf = bytearray(USRP_HEADER_SIZE + maxPayload)
+        self.view = memoryview(self.buf)
+
+    def pack(self, seq, keyup, packetType, payload, talkgroup=0):
+        end = USRP_HEADER_SIZE + len(payload)
+        USRP_HEADER.pack_into(self.buf, 0, USRP, seq, 0, keyup, talkgroup, packetType, 0, 0)
+        self.view[USRP_HEADER_SIZE:end] = payload
+        return self.view[:end]
+
+###################################################################################
+# Signed distance between two USRP sequence numbers.  We wrap ours at 16 bits like
+# pyUC always has, and the low 16 bits of a 32 bit counter wrap the same way, so
+# comparing at 16 bits works for either kind of sender.
+###################################################################################
+USRP_SEQ_MASK = 0xffff
+
+def seqDiff(a, b):
+    return ((a - b + 0x8000) & USRP_SEQ_MASK) - 0x8000
+
+###################################################################################
+# Per transmission receive statistics, computed from the voice packet sequence
+# numbers and arrival times (interarrival jitter as in RFC 3550 section 6.4.1).
+###################################################################################
+class RxStats:
+
+    FRAME_TIME = 0.020
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.baseSeq = None
+        self.highestSeq = None
+        self.received = 0
+        self.duplicates = 0
+        self.outOfOrder = 0
+        self.jitter = 0.0               # seconds
+        self.maxGap = 0.0               # longest time between two packets (seconds)
+        self.lastArrival = None
+        self.lastSeq = 0
+        self.seen = set()
+        self.skipped = set()            # sequence numbers the sender spent on pings
+
+    def update(self, seq, now=None):
+        seq &= USRP_SEQ_MASK
+        if now == None:
+            now = monotonic()
+        if self.lastArrival != None:
+            gap = now - self.lastArrival
+            if gap > self.maxGap:
+                self.maxGap = gap
+            d = gap - seqDiff(seq, self.lastSeq) * self.FRAME_TIME
+            self.jitter += (abs(d) - self.jitter) / 16
+        self.lastArrival = now
+        self.lastSeq = seq
+
+        if seq in self.seen:
+            self.duplicates += 1
+            return
+        self.seen.add(seq)
+        self.received += 1
+        if self.baseSeq == None:
+            self.baseSeq = self.highestSeq = seq
+        elif seqDiff(seq, self.highestSeq) > 0:
+            self.highestSeq = seq
+        else:
+            self.outOfOrder += 1
+            if seqDiff(seq, self.baseSeq) < 0:
+                self.baseSeq = seq
+
+    # A ping from the sender took a sequence number, it is not a lost voice frame
+    def skip(self, seq):
+        seq &= USRP_SEQ_MASK
+        if seq not in self.seen:
+            self.skipped.add(seq)
+
+    def expected(self):
+        if self.baseSeq == None:
+            return 0
+        skipped = sum(1 for s in self.skipped if seqDiff(s, self.baseSeq) > 0 and seqDiff(s, self.highestSeq) < 0)
+        return seqDiff(self.highestSeq, self.baseSeq) + 1 - skipped
+
+    def lost(self):
+        return max(0, self.expected() - self.received)
+
+    def lossPercent(self):
+        expected = self.expected()
+        return (100.0 * self.lost() / expected) if expected else 0.0
+
+    def lossString(self):
+        return '{:.2f}%'.format(self.lossPercent())
+
+    def asDict(self):
+        return {'expected': self.expected(), 'received': self.received, 'lost': self.lost(),
+                'loss': round(self.lossPercent(), 2), 'duplicates': self.duplicates,
+                'out_of_order': self.outOfOrder, 'jitter_ms': round(self.jitter * 1000, 1),
+                'max_gap_ms': round(self.maxGap * 1000, 1)}
+
+    def __str__(self):
+        return 'lost {} dup {} ooo {} jitter {:.1f}ms max gap {:.0f}ms'.format(self.lost(),
+                self.duplicates, self.outOfOrder, self.jitter * 1000, self.maxGap * 1000)
+
+###################################################################################
+# Read an int value from the ini file.  If an error or value is Default, return the
+# valDefault passed in.
+###################################################################################
+def readValue( config, stanza, valName, valDefault, func ):
+    try:
+        val = config.get(stanza, valName).split(None)[0]
+        if val.lower() == "default":  # This is a special case for the in and out index settings
+            return valDefault
+        return func(val)
+    except:
+        return valDefault
+
+###################################################################################
+# The values from pyUC.ini.  The UI wraps these in Tk variables, the headless
+# gateway uses them as is.
+###################################################################################
+class UCConfig:
+
+    def __init__(self):
+        self.myCall = "N0CALL"
+        self.subscriberID = 3112000
+        self.repeaterID = 311200
+        self.ipAddress = "1.2.3.4"
+        self.usrpTxPort = [12345]
+        self.usrpRxPort = 12345
+        self.defaultServer = "DMR"
+        self.slot = 2
+        self.loopback = 1
+        self.dongleMode = 1
+        self.micVol = 50
+        self.spVol = 50
+        self.voxEnable = 0
+        self.voxThreshold = 200
+        self.voxDelay = 50
+        self.aslMode = 0
+        self.useQRZ = True
+        self.qrzCacheFile = str(Path.home() / '.cache' / 'pyUC' / 'qrz.db')
+        self.qrzCacheSize = 1000
+        self.qrzNegativeTTL = 86400
+        self.levelEverySample = 2
+        self.levelFps = 15
+        self.levelPeakHold = 1.0
+        self.pingTimer = 0
+        self.statsFile = None
+        self.dmrIdFile = None
+        self.lastHeardSize = 1000
+        self.journalFile = str(Path.home() / '.local' / 'share' / 'pyUC' / 'journal.db')
+        self.fileDir = str(Path.home() / '.local' / 'share' / 'pyUC' / 'files')    # where files from AB are saved
+        self.recordDir = None           # save every received transmission here (off when None)
+        self.recordFormat = "wav"       # wav (16 bit) or ulaw
+        self.resampleQuality = "medium"
+        self.audioRate = 0              # sound card rate (8000, 16000, 48000), 0 picks the cheapest it has
+        self.jitterMinDepth = 2
+        self.jitterMaxDepth = 10
+        self.priorityTGs = []           # talkgroups that duck every other stream in the mix
+        self.duckGain = 0.25
+        self.recvmmsg = True            # read bursts with one recvmmsg() call where the OS has it
+        self.voiceCodec = "pcm"         # voice payload we send once AB shows it uses it too (pcm, ulaw, adpcm)
+        self.inIndex = None
+        self.outIndex = None
+        self.backgroundColor = 'gray25'
+        self.textColor = 'white'
+        self.talkGroups = {}
+        self.macros = {}
+        self.sessions = {}              # mode -> (ipAddress, [usrpTxPort], usrpRxPort) of more ABs to serve
+
+    ###################################################################################
+    # It is required that the user edit the ini file and fill in at least three values.
+    # The callsign, DMR Id and the USRP server address must be set to something other
+    # than the default values to be valid.
+    ###################################################################################
+    def isValid(self):
+        valid = (self.myCall != "N0CALL")            # Make sure they set a ham radio callsign
+        valid &= (self.subscriberID != 3112000)      # Make sure they set a DMR/CCS7 ID
+        valid &= (self.ipAddress != "1.2.3.4")       # Make sure they have a valid address for AB
+        return valid
+
+###################################################################################
+# Load the ini file.  Missing required values raise, just like configparser does.
+###################################################################################
+def readConfig( config_file_name ):
+    config = configparser.ConfigParser(inline_comment_prefixes=(';',))
+    config.optionxform = lambda option: option
+    config.read(config_file_name)
+
+    cfg = UCConfig()
+    cfg.myCall = config.get('DEFAULTS', "myCall").split(None)[0]
+    cfg.loopback = int(config.get('DEFAULTS', "loopback").split(None)[0])
+    cfg.dongleMode = int(config.get('DEFAULTS', "dongleMode").split(None)[0])
+    cfg.voxEnable = int(config.get('DEFAULTS', "voxEnable").split(None)[0])
+    cfg.micVol = int(config.get('DEFAULTS', "micVol").split(None)[0])
+    cfg.spVol = int(config.get('DEFAULTS', "spVol").split(None)[0])
+    cfg.repeaterID = int(config.get('DEFAULTS', "repeaterID").split(None)[0])
+    cfg.subscriberID = int(config.get('DEFAULTS', "subscriberID").split(None)[0])
+    cfg.voxThreshold = int(config.get('DEFAULTS', "voxThreshold").split(None)[0])
+    cfg.voxDelay = int(config.get('DEFAULTS', "voxDelay").split(None)[0])
+    cfg.ipAddress = config.get('DEFAULTS', "ipAddress").split(None)[0]
+    cfg.usrpTxPort = [int(i) for i in config.get('DEFAULTS', "usrpTxPort").split(',')]
+    cfg.usrpRxPort = int(config.get('DEFAULTS', "usrpRxPort").split(None)[0])
+    cfg.slot = int(config.get('DEFAULTS', "slot").split(None)[0])
+    cfg.defaultServer = config.get('DEFAULTS', "defaultServer").split(None)[0]
+    cfg.aslMode = int(config.get('DEFAULTS', "aslMode").split(None)[0])
+    cfg.useQRZ = bool(readValue(config, 'DEFAULTS', 'useQRZ', True, int))
+    cfg.qrzCacheFile = os.path.expanduser(readValue(config, 'DEFAULTS', 'qrzCacheFile', cfg.qrzCacheFile, str))
+    cfg.qrzCacheSize = int(readValue(config, 'DEFAULTS', 'qrzCacheSize', 1000, int))
+    cfg.qrzNegativeTTL = int(readValue(config, 'DEFAULTS', 'qrzNegativeTTL', 86400, int))
+    cfg.levelEverySample = int(readValue(config, 'DEFAULTS', 'levelEverySample', 2, int))
+    cfg.levelFps = int(readValue(config, 'DEFAULTS', 'levelFps', 15, int))
+    cfg.levelPeakHold = float(readValue(config, 'DEFAULTS', 'levelPeakHold', 1.0, float))
+    cfg.pingTimer = int(readValue(config, 'DEFAULTS', 'pingTimer', 0, int))
+    cfg.statsFile = readValue(config, 'DEFAULTS', 'statsFile', None, str)
+    cfg.dmrIdFile = readValue(config, 'DEFAULTS', 'dmrIdFile', None, os.path.expanduser)
+    cfg.lastHeardSize = int(readValue(config, 'DEFAULTS', 'lastHeardSize', 1000, int))
+    cfg.journalFile = readValue(config, 'DEFAULTS', 'journalFile', cfg.journalFile, os.path.expanduser)
+    cfg.fileDir = readValue(config, 'DEFAULTS', 'fileDir', cfg.fileDir, os.path.expanduser)
+    cfg.recordDir = readValue(config, 'DEFAULTS', 'recordDir', None, os.path.expanduser)
+    cfg.recordFormat = readValue(config, 'DEFAULTS', 'recordFormat', 'wav', str).lower()
+    cfg.resampleQuality = readValue(config, 'DEFAULTS', 'resampleQuality', 'medium', str)
+    cfg.audioRate = readValue(config, 'DEFAULTS', 'audioRate', 0, int)
+    cfg.jitterMinDepth = int(readValue(config, 'DEFAULTS', 'jitterMinDepth', 2, int))
+    cfg.jitterMaxDepth = int(readValue(config, 'DEFAULTS', 'jitterMaxDepth', 10, int))
+    cfg.priorityTGs = readValue(config, 'DEFAULTS', 'priorityTG', [], lambda v: [tg.strip() for tg in v.split(',') if tg.strip()])
+    cfg.duckGain = float(readValue(config, 'DEFAULTS', 'duckGain', 0.25, float))
+    cfg.recvmmsg = bool(readValue(config, 'DEFAULTS', 'recvmmsg', 1, int))
+    cfg.voiceCodec = readValue(config, 'DEFAULTS', 'voiceCodec', 'pcm', str).lower()
+
+    cfg.inIndex = readValue(config, 'DEFAULTS', 'in_index', None, int)
+    cfg.outIndex = readValue(config, 'DEFAULTS', 'out_index', None, int)
+
+    cfg.backgroundColor = readValue(config, 'DEFAULTS', 'backgroundColor', 'gray25', str)
+    cfg.textColor = readValue(config, 'DEFAULTS', 'textColor', 'white', str)
+
+    for sect in config.sections():
+        if sect not in ("DEFAULTS", "MACROS", "CATALOGS", "SESSIONS"):
+            cfg.talkGroups[sect] = TalkGroupList(config.items(sect))
+
+    if "CATALOGS" in config.sections():     # network talkgroup lists, after the hand written ones
+        for mode, path in config.items("CATALOGS"):
+            tgs = cfg.talkGroups.setdefault(mode, TalkGroupList())
+            tgs.extend(item for item in loadCatalog(os.path.expanduser(path.strip())) if tgs.indexOf(item[1]) == -1)
+
+    if "MACROS" in config.sections():
+        for x in config.items("MACROS"):
+            cfg.macros[x[1]] = x[0]
+
+    if "SESSIONS" in config.sections():     # mode = ipAddress txPort[,txPort] rxPort
+        for mode, value in config.items("SESSIONS"):
+            fields = value.split()
+            cfg.sessions[mode] = (fields[0], [int(i) for i in fields[1].split(',')], int(fields[2]))
+    return cfg
+
+###################################################################################
+# The config of one of the [SESSIONS], the DEFAULTS with that AB's address and ports
+###################################################################################
+def sessionConfig(config, mode):
+    cfg = copy.copy(config)
+    cfg.ipAddress, cfg.usrpTxPort, cfg.usrpRxPort = config.sessions[mode]
+    cfg.defaultServer = mode
+    cfg.sessions = {}
+    return cfg
+
+###################################################################################
+# A USRP session with one AB.  All network traffic and protocol state lives here.
+# Anything a front end needs to know about is published as an event tuple, the
+# first element names the event (the same convention as the UI ipc_queue):
+#
+#   ("registered",)                         REG:OK received (or ASL mode)
+#   ("unregistered",)                       AB dropped our registration
+#   ("disconnected",)                       AB is going away
+#   ("info", mode, last_tune)               INFO json from AB
+#   ("toast", title, text)                  text message from AB
+#   ("macro", "")                           AB sent a macro menu to pop up
+#   ("begin_tx", call, name, slot, tg, mode, tg_value)  network station keyed up
+#   ("end_tx", call, slot, tg, loss, start_time, duration, stats, tg_value)   stats is the RxStats dict
+#                                           tg is the name from the talkgroup list, tg_value the number
+#   ("private_call", mode, tg)              we tuned to a private call
+#   ("address", ip)                         AB answered from a new address
+#   ("level", value, peak)                  audio level and held peak (0-100ish), at most levelFps a second
+#   ("ptt", state)                          ptt changed by vox
+#   ("play", name, state)                   a TxPlayer started or finished sending a file
+#   ("file_progress", name, received, size, bytes_per_second)   a file from AB (filexfer.py)
+#   ("file_done", name, path, ok, message)
+#   ("socket_failure",)                     a send failed
+#   ("dialog", title, text)                 a non fatal error for the user
+#   ("fatal", text)                         the session can not continue
+###################################################################################
+class USRPClient:
+
+    def __init__(self, config):
+        self.config = config
+        self.name = config.defaultServer    # Sessions are known by the mode of their AB
+        self.ipAddress = config.ipAddress
+        self.usrpTxPort = config.usrpTxPort
+        self.usrpRxPort = config.usrpRxPort
+        self.myCall = config.myCall
+        self.subscriberID = config.subscriberID
+        self.repeaterID = config.repeaterID
+        self.aslMode = config.aslMode
+        self.talkGroups = config.talkGroups
+        for mode, tgs in self.talkGroups.items():   # plain lists from scripts get their index too
+            if isinstance(tgs, TalkGroupList) == False:
+                self.talkGroups[mode] = TalkGroupList(tgs)
+        self.macros = config.macros
+        self.mode = config.defaultServer    # Current AMBE mode (AB will override)
+        self.currentTG = ""                 # Last dial string sent to (or reported by) AB
+        self.idDatabase = None              # offline id -> call/name (numpy is only loaded when there is one)
+        if config.dmrIdFile != None:
+            from dmrid import loadIdDatabase
+            self.idDatabase = loadIdDatabase(config.dmrIdFile)
+        self.timeToRegistered = None        # seconds from process start to the first REG:OK
+        self.voiceCodec = config.voiceCodec
+        if self.voiceCodec not in VOICE_TYPES.values():
+            logging.warning("Unknown voiceCodec {}, using pcm".format(self.voiceCodec))
+            self.voiceCodec = "pcm"
+        self.txType = USRP_TYPE_VOICE       # voice payload we send, voiceCodec once AB has sent us some
+        self.txCodec = None
+        self.txKeyed = False
+        self.rxCodecs = {}                  # (ip, port) -> decoder of the current transmission
+        self.files = None                   # FileReceiver, made when AB first sends a file
+
+        self.udp = None                     # UDP socket for USRP traffic
+        self.usrpSeq = 0                    # Each USRP packet has a unique sequence number
+        self.seqLock = threading.Lock()     # Guards usrpSeq and the packer
+        self.packer = USRPPacker()
+        self.regState = False               # Registration state
+        self.ptt = False                    # Current ptt state
+        self.transmitEnable = True          # Make sure that UC is half duplex
+        self.txSource = None                # TxSource a TxPlayer is sending, the mic is held off meanwhile
+        self.done = False                   # Set once stop() has been called (audio threads watch it)
+
+        self.loop = None                    # asyncio loop the network side runs on
+        self.receiver = None                # UDPReceiver, drains the socket into handlePacket
+        self.stopped = None                 # Future resolved by stop(), run() returns on it
+        self.timers = {}                    # Pending loop timers (ping, rereg) by name
+        self.regWaiters = []                # Futures waiting for the next REG:OK
+
+        self.listeners = []
+        self.voiceSink = None               # Called with ((ip, port, tg), seq, frame) for each 8K PCM voice frame, frame None on unkey
+                                            # and b'' for a sequence number the sender spent on a ping
+
+        # State of the transmission currently being received
+        self.rxCall = ''
+        self.rxName = ''
+        self.rxTG = ''                      # talkgroup as shown (its name when it is in the list)
+        self.rxTGValue = ''                 # and as dialed, the number (or reflector for DSTAR and YSF)
+        self.rxSlot = '0'
+        self.rxLoss = '0.00%'
+        self.rxStartTime = time()
+        self.rxStats = RxStats()
+        self.rxDest = 0                     # Destination of the last SET_INFO, for streams whose header has no talkgroup
+        self.lastKey = -1
+        self.lastSeq = 0
+
+    ###################################################################################
+    # Event plumbing
+    ###################################################################################
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    def emit(self, event):
+        for listener in self.listeners:
+            listener(event)
+
+    ###################################################################################
+    # Open the UDP socket for TX and RX
+    ###################################################################################
+    def openStream(self):
+        self.usrpSeq = 0
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        except:
+            logging.info(STRING_WINDOWS_PORT_REUSE)
+            pass
+        if (self.usrpRxPort in self.usrpTxPort) == False:    # single  port reply does not need a bind
+            self.udp.bind(('', self.usrpRxPort))
+        self.udp.setblocking(False)     # owned by the event loop, sends from other threads never wait
+
+    def sendto(self, usrp):
+        for port in self.usrpTxPort:
+            self.udp.sendto(usrp, (self.ipAddress, port))
+
+    ###################################################################################
+    # Send command to AB
+    ###################################################################################
+    def sendUSRPCommand(self, cmd, packetType):
+        logging.info("sendUSRPCommand: "+ str(cmd))
+        try:
+            # Send "text" packet to AB.
+            with self.seqLock:
+                self.sendto(self.packer.pack(self.usrpSeq, 0, packetType, cmd))
+                self.usrpSeq = (self.usrpSeq + 1) & USRP_SEQ_MASK
+        except:
+            logging.exception(STRING_SOCKET_FAILURE)
+            self.emit(("socket_failure",))
+
+    ###################################################################################
+    # Send one 20ms frame of 8K PCM audio (or an empty unkey) to AB, compressed when
+    # AB has agreed to a codec
+    ###################################################################################
+    def sendVoice(self, audio, keyup):
+        with self.seqLock:
+            packetType = self.txType
+            if packetType != USRP_TYPE_VOICE:
+                try:
+                    if keyup and self.txKeyed == False:
+                        self.txCodec.reset()    # each transmission starts from silence
+                    if len(audio) > 0:
+                        audio = self.txCodec.encode(audio)
+                except:
+                    logging.warning("{} encode failed, sending pcm: {}".format(self.txCodec.name, sys.exc_info()[1]))
+                    self.txType = packetType = USRP_TYPE_VOICE
+            self.txKeyed = keyup
+            self.sendto(self.packer.pack(self.usrpSeq, keyup, packetType, audio))
+            self.usrpSeq = (self.usrpSeq + 1) & USRP_SEQ_MASK
+
+    ###################################################################################
+    # Codec negotiation: we send the voiceCodec we were told to prefer as soon as AB
+    # sends us that type, and go back to pcm when it does (or when we register again)
+    ###################################################################################
+    def voiceTypeSeen(self, packetType):
+        if packetType == self.txType:
+            return
+        name = VOICE_TYPES[packetType]
+        if packetType != USRP_TYPE_VOICE and name != self.voiceCodec:
+            return
+        self.setTxVoiceType(packetType)
+
+    def setTxVoiceType(self, packetType):
+        if packetType == self.txType:
+            return
+        if packetType != USRP_TYPE_VOICE:
+            from codec import makeVoiceCodec
+            self.txCodec = makeVoiceCodec(VOICE_TYPES[packetType])
+        self.txType = packetType
+        logging.info("Sending {} voice to AB".format(VOICE_TYPES[packetType]))
+
+    ###################################################################################
+    # PCM for a compressed voice payload, a decoder per sender for each transmission
+    ###################################################################################
+    def decodeVoice(self, packetType, addr, audio):
+        name = VOICE_TYPES[packetType]
+        decoder = self.rxCodecs.get(addr)
+        if decoder == None or decoder.name != name:
+            from codec import makeVoiceCodec
+            decoder = self.rxCodecs[addr] = makeVoiceCodec(name)
+        try:
+            return decoder.decode(audio)
+        except:
+            logging.warning("{} decode failed: {}".format(name, sys.exc_info()[1]))
+            return b''
+
+
+    ###################################################################################
+    # Send command to AB
+    ###################################################################################
+    def sendRemoteControlCommand(self, cmd):
+        logging.info("sendRemoteControlCommand: "+ str(cmd))
+        # Use TLV to send command (wrapped in a USRP packet).
+        tlv = struct.pack("BB", TLV_TAG_REMOTE_CMD, len(cmd))[0:2] + cmd
+        self.sendUSRPCommand(tlv, USRP_TYPE_TLV)
+
+    def sendRemoteControlCommandASCII(self, cmd):
+        self.sendRemoteControlCommand(bytes(cmd, 'ASCII'))
+
+    ###################################################################################
+    # Send command to DMRGateway
+    ###################################################################################
+    def sendToGateway(self, cmd):
+        logging.info("sendToGateway: " + cmd)
+
+    ###################################################################################
+    # Begin the registration sequence
+    ###################################################################################
+    def registerWithAB(self):
+        self.sendUSRPCommand(bytes("REG:DVSWITCH", 'ASCII'), USRP_TYPE_TEXT)
+
+    ###################################################################################
+    # Unregister from server
+    ###################################################################################
+    def unregisterWithAB(self):
+        self.sendUSRPCommand(bytes("REG:UNREG", 'ASCII'), USRP_TYPE_TEXT)
+
+    ###################################################################################
+    # Request the INFO json from AB
+    ###################################################################################
+    def requestInfo(self):
+        self.sendUSRPCommand(bytes("INFO:", 'ASCII'), USRP_TYPE_TEXT)
+
+    ###################################################################################
+    # Tell AB who we are (DMR ID and call)
+    ###################################################################################
+    def sendMetadata(self):
+        dmr_id = self.subscriberID
+        call = bytes(self.myCall, 'ASCII')+bytes(chr(0), 'ASCII')
+        tlvLen = 3 + 4 + 3 + 1 + 1 + len(self.myCall) + 1                      # dmrID, repeaterID, tg, ts, cc, call, 0
+        cmd = struct.pack("BBBBBBBBBBBBBB", TLV_TAG_SET_INFO, tlvLen, ((dmr_id >> 16) & 0xff),((dmr_id >> 8) & 0xff),(dmr_id & 0xff),0,0,0,0,0,0,0,0,0)[0:14] + call
+        self.sendUSRPCommand(cmd, USRP_TYPE_TEXT)
+
+    ###################################################################################
+    # Set the size (number of bits) of each AMBE sample
+    ###################################################################################
+    def setAMBESize(self, size):
+        self.sendRemoteControlCommandASCII("ambeSize="+size)
+
+    ###################################################################################
+    # Set the AMBE mode to DMR|DSTAR|YSF|NXDN|P25
+    ###################################################################################
+    def setAMBEMode(self, mode):
+        self.sendRemoteControlCommandASCII("ambeMode="+mode)
+
+    ###################################################################################
+    # Set the AB mode by running the named macro
+    ###################################################################################
+    def setMode(self, mode):
+        self.mode = mode
+        self.sendUSRPCommand(bytes("*" + mode, 'ASCII'), USRP_TYPE_DTMF)
+
+    ###################################################################################
+    # Tell AB to select the passed tg
+    ###################################################################################
+    def setRemoteTG(self, tg):
+        self.sendRemoteControlCommandASCII("tgs=" + str(tg))
+        self.sendUSRPCommand(bytes(str(tg), 'ASCII'), USRP_TYPE_DTMF)
+        self.currentTG = str(tg)
+
+    ###################################################################################
+    # Set the slot
+    ###################################################################################
+    def setRemoteTS(self, ts):
+        self.sendRemoteControlCommandASCII("txTs=" + str(ts))
+
+    def setDMRID(self, id):
+        self.sendRemoteControlCommandASCII("gateway_dmr_id=" + str(id))
+
+    def setPeerID(self, id):
+        self.sendRemoteControlCommandASCII("gateway_peer_id=" + str(id))
+
+    def setDMRCall(self, call):
+        self.sendRemoteControlCommandASCII("gateway_call=" + call)
+
+    ###################################################################################
+    # Start the session.  ASL (chan_usrp) has no registration so fake it.
+    ###################################################################################
+    def start(self):
+        if self.aslMode != 0:    # Does this look like a ASL connection to USRP?
+            self.regState = True
+            self.emit(("registered",))
+        else:
+            self.registerWithAB()
+
+    ###################################################################################
+    # Register and wait for AB to answer, for scripts running on the loop
+    ###################################################################################
+    async def register(self, timeout=5.0):
+        waiter = self.loop.create_future()
+        self.regWaiters.append(waiter)
+        self.start()
+        if self.regState == True:   # ASL mode needs no handshake
+            self.regWaiters.remove(waiter)
+            return True
+        try:
+            return await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if waiter in self.regWaiters:
+                self.regWaiters.remove(waiter)
+
+    ###################################################################################
+    # Tell AB we are done and shut the network side down.  Safe from any thread.
+    ###################################################################################
+    def stop(self):
+        logging.info(STRING_EXITING)
+        self.done = True            # Signal the audio threads to terminate
+        if self.regState == True:   # If we were registered, tell AB we are done
+            self.unregisterWithAB()
+        if self.loop != None and self.loop.is_closed() == False:
+            try:
+                self.loop.call_soon_threadsafe(self.shutdown)
+            except RuntimeError:    # loop already closed under us
+                pass
+
+    def shutdown(self):
+        for handle in self.timers.values():
+            handle.cancel()
+        self.timers.clear()
+        for waiter in self.regWaiters:
+            waiter.cancel()
+        if self.files != None:
+            self.files.abortAll()
+        if self.receiver != None:
+            self.loop.remove_reader(self.udp.fileno())
+            self.udp.close()
+            self.receiver = None
+        if self.stopped != None and self.stopped.done() == False:
+            self.stopped.set_result(None)
+
+    ###################################################################################
+    # Attach the socket to the running loop, run() returns when stop() is called.  Each
+    # time it is readable everything waiting is read (a burst in one recvmmsg call on
+    # Linux) into buffers that are reused, handlePacket sees memoryviews of them.
+    ###################################################################################
+    async def open(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = self.loop.create_future()
+        self.receiver = UDPReceiver(self.udp, self.handlePacket, useRecvmmsg=self.config.recvmmsg)
+        self.loop.add_reader(self.udp.fileno(), self.receiver.readReady)
+        if self.config.pingTimer > 0:
+            self.schedule("ping", 20.0, self.ping)
+
+    async def run(self, ready=None):
+        await self.open()
+        if ready != None:
+            ready.set()
+        await self.stopped
+
+    ###################################################################################
+    # Run the loop on a thread of its own (for the Tk front end)
+    ###################################################################################
+    def startLoop(self):
+        ready = threading.Event()
+        threading.Thread(target=asyncio.run, args=(self.run(ready),), daemon=True).start()
+        ready.wait()
+
+    ###################################################################################
+    # Run a coroutine on the client loop from another thread
+    ###################################################################################
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    ###################################################################################
+    # (Re)arm a named one shot timer, must be called on the loop
+    ###################################################################################
+    def schedule(self, name, delay, callback):
+        if name in self.timers:
+            self.timers[name].cancel()
+        self.timers[name] = self.loop.call_later(delay, self.fire, name, callback)
+
+    def fire(self, name, callback):
+        del self.timers[name]
+        callback()
+
+    ###################################################################################
+    # Keep a NAT mapping open to AB
+    ###################################################################################
+    def ping(self):
+        if self.txKeyed == False:       # voice keeps the mapping open, and a ping would leave a hole in its sequence
+            self.sendUSRPCommand(bytes("PING", 'ASCII'), USRP_TYPE_PING)
+        self.schedule("ping", 20.0, self.ping)
+
+    ###################################################################################
+    # Lookup the friendly name of a TG in the current mode's list
+    ###################################################################################
+    def getTGName(self, tg):
+        tgs = self.talkGroups.get(self.mode)
+        return tg if tgs == None else tgs.nameOf(tg, tg)
+
+    ###################################################################################
+    # Log the EOT
+    ###################################################################################
+    def endTransmission(self):
+        duration = time() - self.rxStartTime
+        self.rxLoss = self.rxStats.lossString()
+        stats = self.rxStats.asDict()
+        logging.info('End TX:   {} {} {} {} {:.2f}s ({})'.format(self.rxCall, self.rxSlot, self.rxTG, self.rxLoss, duration, self.rxStats))
+        if self.receiver != None:
+            stats.update(self.receiver.rates())     # packets/s and recv calls/packet since the last EOT
+            logging.debug('RX socket: {pps} pkt/s, {syscalls_per_packet} calls/pkt, batched {batched}'.format(**stats))
+        self.transmitEnable = True  # Idle state, allow local transmit
+        self.emit(("end_tx", self.rxCall, self.rxSlot, self.rxTG, self.rxLoss, self.rxStartTime, duration, stats, self.rxTGValue))
+        if self.config.statsFile != None:
+            self.exportStats(duration, stats)
+        # A missed EOT ends here without an unkey, the next keyup must start afresh
+        self.lastKey = -1
+        self.rxStats.reset()
+        self.rxStartTime = time()
+
+    ###################################################################################
+    # Append the stats of a transmission to the statsFile (one json object per line)
+    ###################################################################################
+    def exportStats(self, duration, stats):
+        record = {'time': self.rxStartTime, 'call': self.rxCall, 'slot': self.rxSlot,
+                  'tg': str(self.rxTGValue), 'tg_name': str(self.rxTG), 'duration': round(duration, 2)}
+        record.update(stats)
+        try:
+            with open(self.config.statsFile, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+        except:
+            logging.warning("Can not write stats: " + str(sys.exc_info()[1]))
+
+    ###################################################################################
+    # One datagram from AB.  soundData is a view of the receive buffer, it is only
+    # valid until we return (the jitter buffer copies voice frames).
+    ###################################################################################
+    def handlePacket(self, soundData, addr):
+        if addr[0] != self.ipAddress:
+            self.ipAddress = addr[0]    # OK, this was supposed to help set the ip to a server, but multiple servers ping/pong.  I may remove it.
+            self.emit(("address", addr[0]))
+        if len(soundData) < USRP_HEADER_SIZE:
+            return
+        eye, seq, memory, keyup, talkgroup, type, mpxid, reserved = USRP_HEADER.unpack_from(soundData)
+        if (eye != USRP):
+            return
+        if type in VOICE_TYPES: # voice, pcm or compressed
+            if keyup and (keyup != self.lastKey):
+                self.rxStartTime = time()
+                self.rxStats.reset()
+                self.rxCodecs.clear()
+            self.rxStats.update(seq)
+            audio = memoryview(soundData)[USRP_HEADER_SIZE:]   # no copy on the hot path
+            if len(audio) > 0:
+                if type != self.txType and self.voiceCodec != "pcm":
+                    self.voiceTypeSeen(type)
+                if type != USRP_TYPE_VOICE:
+                    audio = self.decodeVoice(type, addr, audio)
+            if self.voiceSink != None:
+                source = (addr[0], addr[1], talkgroup if talkgroup != 0 else self.rxDest)
+                if len(audio) == 320:
+                    self.voiceSink(source, seq, audio)
+                elif keyup == False:
+                    self.voiceSink(source, seq, None)
+            if (keyup != self.lastKey):
+                logging.debug('key' if keyup else 'unkey')
+                if keyup == False:
+                    self.endTransmission()
+                    self.emit(("level", 0, 0))
+            self.lastKey = keyup
+            return
+        audio = bytes(soundData[USRP_HEADER_SIZE:])     # text and TLV are rare, parse a copy
+        if (type == USRP_TYPE_TEXT): #metadata
+            if (audio[0:4] == REG):
+                self.handleRegistration(audio)
+            elif (audio[0:5] == INFO):
+                self.handleInfo(audio)
+            elif audio[0] == TLV_TAG_SET_INFO:  # Tunnel a TLV inside of a USRP packet
+                self.handleSetInfo(audio)
+        elif (type == USRP_TYPE_PING):
+            if self.transmitEnable == False:    # Do we think we receiving packets?, lets test for EOT missed
+                if seqDiff(seq, self.lastSeq) == 1:
+                    logging.info("missed EOT")
+                    self.endTransmission()
+                else:                           # a ping in the middle of the voice, not a lost frame
+                    self.rxStats.skip(seq)
+                    if self.voiceSink != None:
+                        self.voiceSink((addr[0], addr[1], talkgroup if talkgroup != 0 else self.rxDest), seq, b'')
+                self.lastSeq = seq
+        elif (type == USRP_TYPE_TLV):
+            self.handleTLV(audio, addr)
+
+    ###################################################################################
+    # REG: replies from AB
+    ###################################################################################
+    def handleRegistration(self, audio):
+        if (audio[4:6] == OK):
+            self.setTxVoiceType(USRP_TYPE_VOICE)    # AB may have restarted with other settings
+            self.sendMetadata()
+            self.requestInfo()
+            self.regState = True
+            if self.timeToRegistered == None:
+                self.timeToRegistered = startupMark("registered")
+                logging.info("Registered with AB {:.2f}s after start".format(self.timeToRegistered))
+            self.emit(("registered",))
+            for waiter in self.regWaiters:
+                if waiter.done() == False:
+                    waiter.set_result(True)
+        elif (audio[4:9] == UNREG):
+            self.regState = False
+            self.emit(("unregistered",))
+        elif (audio[4:11] == EXITING):
+            self.emit(("disconnected",))
+            tmp = audio[:audio.find(b'\x00')].decode('ASCII') # C string
+            args = tmp.split(" ")
+            sleepTime = int(args[2])
+            logging.info("AB is exiting and wants a re-reg in %s seconds...", sleepTime)
+            if (sleepTime > 0):
+                self.schedule("rereg", sleepTime, self.registerWithAB)
+        logging.info(audio[:audio.find(b'\x00')].decode('ASCII'))
+
+    ###################################################################################
+    # INFO: messages, macros and the AB state json
+    ###################################################################################
+    def handleInfo(self, audio):
+        _json = audio[5:audio.find(b'\x00')].decode('ASCII')
+        if (_json[0:4] == "MSG:"):
+            logging.info("Text Message: " + _json[4:])
+            self.emit(("toast", "Text Message", _json[4:]))
+        elif (_json[0:6] == "MACRO:"):  # An ad-hoc macro menu
+            logging.info("Macro: " + _json[6:])
+            self.setMacros(_json[6:])
+            self.emit(("macro", ""))    # popup the menu
+        elif (_json[0:5] == "MENU:"):  # An ad-hoc macro menu
+            logging.info("Menu: " + _json[5:])
+            self.setMacros(_json[5:])
+        else:
+            obj=json.loads(_json)
+            if (obj["tlv"]["ambe_mode"][:3] == "YSF"):
+                self.mode = "YSF"
+            else:
+                self.mode = obj["tlv"]["ambe_mode"]
+            self.currentTG = obj["last_tune"]
+            logging.info(audio[:audio.find(b'\x00')].decode('ASCII'))
+            self.emit(("info", self.mode, obj["last_tune"]))
+
+    def setMacros(self, macs):
+        macrosx = dict(x.split(",") for x in macs.split("|"))
+        self.macros = { k:v.strip() for k, v in macrosx.items()}
+
+    ###################################################################################
+    # TLV_TAG_SET_INFO, the metadata for a new transmission from the network
+    ###################################################################################
+    def handleSetInfo(self, audio):
+        if self.transmitEnable == False:    #EOT missed?
+            self.endTransmission()
+        rid = (audio[2] << 16) + (audio[3] << 8) + audio[4] # Source
+        tg = (audio[9] << 16) + (audio[10] << 8) + audio[11] # Dest
+        self.rxDest = tg
+        rxslot = audio[12]
+        rxcc = audio[13]
+        mode = STRING_PRIVATE if (rxcc  & 0x80) else STRING_GROUP
+        name = ""
+        if audio[14] == 0: # C string termintor for call
+            call = str(rid)
+        else:
+            call = audio[14:audio.find(b'\x00', 14)].decode('ASCII')
+            if call[0] == '{':    # its a json dict
+                obj=json.loads(call)
+                call = obj['call']
+                name = obj['name'].split(' ')[0] if 'name' in obj else ""
+        if self.idDatabase != None and (call == str(rid) or name == ""):
+            entry = self.idDatabase.lookup(rid)
+            if entry != None and (call == str(rid) or call.upper() == entry[0].upper()):
+                call, name = entry[0], name or entry[1]
+        listName = self.mode
+        if (listName == 'DSTAR') or (listName == "YSF"): # for these modes the TG is not valid
+            tgValue = str(self.currentTG).translate(noQuote)
+            tg = self.getTGName(tgValue)
+        elif tg == self.subscriberID: # is the dest TG my dmr ID? (private call)
+            tgValue = str(tg)
+            tg = self.myCall
+        else:
+            tgValue = str(tg)
+            tg = self.getTGName(tg)
+        self.rxCall = call
+        self.rxName = name
+        self.rxSlot = rxslot
+        self.rxTG = tg
+        self.rxTGValue = tgValue
+        logging.info('Begin TX: {} {} {} {}'.format(call, rxslot, tg, mode))
+        self.transmitEnable = False # Transmission from network will disable local transmit
+        self.emit(("begin_tx", call, name, rxslot, tg, mode, tgValue))
+        if ((rxcc  & 0x80) and (rid > 10000)): # > 10000 to exclude "4000" from BM
+            # a dial string with a pound is a private call, see if the current TG matches
+            privateTG = str(rid) + '#'
+            if (privateTG != self.currentTG):
+                #Tune to tg
+                self.sendRemoteControlCommandASCII("txTg=" + privateTG)
+                if listName in self.talkGroups:
+                    self.talkGroups[listName].append((call + " Private", privateTG))
+                self.currentTG = privateTG
+                self.rxTG = privateTG # Make log entries say the right thing
+                self.rxTGValue = privateTG
+            self.emit(("private_call", listName, privateTG))
+
+    ###################################################################################
+    # TLV packets (file transfer)
+    ###################################################################################
+    def handleTLV(self, audio, addr):
+        tag = audio[0]
+        length = audio[1]
+        value = audio[2:]
+        if tag == TLV_TAG_FILE_XFER and len(value) > 0:
+            if self.files == None:  # first file from AB
+                from filexfer import FileReceiver
+                self.files = FileReceiver(self.config.fileDir, self.emit)
+            self.files.handle(addr, value, length)
+            if len(self.files.transfers) > 0 and "files" not in self.timers:
+                self.schedule("files", 5.0, self.expireFiles)
+
+    # Drop transfers AB stopped sending, every 5s while any are open
+    def expireFiles(self):
+        self.files.expire()
+        if len(self.files.transfers) > 0:
+            self.schedule("files", 5.0, self.expireFiles)
+
+###################################################################################
+# Several sessions (one AB per mode) served by one process: their sockets share one
+# event loop, so five ABs cost one network thread, not five.  The first client is
+# the primary one, the UI controls it and the audio threads live as long as it does.
+###################################################################################
+class SessionGroup:
+
+    def __init__(self, clients=()):
+        self.clients = list(clients)
+
+    ###################################################################################
+    # The primary session and one for each of its config's [SESSIONS]
+    ###################################################################################
+    @classmethod
+    def fromConfig(cls, config, primary=None):
+        group = cls([USRPClient(config) if primary == None else primary])
+        for mode in config.sessions:
+            group.add(USRPClient(sessionConfig(config, mode)))
+        return group
+
+    def add(self, client):
+        self.clients.append(client)
+        return client
+
+    def __iter__(self):
+        return iter(self.clients)
+
+    def __len__(self):
+        return len(self.clients)
+
+    @property
+    def primary(self):
+        return self.clients[0]
+
+    def byName(self, name):
+        return next((client for client in self.clients if client.name == name), None)
+
+    def openStreams(self):
+        for client in self.clients:
+            client.openStream()
+
+    ###################################################################################
+    # Attach every socket to the running loop, run() returns once all are stopped
+    ###################################################################################
+    async def open(self):
+        for client in self.clients:
+            await client.open()
+
+    async def run(self, ready=None):
+        await self.open()
+        if ready != None:
+            ready.set()
+        await asyncio.gather(*(client.stopped for client in self.clients))
+
+    def startLoop(self):
+        ready = threading.Event()
+        threading.Thread(target=asyncio.run, args=(self.run(ready),), daemon=True).start()
+        ready.wait()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.primary.loop)
+
+    def start(self):
+        for client in self.clients:
+            client.start()
+
+    def stop(self):
+        for client in self.clients:
+            client.stop()
+
+###################################################################################
+# Command line shared by the UI and the headless gateway
+###################################################################################
+def parseArgs(argv):
+    parser = argparse.ArgumentParser(prog='pyUC', description='USRP Client for DVSwitch')
+    parser.add_argument('config', nargs='?', default=str(Path(argv[0]).parent) + "/pyUC.ini", help='path to pyUC.ini')
+    parser.add_argument('--headless', action='store_true', help='run without the Tk UI (unattended gateway)')
+    parser.add_argument('--profile', action='store_true', help='profile startup until registered, stats go to pyUC-startup.prof')
+    return parser.parse_args(argv[1:])
+
+def loadConfig(config_file_name):
+    try:
+        config = readConfig(config_file_name)
+    except:
+        logging.error(STRING_CONFIG_FILE_ERROR + str(sys.exc_info()[1]))
+        sys.exit('Configuration file \''+config_file_name+'\' is not a valid configuration file! Exiting...')
+    if config.isValid() == False:
+        logging.error(STRING_CONFIG_NOT_EDITED)
+        os._exit(1)
+    return config
+
+###################################################################################
+# Run a session with no UI.  RX audio goes to the speaker, TX is vox only.
+###################################################################################
+def runHeadless(args):
+    if args.profile:
+        startProfile()
+    from audio import AudioPipeline
+    from lastheard import openHeardJournal
+    startupMark("imports")
+
+    logging.basicConfig(format='%(asctime)s - %(message)s', level=logging.INFO)
+    config = loadConfig(args.config)
+    sessions = SessionGroup.fromConfig(config)
+    client = sessions.primary
+    startupMark("config")
+
+    def onEvent(session, event):
+        if event[0] == "registered":
+            startupReport()
+        elif event[0] == "ptt" and journal != None:     # vox, journaled as the UI does
+            tg = str(session.currentTG).translate(noQuote)
+            journal.transmit(event[1], session.myCall, session.config.slot, tg, session.getTGName(tg))
+        elif event[0] == "fatal":
+            logging.critical(event[1])
+            os._exit(1)
+        elif event[0] == "dialog":
+            logging.error(event[2])
+
+    journal = openHeardJournal(config.journalFile)
+    for session in sessions:
+        session.subscribe(lambda event, session=session: onEvent(session, event))
+        if journal != None:
+            session.subscribe(journal.onEvent)
+    sessions.openStreams()
+    pipeline = AudioPipeline(client, config)
+    for session in sessions.clients[1:]:
+        pipeline.addSession(session)
+    pipeline.start()
+    startupMark("audio")
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, sessions.stop)
+            except NotImplementedError:     # Windows, Ctrl-C raises KeyboardInterrupt instead
+                pass
+        await sessions.open()
+        startupMark("loop")
+        sessions.start()        # Begin the handshake with each AB (register)
+        await asyncio.gather(*(session.stopped for session in sessions))
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        sessions.stop()
+    pipeline.close()
+    if journal != None:
+        journal.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(runHeadless(parseArgs(sys.argv)))